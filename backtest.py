@@ -0,0 +1,330 @@
+import argparse
+import itertools
+from datetime import datetime
+from typing import NamedTuple
+import numpy as np
+from log_config import get_logger, setup_logging
+import cfg
+
+logger = get_logger(__name__)
+
+UNDERLYING_SEC_TYPES = ('STK', 'IND', 'FUT')
+OPTION_SEC_TYPES = ('OPT', 'FOP')
+
+
+class ChainHistory(NamedTuple):
+    """
+    Recorded 0DTE chains as dense arrays, one row per (day, symbol). Bar 0 holds the last quotes up to and
+    including the entry time, bar b the last quotes up to b bar lengths after it, through to the session close. Quotes are carried forward over bars
+    without updates, a side quoted without a price is NaN; strikes are sorted per row and padded with NaN.
+    """
+    days: np.ndarray  # [G] 'YYYYMMDD'
+    symbols: np.ndarray  # [G]
+    underlying: np.ndarray  # [G, T] underlying mid (or last)
+    strikes: np.ndarray  # [G, K]
+    put_bid: np.ndarray  # [G, T, K]
+    put_ask: np.ndarray
+    call_bid: np.ndarray
+    call_ask: np.ndarray
+
+
+class BacktestResult(NamedTuple):
+    put_strike_distance: np.ndarray  # [P]
+    call_strike_distance: np.ndarray  # [P]
+    stop_loss_multiplier: np.ndarray  # [P]
+    pnl: np.ndarray  # [P, G] per contract, NaN where no trade was entered
+    stopped: np.ndarray  # [P, G] the trailing stop was hit before the close
+    days: np.ndarray  # [G]
+    symbols: np.ndarray  # [G]
+
+
+def _read_table(path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if path.endswith('.parquet'):
+        return pq.read_table(path)
+    with pa.ipc.open_stream(path) as reader:
+        return reader.read_all()
+
+
+def _seconds(hhmm: str) -> int:
+    clock = datetime.strptime(hhmm, '%H:%M')
+    return clock.hour * 3600 + clock.minute * 60
+
+
+def _forward_fill(values: np.ndarray, axis: int = 1) -> np.ndarray:
+    """
+    Carries the last non-NaN value forward along the given axis.
+    """
+    values = np.moveaxis(values, axis, -1)
+    positions = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    np.maximum.accumulate(positions, axis=-1, out=positions)
+    filled = np.take_along_axis(values, positions, axis=-1)
+    return np.moveaxis(filled, -1, axis)
+
+
+def _last_per_cell(flat_index: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """
+    Dense array of `size` cells holding, for each cell, the last of the (time-ordered) values written to it.
+    """
+    out = np.full(size, np.nan)
+    reversed_cells = flat_index[::-1]
+    cells, first = np.unique(reversed_cells, return_index=True)
+    out[cells] = values[::-1][first]
+    return out
+
+
+def _valid_quote(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    return np.where(values > 0, values, np.nan)
+
+
+def _observed_quote(values: np.ndarray) -> np.ndarray:
+    """
+    Recorded quotes with "quoted without a price" (IB's -1 or 0) kept apart from "not quoted yet" (NaN): the
+    former becomes 0, so forward filling only carries real quotes over cells that were never observed.
+    """
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), np.nan, np.maximum(values, 0.0))
+
+
+def load_history(paths: list, symbols: list = None, entry_time: str = None, session_end: str = None,
+                 bar_seconds: int = None) -> ChainHistory:
+    """
+    Loads files written by md_recorder into a ChainHistory, keeping each symbol's same-day expiry options.
+
+    Args:
+        paths: Recorded Parquet or Arrow IPC files.
+        symbols: Symbols to keep (defaults to all recorded).
+        entry_time: US/Eastern HH:MM of bar 0 (defaults to cfg.entry_time).
+        session_end: US/Eastern HH:MM of the last bar (defaults to cfg.backtest_session_end).
+        bar_seconds: Bar length (defaults to cfg.backtest_bar_seconds).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    entry_time = entry_time or cfg.entry_time
+    session_end = session_end or cfg.backtest_session_end
+    bar_seconds = bar_seconds or cfg.backtest_bar_seconds
+
+    table = pa.concat_tables([_read_table(path) for path in paths])
+    if symbols:
+        table = table.filter(pc.is_in(table['symbol'], value_set=pa.array(symbols)))
+    table = table.sort_by('ts')
+
+    local_ts = table['ts'].cast(pa.timestamp('us', tz='US/Eastern'))
+    day = pc.strftime(local_ts, format='%Y%m%d').to_numpy().astype(str)
+    seconds = (pc.hour(local_ts).to_numpy() * 3600 + pc.minute(local_ts).to_numpy() * 60 +
+               pc.second(local_ts).to_numpy())
+    entry_seconds = _seconds(entry_time)
+    end_seconds = _seconds(session_end)
+    n_bars = -(-(end_seconds - entry_seconds) // bar_seconds) + 1
+
+    symbol = table['symbol'].to_numpy().astype(str)
+    sec_type = table['secType'].to_numpy().astype(str)
+    expiry = table['expiry'].to_numpy().astype(str)
+    right = table['right'].to_numpy().astype(str)
+    strike = table['strike'].to_numpy().astype(float)
+    observed_bid = _observed_quote(table['bid'].to_numpy())
+    observed_ask = _observed_quote(table['ask'].to_numpy())
+    bid = _valid_quote(observed_bid)
+    ask = _valid_quote(observed_ask)
+    last = _valid_quote(table['last'].to_numpy())
+
+    # Bar 0 collects everything up to and including the entry time, as a quote stamped at the entry time is there
+    # when the entry fires; bar b ends b bar lengths later, so a row stamped exactly at a bar's end (including the
+    # session end) belongs to that bar
+    bar = np.clip(-(-(seconds - entry_seconds) // bar_seconds), 0, n_bars - 1)
+    in_session = seconds <= end_seconds
+    is_underlying = np.isin(sec_type, UNDERLYING_SEC_TYPES) & in_session
+    is_option = np.isin(sec_type, OPTION_SEC_TYPES) & (np.char.ljust(expiry, 8).astype('U8') == day) & in_session
+
+    keys, group = np.unique(np.char.add(np.char.add(day, '|'), symbol), return_inverse=True)
+    days = np.array([key.split('|')[0] for key in keys])
+    group_symbols = np.array([key.split('|')[1] for key in keys])
+    n_groups = len(keys)
+
+    # Underlying: mid where both sides are quoted, otherwise last
+    und_price = np.where(np.isnan(bid) | np.isnan(ask), last, (bid + ask) / 2)
+    und_rows = is_underlying & ~np.isnan(und_price)
+    underlying = _last_per_cell(group[und_rows] * n_bars + bar[und_rows], und_price[und_rows],
+                                n_groups * n_bars).reshape(n_groups, n_bars)
+    underlying = _forward_fill(underlying)
+
+    # Strike ladder per group: rank of each option's strike among its group's distinct strikes
+    strike_key = group[is_option].astype(np.int64) * 10 ** 9 + np.round(strike[is_option] * 1000).astype(np.int64)
+    ladder, strike_rank = np.unique(strike_key, return_inverse=True)
+    ladder_group = ladder // 10 ** 9
+    group_start = np.searchsorted(ladder_group, np.arange(n_groups))
+    strike_index = strike_rank - group_start[group[is_option]]
+    n_strikes = int(np.bincount(ladder_group, minlength=n_groups).max()) if len(ladder) else 0
+
+    strikes = np.full((n_groups, n_strikes), np.nan)
+    strikes[ladder_group, np.arange(len(ladder)) - group_start[ladder_group]] = (ladder % 10 ** 9) / 1000
+
+    option_cell = (group[is_option] * n_bars + bar[is_option]) * n_strikes + strike_index
+    option_right = np.char.upper(right[is_option]).astype('U1')
+    size = n_groups * n_bars * n_strikes
+    arrays = {}
+    for name, leg_right in (('put', 'P'), ('call', 'C')):
+        for side, values in (('bid', observed_bid), ('ask', observed_ask)):
+            # Only observed quotes are carried forward; a side quoted without a price (0) stops the carry and
+            # ends up NaN, so a strike that lost its bid is not tradable
+            option_values = values[is_option]
+            rows = (option_right == leg_right) & ~np.isnan(option_values)
+            dense = _last_per_cell(option_cell[rows], option_values[rows], size)
+            arrays[f"{name}_{side}"] = _valid_quote(_forward_fill(dense.reshape(n_groups, n_bars, n_strikes)))
+
+    logger.info("Loaded %d symbol-days, %d bars, up to %d strikes from %d files", n_groups, n_bars, n_strikes,
+                len(paths))
+    return ChainHistory(days, group_symbols, underlying, strikes, **arrays)
+
+
+def parameter_grid(put_strike_distance, call_strike_distance, stop_loss_multiplier) -> dict:
+    """
+    Every combination of the given parameter values, as parallel arrays.
+    """
+    combos = np.array(list(itertools.product(put_strike_distance, call_strike_distance, stop_loss_multiplier)),
+                      dtype=float).reshape(-1, 3)
+    return {
+        "put_strike_distance": combos[:, 0],
+        "call_strike_distance": combos[:, 1],
+        "stop_loss_multiplier": combos[:, 2],
+    }
+
+
+def _select_strikes(strikes: np.ndarray, entry_bids: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Index of the strike closest to each target among those with a valid bid at entry, as get_closest_strike
+    picks it (ties go to the lower strike). -1 where no strike has a bid.
+
+    Args:
+        strikes: [G, K]
+        entry_bids: [G, K]
+        targets: [U, G]
+
+    Returns:
+        np.ndarray: [U, G] strike indices.
+    """
+    distance = np.abs(strikes[None] - targets[..., None])
+    distance = np.where(np.isnan(entry_bids)[None], np.inf, distance)
+    distance = np.where(np.isnan(distance), np.inf, distance)
+    index = np.argmin(distance, axis=-1)
+    found = np.isfinite(np.take_along_axis(distance, index[..., None], axis=-1)[..., 0])
+    return np.where(found, index, -1)
+
+
+def run_backtest(history: ChainHistory, grid: dict, multiplier: float = 100.0) -> BacktestResult:
+    """
+    Evaluates the strangle entry for every (parameter set, symbol-day) at once.
+
+    Per symbol-day the entry mirrors main.py: strikes at the configured distances from the rounded underlying
+    price (closest strike with a bid), a combo sold at the sum of the leg bids, and a trailing stop bought back
+    when the combo mid rises stop_loss_multiplier x entry mid above its running low. Positions not stopped out
+    are settled at intrinsic value on the last underlying price of the session.
+    """
+    put_distance = np.asarray(grid["put_strike_distance"], dtype=float)
+    call_distance = np.asarray(grid["call_strike_distance"], dtype=float)
+    stop_multiplier = np.asarray(grid["stop_loss_multiplier"], dtype=float)
+    n_groups, n_bars = history.underlying.shape
+
+    rounded = np.round(history.underlying[:, 0])
+    settle = history.underlying[:, -1]
+
+    # Strike selection only depends on the distance, so it is done once per distinct value
+    put_values, put_of_param = np.unique(put_distance, return_inverse=True)
+    call_values, call_of_param = np.unique(call_distance, return_inverse=True)
+    put_index = _select_strikes(history.strikes, history.put_bid[:, 0], rounded[None] - put_values[:, None])
+    call_index = _select_strikes(history.strikes, history.call_bid[:, 0], rounded[None] + call_values[:, None])
+    put_index = put_index[put_of_param]  # [P, G]
+    call_index = call_index[call_of_param]
+    entered = (put_index >= 0) & (call_index >= 0) & ~np.isnan(rounded)[None]
+
+    g = np.arange(n_groups)[None, :, None]
+    t = np.arange(n_bars)[None, None, :]
+    kp = np.maximum(put_index, 0)[..., None]
+    kc = np.maximum(call_index, 0)[..., None]
+    combo_bid = history.put_bid[g, t, kp] + history.call_bid[g, t, kc]  # [P, G, T]
+    combo_ask = history.put_ask[g, t, kp] + history.call_ask[g, t, kc]
+    combo_mid = (combo_bid + combo_ask) / 2
+
+    # Entry prices as combo_prices_from_tickers computes them: missing leg quotes count as 0
+    credit = np.nan_to_num(history.put_bid[g, 0, kp][..., 0]) + np.nan_to_num(history.call_bid[g, 0, kc][..., 0])
+    entry_ask = np.nan_to_num(history.put_ask[g, 0, kp][..., 0]) + np.nan_to_num(history.call_ask[g, 0, kc][..., 0])
+    entry_mid = np.round((credit + entry_ask) / 2 * 10) / 10
+    entered &= credit > 0
+    trail = entry_mid * stop_multiplier[:, None]
+
+    # BUY trailing stop: triggers when the mid rises `trail` above its lowest value since entry
+    running_low = np.fmin.accumulate(np.where(np.isnan(combo_mid), np.inf, combo_mid), axis=-1)
+    hit = np.zeros(combo_mid.shape, dtype=bool)
+    hit[..., 1:] = combo_mid[..., 1:] >= running_low[..., :-1] + trail[..., None]
+    stopped = hit.any(axis=-1) & entered
+    first_hit = np.argmax(hit, axis=-1)[..., None]
+    stop_cost = np.take_along_axis(combo_ask, first_hit, axis=-1)[..., 0]
+    stop_cost = np.where(np.isnan(stop_cost), np.take_along_axis(combo_mid, first_hit, axis=-1)[..., 0], stop_cost)
+
+    put_strike = history.strikes[g[..., 0], kp[..., 0]]
+    call_strike = history.strikes[g[..., 0], kc[..., 0]]
+    expiry_cost = np.maximum(put_strike - settle[None], 0) + np.maximum(settle[None] - call_strike, 0)
+
+    pnl = (credit - np.where(stopped, stop_cost, expiry_cost)) * multiplier
+    pnl = np.where(entered, pnl, np.nan)
+    return BacktestResult(put_distance, call_distance, stop_multiplier, pnl, stopped, history.days,
+                          history.symbols)
+
+
+def summarize(result: BacktestResult) -> list:
+    """
+    Per parameter set: trades, total and mean P&L, win rate, stop-out rate and max drawdown (symbol-days in
+    date order), best total P&L first.
+    """
+    traded = ~np.isnan(result.pnl)
+    trades = traded.sum(axis=1)
+    total = np.nansum(result.pnl, axis=1)
+    equity = np.cumsum(np.nan_to_num(result.pnl), axis=1)
+    drawdown = np.max(np.maximum.accumulate(np.maximum(equity, 0), axis=1) - equity, axis=1, initial=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / trades
+        win_rate = (result.pnl > 0).sum(axis=1) / trades
+        stop_rate = (result.stopped & traded).sum(axis=1) / trades
+
+    rows = [{
+        "put_strike_distance": float(result.put_strike_distance[p]),
+        "call_strike_distance": float(result.call_strike_distance[p]),
+        "stop_loss_multiplier": float(result.stop_loss_multiplier[p]),
+        "trades": int(trades[p]),
+        "total_pnl": float(total[p]),
+        "mean_pnl": float(mean[p]),
+        "win_rate": float(win_rate[p]),
+        "stop_rate": float(stop_rate[p]),
+        "max_drawdown": float(drawdown[p]),
+    } for p in range(len(total))]
+    rows.sort(key=lambda row: row["total_pnl"], reverse=True)
+    return rows
+
+
+def _floats(text: str) -> list:
+    return [float(value) for value in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep strangle parameters over recorded market data.')
+    parser.add_argument('files', nargs='+', help='Files written by md_recorder')
+    parser.add_argument('--symbols', nargs='+', default=None)
+    parser.add_argument('--entry-time', default=cfg.entry_time, help='US/Eastern entry time as HH:MM')
+    parser.add_argument('--put-distances', type=_floats, default=[1, 2, 3, 4, 5])
+    parser.add_argument('--call-distances', type=_floats, default=[1, 2, 3, 4, 5])
+    parser.add_argument('--stop-multipliers', type=_floats, default=[cfg.stop_loss_multiplier])
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_logging()
+    history = load_history(args.files, args.symbols, args.entry_time)
+    result = run_backtest(history, parameter_grid(args.put_distances, args.call_distances, args.stop_multipliers))
+    print(f"{'Put':>5} {'Call':>5} {'Stop':>5} {'Trades':>6} {'Total':>10} {'Mean':>8} {'Win %':>6} {'Stop %':>6} "
+          f"{'Max DD':>9}")
+    for row in summarize(result)[:args.top]:
+        print(f"{row['put_strike_distance']:>5g} {row['call_strike_distance']:>5g} {row['stop_loss_multiplier']:>5g} "
+              f"{row['trades']:>6} {row['total_pnl']:>10.2f} {row['mean_pnl']:>8.2f} {row['win_rate'] * 100:>6.1f} "
+              f"{row['stop_rate'] * 100:>6.1f} {row['max_drawdown']:>9.2f}")
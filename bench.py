@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from log_config import setup_logging
+import cfg
+
+DEFAULT_SCENARIOS = (1, 3, 10, 50)
+
+
+def bench_symbols(count: int) -> list:
+    return [f"B{i:03d}" for i in range(count)]
+
+
+def register_bench_params(symbols: list):
+    """
+    Adds cfg.params entries for the synthetic benchmark symbols (stock underlyings with SMART-routed options).
+    """
+    for symbol in symbols:
+        cfg.params[symbol] = {
+            "quantity": 1,
+            "min_tick": 0.01,
+            "live_order": True,
+            "exchange": 'SMART',
+            "opt_exchange": 'SMART',
+            "sec_type": 'STK',
+            "mult": '1',
+            "call_strike_distance": 1,
+            "put_strike_distance": 1,
+        }
+
+
+def _configure(args, work_dir: str):
+    """
+    Points the IB instance at the fixture set and keeps caches and logs out of the working tree. Must run
+    before anything imports ib_instance.
+    """
+    os.environ['EODSTR_FAKE_IB'] = args.fixtures or os.path.join(work_dir, 'fixtures')
+    cfg.ib_fake_latency = args.latency
+    cfg.ib_fake_pacing = args.pacing
+    cfg.cache_dir = os.path.join(work_dir, 'cache')
+    cfg.log_level = args.log_level
+    cfg.log_file = None
+    cfg.margin_budget = None
+
+
+async def _run_once_async(symbols: list, batch: bool):
+    import main
+    if batch:
+        return await main.run_symbols_batch_async(symbols, margin_budget=float('inf'))
+    return await main.run_symbols_async(symbols)
+
+
+def _reset_to_cold(ib):
+    """
+    Drops everything a previous run leaves behind: qualification and chain caches, open market data lines and
+    cached quotes, in the app and in the stand-in.
+    """
+    import chain_cache
+    import md_lines
+    import qualify
+    import ticker_registry
+
+    qualify.clear_qualify_cache()
+    chain_cache.invalidate()
+    md_lines.release_all()
+    ticker_registry.clear()
+    ib.reset_market_data()
+
+
+def run_scenario(symbols: list, repeat: int, batch: bool) -> dict:
+    """
+    Runs the main.py flow `repeat` times for the given symbols. The first run starts from empty qualification
+    and chain caches, no open market data lines and no cached quotes; later runs reuse all of them. Peak memory
+    is measured in a separate cold + warm pass, as tracing allocations would inflate the timed runs.
+
+    Returns:
+        dict: Per-run measurements plus cold and warm summaries.
+    """
+    from ib_instance import ib
+
+    _reset_to_cold(ib)
+    runs = []
+    for i in range(repeat):
+        ib.reset_stats()
+        start = time.perf_counter()
+        results = ib.run(_run_once_async(symbols, batch))
+        wall_clock = time.perf_counter() - start
+        runs.append({
+            "cold": i == 0,
+            "wall_clock_s": wall_clock,
+            "ib_requests": sum(ib.request_counts.values()),
+            "requests_by_type": dict(ib.request_counts),
+            "md_lines_peak": ib.peak_lines,
+            "orders_submitted": sum(1 for result in results.values() if result),
+        })
+
+    _reset_to_cold(ib)
+    peak_memory = {}
+    for phase in ('cold', 'warm'):
+        tracemalloc.start()
+        ib.run(_run_once_async(symbols, batch))
+        peak_memory[phase] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    warm = runs[1:]
+    return {
+        "symbols": len(symbols),
+        "runs": runs,
+        "cold": runs[0],
+        "warm_median_wall_clock_s": statistics.median(run["wall_clock_s"] for run in warm) if warm else None,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def format_results(results: list) -> str:
+    lines = [f"{'Symbols':>7} {'Cold ms':>10} {'Warm ms':>10} {'Requests':>9} {'MD lines':>9} {'Cold KiB':>10} "
+             f"{'Orders':>7}"]
+    for scenario in results:
+        cold = scenario["cold"]
+        warm = scenario["warm_median_wall_clock_s"]
+        lines.append(f"{scenario['symbols']:>7} {cold['wall_clock_s'] * 1000:>10.1f} "
+                     f"{warm * 1000 if warm is not None else float('nan'):>10.1f} {cold['ib_requests']:>9} "
+                     f"{cold['md_lines_peak']:>9} {scenario['peak_memory_bytes']['cold'] / 1024:>10.1f} "
+                     f"{cold['orders_submitted']:>7}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the strangle entry pipeline against the offline IB '
+                                                 'stand-in.')
+    parser.add_argument('--scenarios', nargs='+', type=int, default=list(DEFAULT_SCENARIOS),
+                        help='Symbol counts to run')
+    parser.add_argument('--latency', type=float, default=0.005, help='Simulated seconds per IB request')
+    parser.add_argument('--pacing', type=float, default=None, help='Max simulated IB requests per second')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario (the first is cold)')
+    parser.add_argument('--batch', action='store_true', help='Use the batch submission path')
+    parser.add_argument('--fixtures', default=None,
+                        help='Fixture directory to use instead of generating one (must cover the bench symbols)')
+    parser.add_argument('--strike-span', type=int, default=50, help='Strikes on each side of spot in generated chains')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='eodstr-bench-') as work_dir:
+        _configure(args, work_dir)
+        setup_logging()
+        all_symbols = bench_symbols(max(args.scenarios))
+        register_bench_params(all_symbols)
+        if not args.fixtures:
+            # Written before ib_instance is imported, since the stand-in loads its fixtures on creation
+            from fake_ib import generate_fixtures
+            generate_fixtures(os.environ['EODSTR_FAKE_IB'], all_symbols, datetime.today().strftime('%Y%m%d'),
+                              args.strike_span)
+
+        results = [run_scenario(all_symbols[:count], args.repeat, args.batch) for count in args.scenarios]
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": sys.version.split()[0],
+        "latency_s": args.latency,
+        "pacing": args.pacing,
+        "repeat": args.repeat,
+        "batch": args.batch,
+        "scenarios": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_results(results))
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
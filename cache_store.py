@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+from ib_insync import Contract, util
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+
+def cache_path(filename: str) -> str:
+    """
+    Path of a cache file inside cfg.cache_dir, creating the directory if needed.
+    """
+    os.makedirs(cfg.cache_dir, exist_ok=True)
+    return os.path.join(cfg.cache_dir, filename)
+
+
+def load_json(path: str, default=None):
+    """
+    Load a JSON cache file, returning default if it is missing or unreadable.
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cache file %s: %s", path, e)
+        return default
+
+
+def save_json(path: str, data) -> None:
+    """
+    Atomically write a JSON cache file.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Failed to write cache file %s: %s", path, e)
+
+
+async def save_json_async(path: str, build_data) -> None:
+    """
+    save_json off the event loop: build_data() (which turns a snapshot of the cache into JSON-ready data) and the
+    write both run on the default executor.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, lambda: save_json(path, build_data()))
+
+
+def contract_to_dict(contract: Contract) -> dict:
+    return util.dataclassNonDefaults(contract)
+
+
+def contract_from_dict(data: dict) -> Contract:
+    return Contract.create(**data)
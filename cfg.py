@@ -6,7 +6,76 @@ stop_loss_multiplier = 1.5
 ib_host = '127.0.0.1'
 ib_port = 7496  # Port should be an integer
 ib_clientid = 1  # Client ID should also be an integer
+ib_connect_retries = 5  # Connection attempts before giving up
+ib_connect_backoff = 1.0  # Seconds before the second attempt, doubling after each failure
+ib_connect_backoff_max = 30.0  # Cap on the delay between attempts
+ib_connect_timeout = 4.0  # Seconds allowed for one connection attempt (also the ping timeout)
+ib_auto_reconnect = True  # Reconnect and resubscribe market data after an unexpected disconnect
+# Client ID per session role: orders, market data and contract lookups each get their own socket so data bursts
+# never queue ahead of orders. Roles sharing a client ID share a session.
+ib_sessions = {'orders': ib_clientid, 'market_data': ib_clientid + 1, 'contracts': ib_clientid + 2}
 
+# Offline IB stand-in (fake_ib.py)
+ib_fake_fixtures = None  # Fixture directory to replay instead of connecting to TWS (or set EODSTR_FAKE_IB)
+ib_fake_latency = 0.0  # Seconds added to every fake request
+ib_fake_pacing = None  # Max fake requests per second (None = unthrottled)
+
+# Market data
+quote_timeout = 2.0  # Max seconds to wait for a usable bid/ask (or last) after requesting market data
+quote_max_age_ms = 1000  # Snapshot quotes taken more recently than this are reused from the ticker registry
+md_line_budget = 100  # Concurrent market data lines allowed for the account (streaming plus snapshots)
+md_line_wait_timeout = 30.0  # Max seconds a request waits in the queue for a free line
+md_snapshot_chunk = 50  # Max contracts per reqTickers snapshot batch
+strike_search_window = 3  # Strikes quoted on each side of the target when picking a strike (0 = whole chain)
+target_price_search = 'bisect'  # get_option_by_target_price: 'bisect' quotes O(log N) strikes, 'scan' quotes all
+delta_search_range = 0.05  # Strike selection by delta quotes strikes within this fraction of spot
+
+# Option pricing (greeks.py)
+risk_free_rate = 0.045  # Continuously compounded, used for implied vol and greeks
+dividend_yield = 0.0
+option_expiry_time = '16:00'  # US/Eastern time options stop trading on their expiry date
+min_time_to_expiry_seconds = 60  # Floor on time to expiry so same-day options near the close stay priceable
+
+# Orders
+order_ack_timeout = 5.0  # Max seconds to wait for IB to acknowledge a submitted order
+margin_budget = None  # Max total initial margin for a run; when set, brackets are what-if checked and sent as a batch
+
+# Warm-up (warmup.py)
+entry_time = '15:50'  # US/Eastern time at which warmed-up plans are fired
+warmup_strike_span = 10  # Strikes subscribed on each side of each target during warm-up
+warmup_line_headroom = 20  # Market data lines left free during warm-up for fire-time lookups
+
+# Economic events (event_calendar.py)
+event_calendar_file = 'events.csv'
+blocking_event_kinds = ('FOMC', 'CPI', 'NFP')  # Releases that block entries until they are out
+event_settle_minutes = 5  # Minutes after a release before it stops blocking
+
+# Logging (log_config.py)
+log_level = 'INFO'  # Root level; DEBUG enables per-call tracing
+log_levels = {'ib_insync': 'CRITICAL'}  # Per-logger overrides, e.g. {'options': 'DEBUG'}
+log_file = 'eodstr.jsonl'  # JSON lines log file (None to log to the console only)
+
+# Latency instrumentation (latency.py)
+latency_tracking = False  # Record per-stage timing spans and print a summary at the end of a run
+latency_log = 'latency.jsonl'  # Spans are appended here as JSON lines
+
+# Market data recording (md_recorder.py, needs pyarrow)
+md_recording = False  # Record every ticker update for later replay
+md_record_dir = 'md_records'
+md_record_format = 'parquet'  # 'parquet' or 'arrow' (Arrow IPC stream)
+md_record_batch_size = 5000  # Rows per written batch
+md_record_flush_interval = 1.0  # Max seconds a row waits before its batch is written
+
+# Backtest (backtest.py)
+backtest_session_end = '16:00'  # US/Eastern time of the last bar; open positions settle at the underlying price here
+backtest_bar_seconds = 60  # Recorded quotes are sampled to bars of this length after the entry time
+
+# Local caches
+cache_dir = '.cache'
+chain_cache_ttl = 12 * 3600  # Seconds before a cached option chain is fetched again from IB
+
+# Per-symbol settings. Adding "put_delta" and "call_delta" (e.g. -0.10 and 0.10) selects strikes by delta instead
+# of by strike distance.
 params = {
     'SPY': {
         "conid": 756733,
@@ -0,0 +1,184 @@
+import asyncio
+import atexit
+import time
+from datetime import datetime
+from typing import Optional
+from ib_insync import Contract
+from ib_instance import ib
+from option_chain import OptionChain
+from cache_store import cache_path, load_json, save_json, save_json_async, contract_to_dict, contract_from_dict
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+CACHE_FILE = 'option_chains.json'
+
+# (symbol, secType, expiry, right, exchange) -> (fetched_at, [Contract, ...])
+_chains = {}
+_loaded = False
+# Set when _chains changed since it was last written; the file is written once per run (see save_async)
+_dirty = False
+_pending = {}
+# chain key -> (cached contract list, OptionChain built from it)
+_arrays = {}
+
+
+def chain_key(symbol: str, secType: str, expiry: str, right: str, exchange: str) -> tuple:
+    return symbol, secType, expiry, right, exchange
+
+
+def _is_fresh(fetched_at: float, expiry: str) -> bool:
+    if time.time() - fetched_at > cfg.chain_cache_ttl:
+        return False
+    # Compare at the expiry's own precision, so a YYYYMM month expiry stays fresh through its month
+    return expiry >= datetime.today().strftime('%Y%m%d')[:len(expiry)]
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    for entry in load_json(cache_path(CACHE_FILE), default=[]):
+        key = tuple(entry['key'])
+        if _is_fresh(entry['fetched_at'], key[2]):
+            _chains[key] = (entry['fetched_at'], [contract_from_dict(c) for c in entry['contracts']])
+
+
+def _serialize(entries: list) -> list:
+    return [
+        {'key': list(key), 'fetched_at': fetched_at, 'contracts': [contract_to_dict(c) for c in contracts]}
+        for key, (fetched_at, contracts) in entries
+    ]
+
+
+def save() -> None:
+    """
+    Writes the cache file if the cache changed since the last write.
+    """
+    global _dirty
+    if _dirty:
+        _dirty = False
+        save_json(cache_path(CACHE_FILE), _serialize(list(_chains.items())))
+
+
+async def save_async() -> None:
+    """
+    Same as save, with the serialization and the write done off the event loop.
+    """
+    global _dirty
+    if _dirty:
+        _dirty = False
+        entries = list(_chains.items())
+        await save_json_async(cache_path(CACHE_FILE), lambda: _serialize(entries))
+
+
+def get_cached_chain(key: tuple) -> Optional[list]:
+    """
+    Return the cached option contracts for a chain key, or None if missing or stale.
+    """
+    _load()
+    entry = _chains.get(key)
+    if entry is None:
+        return None
+    fetched_at, contracts = entry
+    if not _is_fresh(fetched_at, key[2]):
+        del _chains[key]
+        return None
+    return contracts
+
+
+def store_chain(key: tuple, contracts: list) -> None:
+    global _dirty
+    _load()
+    _chains[key] = (time.time(), contracts)
+    _dirty = True
+
+
+def invalidate(symbol: str = None, expiry: str = None) -> None:
+    """
+    Drop cached chains. With no arguments the whole cache is cleared, otherwise only entries matching the
+    given symbol and/or expiry.
+    """
+    global _dirty
+    _load()
+    for key in list(_chains):
+        if (symbol is None or key[0] == symbol) and (expiry is None or key[2] == expiry):
+            del _chains[key]
+            _dirty = True
+
+
+async def _fetch_chain_async(key: tuple, currency: str) -> list:
+    symbol, secType, expiry, right, exchange = key
+    option_contract = Contract()
+    option_contract.symbol = symbol
+    option_contract.secType = secType
+    option_contract.exchange = exchange
+    option_contract.currency = currency
+    option_contract.lastTradeDateOrContractMonth = expiry
+    option_contract.right = right
+
+    details = await ib.reqContractDetailsAsync(option_contract)
+    contracts = [detail.contract for detail in details]
+    if contracts:
+        store_chain(key, contracts)
+    logger.info("Fetched %d option contracts for %s from IB.", len(contracts), key)
+    return contracts
+
+
+async def get_option_contracts_async(symbol: str, secType: str, expiry: str, right: str, exchange: str,
+                                     currency: str = 'USD') -> list:
+    """
+    Return the qualified option contracts of one chain, served from the cache when possible.
+
+    Args:
+        symbol: Underlying symbol.
+        secType: 'OPT' or 'FOP'.
+        expiry: Expiry date in 'YYYYMMDD' format.
+        right: 'C', 'P' or '' for both.
+        exchange: Option exchange.
+        currency: Contract currency.
+
+    Returns:
+        list: Qualified option Contracts (empty if IB has none).
+    """
+    key = chain_key(symbol, secType, expiry, right, exchange)
+    contracts = get_cached_chain(key)
+    if contracts is not None:
+        return contracts
+
+    # Share a single request between concurrent lookups of the same chain
+    if key not in _pending:
+        _pending[key] = asyncio.ensure_future(_fetch_chain_async(key, currency))
+    try:
+        return await asyncio.shield(_pending[key])
+    finally:
+        if _pending.get(key) is not None and _pending[key].done():
+            del _pending[key]
+
+
+async def get_option_chain_async(symbol: str, secType: str, expiry: str, right: str, exchange: str,
+                                 currency: str = 'USD') -> OptionChain:
+    """
+    Same chain as get_option_contracts_async, as an array-backed OptionChain. The arrays are built once per
+    cached contract list.
+    """
+    contracts = await get_option_contracts_async(symbol, secType, expiry, right, exchange, currency)
+    key = chain_key(symbol, secType, expiry, right, exchange)
+    cached = _arrays.get(key)
+    if cached is None or cached[0] is not contracts:
+        cached = _arrays[key] = (contracts, OptionChain.from_contracts(contracts))
+    return cached[1]
+
+
+def get_option_contracts(symbol: str, secType: str, expiry: str, right: str, exchange: str,
+                         currency: str = 'USD') -> list:
+    """
+    Blocking wrapper around get_option_contracts_async.
+    """
+    return ib.run(get_option_contracts_async(symbol, secType, expiry, right, exchange, currency))
+
+
+# Anything fetched after the last save_async (e.g. through the blocking wrappers) is written on exit
+atexit.register(save)
@@ -0,0 +1,311 @@
+import asyncio
+import time
+from eventkit import Event
+from ib_insync import IB, util
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+# Attributes that never need a live connection: events, local state and connection control
+_PASSIVE_ATTRIBUTES = {'client', 'wrapper', 'isConnected', 'disconnect', 'sleep', 'waitOnUpdate', 'loopUntil',
+                       'tickers', 'pendingTickers', 'trades', 'openTrades', 'orders', 'openOrders', 'fills',
+                       'executions', 'ticker', 'positions', 'portfolio', 'accountValues', 'managedAccounts',
+                       'cancelMktData', 'connect', 'connectAsync'}
+
+
+def _backoff_delays(retries: int):
+    """
+    Exponential backoff delays between connection attempts, capped at cfg.ib_connect_backoff_max.
+    """
+    for attempt in range(retries - 1):
+        yield min(cfg.ib_connect_backoff * 2 ** attempt, cfg.ib_connect_backoff_max)
+
+
+class ConnectionManager:
+    """
+    Owns the IB connection: connects on first use with exponential backoff, reconnects after an unexpected
+    disconnect and re-requests the streaming market data that was open at the time.
+    """
+
+    def __init__(self, ib: IB, host: str, port: int, client_id: int, readonly: bool = False):
+        self.ib = ib
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.readonly = readonly
+        self.reconnects = 0
+        self.last_error = None
+        self._closing = False
+        self._connect_lock = None
+        self._reconnect_task = None
+        # id(contract) -> (contract, genericTickList, ticker) for every open streaming subscription
+        self._subscriptions = {}
+        ib.disconnectedEvent += self._on_disconnected
+
+    def is_connected(self) -> bool:
+        return self.ib.isConnected()
+
+    def reconnecting(self) -> bool:
+        return self._reconnect_task is not None and not self._reconnect_task.done()
+
+    def connect(self) -> None:
+        """
+        Connects if not connected yet, blocking with backoff between attempts. Raises ConnectionError when every
+        attempt fails.
+        """
+        if self.is_connected():
+            return
+        util.run(self.connect_async())
+
+    async def connect_async(self) -> None:
+        """
+        Connects if not connected yet, retrying cfg.ib_connect_retries times with exponential backoff. Concurrent
+        callers share one connection attempt.
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.is_connected():
+                return
+            self._closing = False
+            delays = _backoff_delays(cfg.ib_connect_retries)
+            for attempt in range(1, cfg.ib_connect_retries + 1):
+                try:
+                    logger.info("Attempt %d to connect to Interactive Brokers...", attempt)
+                    await self.ib.connectAsync(self.host, self.port, self.client_id, timeout=cfg.ib_connect_timeout,
+                                               readonly=self.readonly)
+                    logger.info('Successfully connected to Interactive Brokers!')
+                    self.last_error = None
+                    return
+                except Exception as e:
+                    self.last_error = str(e) or type(e).__name__
+                    logger.error('Failed to connect to Interactive Brokers on attempt %d. Error: %s', attempt,
+                                 self.last_error)
+                    delay = next(delays, None)
+                    if delay is not None:
+                        await asyncio.sleep(delay)
+            raise ConnectionError(f"Could not connect to IB at {self.host}:{self.port} after "
+                                  f"{cfg.ib_connect_retries} attempts: {self.last_error}")
+
+    def close(self) -> None:
+        """
+        Disconnects without triggering a reconnect.
+        """
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.ib.disconnect()
+
+    def _on_disconnected(self):
+        if self._closing or not cfg.ib_auto_reconnect:
+            return
+        logger.warning("Disconnected from Interactive Brokers, reconnecting.")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # nothing is running; the next request reconnects on first use
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = loop.create_task(self._reconnect_async())
+
+    async def _reconnect_async(self):
+        try:
+            await self.connect_async()
+        except ConnectionError as e:
+            logger.error("Reconnect failed: %s", e)
+            return
+        self.reconnects += 1
+        self._resubscribe()
+
+    # Streaming market data bookkeeping
+
+    def track_subscription(self, contract, genericTickList: str, ticker):
+        self._subscriptions[id(contract)] = (contract, genericTickList, ticker)
+
+    def untrack_subscription(self, contract):
+        self._subscriptions.pop(id(contract), None)
+
+    def _resubscribe(self):
+        """
+        Re-requests every streaming subscription after a reconnect. The new connection hands out new tickers,
+        so their updates are copied into the tickers callers already hold.
+        """
+        for key, (contract, generic_ticks, ticker) in list(self._subscriptions.items()):
+            new_ticker = self.ib.reqMktData(contract, generic_ticks, False, False)
+            if new_ticker is not ticker:
+                new_ticker.updateEvent += lambda t, old=ticker: (util.dataclassUpdate(old, t),
+                                                                 old.updateEvent.emit(old))
+        if self._subscriptions:
+            logger.info("Re-established %d market data subscriptions.", len(self._subscriptions))
+
+    # Health
+
+    async def ping_async(self) -> dict:
+        """
+        Health and latency probe: round-trip time of a reqCurrentTime request.
+
+        Returns:
+            dict: connected, latency_ms (None when not connected or the request failed), server_time,
+            reconnects and last_error.
+        """
+        health = {
+            "connected": self.is_connected(),
+            "latency_ms": None,
+            "server_time": None,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+        if not health["connected"]:
+            return health
+        start = time.perf_counter()
+        try:
+            health["server_time"] = await asyncio.wait_for(self.ib.reqCurrentTimeAsync(), cfg.ib_connect_timeout)
+            health["latency_ms"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            health["last_error"] = str(e) or type(e).__name__
+        return health
+
+    def ping(self) -> dict:
+        return util.run(self.ping_async())
+
+
+class ManagedIB:
+    """
+    Stand-in for the shared IB instance that connects through a ConnectionManager on first use. Events and
+    local state pass straight through; requests connect first when needed.
+
+    Async requests (the *Async methods) wait for a connection, including one being re-established after a
+    disconnect. Sync requests such as reqMktData or placeOrder cannot block inside a running event loop, so there
+    they raise ConnectionError while disconnected, even with a reconnect under way; async code that needs them
+    across a reconnect should await ib.connection.connect_async() first.
+    """
+
+    def __init__(self, ib: IB, manager: ConnectionManager):
+        self.__dict__['_ib'] = ib
+        self.__dict__['connection'] = manager
+
+    def __getattr__(self, name):
+        attr = getattr(self._ib, name)
+        if name in _PASSIVE_ATTRIBUTES or name.endswith('Event') or not callable(attr):
+            return attr
+        if name.endswith('Async'):
+            async def connected_call(*args, **kwargs):
+                await self.connection.connect_async()
+                return await attr(*args, **kwargs)
+            return connected_call
+
+        def connected_call(*args, **kwargs):
+            if not self.connection.is_connected():
+                if asyncio.get_event_loop().is_running():
+                    state = "reconnecting" if self.connection.reconnecting() else "not connected"
+                    raise ConnectionError(f"IB is {state}, cannot call {name} from inside the event loop")
+                self.connection.connect()
+            return attr(*args, **kwargs)
+        return connected_call
+
+    def __setattr__(self, name, value):
+        setattr(self._ib, name, value)
+
+    def reqMktData(self, contract, genericTickList: str = '', snapshot: bool = False,
+                   regulatorySnapshot: bool = False, mktDataOptions=None):
+        ticker = self.__getattr__('reqMktData')(contract, genericTickList, snapshot, regulatorySnapshot,
+                                                mktDataOptions)
+        if not snapshot and not regulatorySnapshot:
+            self.connection.track_subscription(contract, genericTickList, ticker)
+        return ticker
+
+    def cancelMktData(self, contract):
+        self.connection.untrack_subscription(contract)
+        return self._ib.cancelMktData(contract)
+
+    def run(self, *awaitables, timeout=None):
+        if awaitables:
+            self.connection.connect()
+        return self._ib.run(*awaitables, timeout=timeout)
+
+    def ping(self) -> dict:
+        return self.connection.ping()
+
+    async def ping_async(self) -> dict:
+        return await self.connection.ping_async()
+
+
+# Session role for each IB method or attribute; anything not listed goes to the orders session
+ROLE_ROUTES = {
+    'market_data': {'reqMktData', 'cancelMktData', 'reqTickers', 'reqTickersAsync', 'reqHistoricalData',
+                    'reqHistoricalDataAsync', 'reqMarketDataType', 'tickers', 'pendingTickers', 'ticker',
+                    'pendingTickersEvent', 'barUpdateEvent'},
+    'contracts': {'qualifyContracts', 'qualifyContractsAsync', 'reqContractDetails', 'reqContractDetailsAsync',
+                  'reqSecDefOptParams', 'reqSecDefOptParamsAsync', 'reqMatchingSymbols',
+                  'reqMatchingSymbolsAsync'},
+}
+_ROLE_OF = {name: role for role, names in ROLE_ROUTES.items() for name in names}
+ORDERS_ROLE = 'orders'
+
+# Events merged across all sessions on the pool
+_MERGED_EVENTS = ('errorEvent', 'disconnectedEvent')
+
+
+class SessionPool:
+    """
+    One IB client session per role (orders, market_data, contracts), each on its own clientId and socket, behind
+    the same interface as a single IB instance. Calls are routed to a session by method name, so chain-wide
+    market data bursts and contract lookups never queue ahead of order traffic. Roles configured with the same
+    clientId share a session.
+    """
+
+    def __init__(self, host: str, port: int, client_ids: dict, readonly: bool = False):
+        by_client_id = {}
+        self.sessions = {}
+        for role, client_id in client_ids.items():
+            if client_id not in by_client_id:
+                ib = IB()
+                by_client_id[client_id] = ManagedIB(ib, ConnectionManager(ib, host, port, client_id, readonly))
+            self.sessions[role] = by_client_id[client_id]
+        self._unique_sessions = list(by_client_id.values())
+        for name in _MERGED_EVENTS:
+            merged = Event(name)
+            for session in self._unique_sessions:
+                getattr(session, name).connect(merged.emit)
+            setattr(self, name, merged)
+
+    def session(self, role: str) -> ManagedIB:
+        return self.sessions.get(role) or self.sessions[ORDERS_ROLE]
+
+    def __getattr__(self, name):
+        return getattr(self.session(_ROLE_OF.get(name, ORDERS_ROLE)), name)
+
+    @property
+    def connection(self) -> ConnectionManager:
+        return self.session(ORDERS_ROLE).connection
+
+    async def connect_async(self) -> None:
+        await asyncio.gather(*(session.connection.connect_async() for session in self._unique_sessions))
+
+    def connect(self) -> None:
+        if not all(session.connection.is_connected() for session in self._unique_sessions):
+            util.run(self.connect_async())
+
+    def isConnected(self) -> bool:
+        return all(session.isConnected() for session in self._unique_sessions)
+
+    def disconnect(self) -> None:
+        for session in self._unique_sessions:
+            session.connection.close()
+
+    def run(self, *awaitables, timeout=None):
+        # Every session is connected up front, as sync calls such as reqMktData and placeOrder cannot connect
+        # from inside the event loop
+        if awaitables:
+            self.connect()
+        return util.run(*awaitables, timeout=timeout)
+
+    async def ping_async(self) -> dict:
+        """
+        Health probe per role (see ConnectionManager.ping_async).
+        """
+        health = await asyncio.gather(*(session.connection.ping_async() for session in self.sessions.values()))
+        return dict(zip(self.sessions, health))
+
+    def ping(self) -> dict:
+        return util.run(self.ping_async())
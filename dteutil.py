@@ -1,56 +1,84 @@
 import pytz
-import pandas_market_calendars as mcal
-import pandas as pd
-from pandas.tseries.offsets import BDay
-from datetime import datetime, timedelta, time
-import cfg
-from pytz import timezone
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta, time
+from cache_store import cache_path, load_json, save_json
+from log_config import get_logger
+import event_calendar
 
-def next_market_day_mwf(start_date):
-
-    # Convert datetime object to string in the format 'yyyy-mm-dd'
-    start_date_str = start_date.strftime('%Y-%m-%d')
+logger = get_logger(__name__)
 
-    # Create a calendar for NYSE
-    nyse = mcal.get_calendar('NYSE')
+TRADING_DAYS_FILE = 'nyse_trading_days_{year}.json'
 
-    # Define an end date for the range, here we look one year ahead which should be more than enough
-    end_date_str = (start_date + timedelta(days=30)).strftime('%Y-%m-%d')
+# year -> sorted list of NYSE trading dates
+_trading_days = {}
 
-    # Get the market schedule within the range
-    market_days = nyse.schedule(start_date=start_date_str, end_date=end_date_str)
 
-    # Find the next market day that is a Monday, Wednesday, or Friday
-    for date in market_days.index:
-        if date.date() > start_date.date() and date.weekday() in [0, 2, 4]:  # Check weekday
-            return date.date()
+def _build_trading_days(year):
+    # Only needed when a year is not cached yet, so keep the pandas import off the normal path
+    import pandas_market_calendars as mcal
 
-    # In case no market day is found within the range (shouldn't happen with a one-year range)
+    nyse = mcal.get_calendar('NYSE')
+    market_days = nyse.schedule(start_date=f'{year}-01-01', end_date=f'{year}-12-31')
+    return [day.date() for day in market_days.index]
+
+
+def trading_days(year):
+    """
+    Sorted NYSE trading dates for a year, built once from the exchange calendar and cached on disk.
+    """
+    if year not in _trading_days:
+        path = cache_path(TRADING_DAYS_FILE.format(year=year))
+        cached = load_json(path)
+        if cached is None:
+            days = _build_trading_days(year)
+            save_json(path, [day.strftime('%Y%m%d') for day in days])
+        else:
+            days = [datetime.strptime(day, '%Y%m%d').date() for day in cached]
+        _trading_days[year] = days
+    return _trading_days[year]
+
+
+def next_trading_day(start: date, inclusive: bool = True):
+    """
+    First trading day on (or, with inclusive=False, strictly after) the given date, or None if there is none
+    within the following year.
+    """
+    for year in (start.year, start.year + 1):
+        days = trading_days(year)
+        i = bisect_left(days, start) if inclusive else bisect_right(days, start)
+        if i < len(days):
+            return days[i]
     return None
 
-def next_market_day_mindays(start_date, min_days):
-    # Convert datetime object to time before market start time
-    start_date = datetime.combine(start_date.date(), time(0, 0))
 
-    # Create a calendar for NYSE
-    nyse = mcal.get_calendar('NYSE')
+def _add_business_days(start: date, days: int) -> date:
+    """
+    Same result as pandas BDay: weekends roll forward, holidays are not skipped.
+    """
+    current = start
+    while current.weekday() >= 5:
+        current += timedelta(days=1)
+    if current != start and days > 0:
+        days -= 1
+    while days > 0:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days -= 1
+    return current
 
-    # Define an end date for the range. We look one year ahead which should be more than enough.
-    end_date = (start_date + timedelta(days=365))
 
-    # Get the market schedule within the range
-    market_days = nyse.schedule(start_date=start_date, end_date=end_date)
+def next_market_day_mwf(start_date):
+    # Find the next market day after start_date that is a Monday, Wednesday, or Friday
+    day = next_trading_day(start_date.date(), inclusive=False)
+    while day is not None and day.weekday() not in [0, 2, 4]:
+        day = next_trading_day(day, inclusive=False)
+    return day
 
-    # Add business days to the start date using BDay
-    target_date = pd.Timestamp(start_date) + BDay(min_days)
 
+def next_market_day_mindays(start_date, min_days):
     # Find the next market day that is at least min_days business days away
-    for date in market_days.index:
-        if date >= target_date:
-            return date.date()
-
-    # In case no market day is found within the range (shouldn't happen with a one-year range)
-    return None
+    target_date = _add_business_days(start_date.date(), min_days)
+    return next_trading_day(target_date)
 
 
 def get_next_contract_expiration(symbol):
@@ -91,56 +119,20 @@ def is_market_open():
     return True
 
 def safe_to_trade_fomc(exp_date):
-    now = datetime.now(timezone('US/Eastern'))
-    safe_time = time(14, 5)
     try:
-        # Convert strings to datetime objects for comparison
-        exp_date = datetime.strptime(exp_date, "%Y%m%d")
-        today = datetime.today()
+        datetime.strptime(exp_date, "%Y%m%d")
     except ValueError:
         return "safe_to_trade_FOMC: Incorrect date format, should be YYYYMMDD"
 
-    # Compare each FOMC day with the input date and today
-    for fomc_day in cfg.fomc_days:
-        fomc_day = datetime.strptime(fomc_day, "%Y%m%d").date()
-
-        if now.time() > safe_time and today == fomc_day:
-            print("This is a FOMC day, but the time is after the release, we're OK")
-            return True
-
-        # If FOMC day falls within the range (inclusive), return False
-        if today.date() <= fomc_day <= exp_date.date():
-            print("safe_to_trade_FOMC returning false")
-            return False
-    return True
+    # An FOMC announcement between now and expiry (until shortly after its release) blocks trading
+    return event_calendar.safe_to_trade(exp_date, kinds=('FOMC',))
 
 
 def safe_to_trade_cpi(exp_date):
     try:
-        # Convert date strings to datetime objects for comparison
-        exp_date = datetime.strptime(exp_date, "%Y%m%d").date()
-        now = datetime.now(timezone('US/Eastern'))
+        datetime.strptime(exp_date, "%Y%m%d")
     except ValueError:
         return "Incorrect date format, should be YYYYMMDD"
 
-    today = datetime.now(timezone('US/Eastern')).date()
-    safe_time = time(8, 35)
-
-    # Compare each CPI day with the input date and today
-    for cpi_day in cfg.cpi_days:
-        cpi_day = datetime.strptime(cpi_day, "%Y%m%d").date()
-
-        if now.time() < safe_time and today == cpi_day:
-            print("This is a CPI day, can't trade until after 9:30 AST")
-            return False
-
-        if now.time() > safe_time and today == cpi_day:
-            print("This is a CPI day, but the time is after the release, we're OK")
-            return True
-
-        # If CPI day falls within the range (inclusive), return False
-        if today <= cpi_day <= exp_date:
-            print(f"safe_to_trade_CPI: CPI data release pending, returning false")
-            return False
-
-    return True
+    # A CPI release between now and expiry (until shortly after its release) blocks trading
+    return event_calendar.safe_to_trade(exp_date, kinds=('CPI',))
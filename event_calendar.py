@@ -0,0 +1,124 @@
+import csv
+from bisect import bisect_right
+from datetime import datetime, timedelta, time
+from typing import NamedTuple
+from pytz import timezone
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+EASTERN = timezone('US/Eastern')
+
+
+class EconomicEvent(NamedTuple):
+    release: datetime  # Release time, US/Eastern
+    kind: str  # e.g. 'FOMC', 'CPI', 'NFP'
+
+
+# Sorted by release time, with a parallel list of release times for bisecting
+_events = None
+_releases = []
+# (kind, year) pairs that have at least one release in the calendar
+_covered = set()
+
+
+def load_events(path: str = None) -> list:
+    """
+    Read the event calendar CSV (columns: date as YYYYMMDD, time as HH:MM US/Eastern, kind). Blank lines and lines
+    starting with '#' are ignored.
+
+    Returns:
+        list: EconomicEvent entries sorted by release time.
+    """
+    path = path or cfg.event_calendar_file
+    events = []
+    try:
+        with open(path, newline='') as f:
+            rows = csv.DictReader(line for line in f if line.strip() and not line.startswith('#'))
+            for row in rows:
+                release = datetime.strptime(f"{row['date']} {row['time']}", '%Y%m%d %H:%M')
+                events.append(EconomicEvent(EASTERN.localize(release), row['kind'].strip().upper()))
+    except FileNotFoundError:
+        logger.warning("Event calendar %s not found, no economic events will block trading.", path)
+    events.sort()
+    return events
+
+
+def _index():
+    global _events, _releases, _covered
+    if _events is None:
+        _events = load_events()
+        _releases = [event.release for event in _events]
+        _covered = {(event.kind, event.release.year) for event in _events}
+    return _events
+
+
+def missing_kinds(exp_date: str, kinds=None, now: datetime = None) -> list:
+    """
+    Event kinds (default cfg.blocking_event_kinds) with no releases in the calendar for the current year or the
+    expiry's year, i.e. kinds the calendar cannot vouch for.
+    """
+    _index()
+    kinds = kinds or cfg.blocking_event_kinds
+    years = _years(exp_date, now)
+    return [kind for kind in kinds if any((kind, year) not in _covered for year in years)]
+
+
+def _years(exp_date: str, now: datetime = None) -> list:
+    """
+    Years a check from now to the expiry date has to see: the current year and the expiry's year.
+    """
+    now = now or datetime.now(EASTERN)
+    return sorted({now.year, datetime.strptime(exp_date, '%Y%m%d').year})
+
+
+def reload():
+    global _events
+    _events = None
+    _index()
+
+
+def blocking_events(exp_date: str, kinds=None, now: datetime = None) -> list:
+    """
+    Events of the given kinds (default cfg.blocking_event_kinds) that are still pending between now and the end
+    of the expiry date. An event stops blocking cfg.event_settle_minutes after its release.
+
+    Args:
+        exp_date: Expiry date in 'YYYYMMDD' format.
+        kinds: Event kinds to consider.
+        now: Reference time (defaults to the current US/Eastern time).
+
+    Returns:
+        list: The blocking EconomicEvent entries, in release order.
+    """
+    events = _index()
+    kinds = kinds or cfg.blocking_event_kinds
+    now = now or datetime.now(EASTERN)
+    window_start = now - timedelta(minutes=cfg.event_settle_minutes)
+    window_end = EASTERN.localize(datetime.combine(datetime.strptime(exp_date, '%Y%m%d').date(), time.max))
+
+    first = bisect_right(_releases, window_start)
+    last = bisect_right(_releases, window_end)
+    return [event for event in events[first:last] if event.kind in kinds]
+
+
+def safe_to_trade(exp_date: str, kinds=None, now: datetime = None) -> bool:
+    """
+    True if no blocking event is pending between now and expiry. Fails closed: False when the calendar has no
+    releases of a requested kind for the year, as the check could not see them.
+    """
+    missing = missing_kinds(exp_date, kinds, now)
+    if missing:
+        uncovered = [str(year) for year in _years(exp_date, now)
+                     if any((kind, year) not in _covered for kind in missing)]
+        logger.error("Event calendar %s lists no %s releases for %s, so no entry expiring %s is safe to trade. "
+                     "Add the release dates for %s to the calendar to trade again.", cfg.event_calendar_file,
+                     '/'.join(missing), '/'.join(uncovered), exp_date, '/'.join(uncovered))
+        return False
+    pending = blocking_events(exp_date, kinds, now)
+    if pending:
+        logger.info("Pending %s release at %s before expiry %s, not safe to trade.", pending[0].kind,
+                    pending[0].release, exp_date)
+        return False
+    return True
@@ -0,0 +1,468 @@
+import asyncio
+import copy
+import itertools
+import math
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from eventkit import Event
+from ib_insync import (Contract, ContractDetails, Ticker, Trade, OrderStatus, OrderState, BarData, Fill, Execution,
+                       CommissionReport, util)
+from ib_insync.objects import OptionChain
+from cache_store import load_json, save_json, contract_to_dict, contract_from_dict
+from log_config import get_logger, setup_logging
+import cfg
+
+logger = get_logger(__name__)
+
+# Fixture files inside a fixture directory
+CONTRACTS_FILE = 'contracts.json'  # list of qualified contracts
+SECDEF_FILE = 'secdef.json'  # list of reqSecDefOptParams entries
+QUOTES_FILE = 'quotes.json'  # conId -> {bid, ask, last, bidSize, askSize, lastSize, close}
+HISTORICAL_FILE = 'historical.json'  # conId -> list of daily bars
+ORDERS_FILE = 'orders.json'  # {statuses: [...], interval: seconds, init_margin_per_unit: float}
+
+DEFAULT_ORDER_FLOW = {"statuses": ["PreSubmitted", "Submitted"], "interval": 0.005, "init_margin_per_unit": 1000.0}
+
+
+class FakeClient:
+    """
+    Stand-in for ib_insync's Client: only the local request/order ID sequence.
+    """
+
+    def __init__(self):
+        self._reqIdSeq = 1
+
+    def getReqId(self) -> int:
+        req_id = self._reqIdSeq
+        self._reqIdSeq += 1
+        return req_id
+
+
+class FakeIB:
+    """
+    Offline replacement for the parts of ib_insync.IB used by this project. Requests are answered from recorded
+    fixture files after a configurable latency, optionally throttled to a pacing limit. Counts requests and
+    market-data lines so runs against it can be measured.
+    """
+
+    def __init__(self, fixture_dir: str, latency: float = 0.0, pacing: float = None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.pacing = pacing
+        self.client = FakeClient()
+
+        self._contracts = [contract_from_dict(c) for c in self._load(CONTRACTS_FILE, [])]
+        self._secdefs = self._load(SECDEF_FILE, [])
+        self._quotes = {int(con_id): quote for con_id, quote in self._load(QUOTES_FILE, {}).items()}
+        self._historical = {int(con_id): bars for con_id, bars in self._load(HISTORICAL_FILE, {}).items()}
+        self._order_flow = {**DEFAULT_ORDER_FLOW, **self._load(ORDERS_FILE, {})}
+
+        self._tickers = {}
+        self._lines = set()
+        self._trades = []
+        self._fills = []
+        self._staged = {}
+        self._pace_lock = None
+        self._last_request = 0.0
+
+        self.request_counts = Counter()
+        self.peak_lines = 0
+
+        self.pendingTickersEvent = Event('pendingTickersEvent')
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.errorEvent = Event('errorEvent')
+        self.updateEvent = Event('updateEvent')
+        self.connectedEvent = Event('connectedEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+
+    @classmethod
+    def from_config(cls):
+        return cls(os.environ.get('EODSTR_FAKE_IB') or cfg.ib_fake_fixtures, cfg.ib_fake_latency,
+                   cfg.ib_fake_pacing)
+
+    def _load(self, filename, default):
+        return load_json(os.path.join(self.fixture_dir, filename), default=default)
+
+    # Connection and event loop
+
+    def connect(self, *args, **kwargs):
+        self.connectedEvent.emit()
+        return self
+
+    async def connectAsync(self, *args, **kwargs):
+        return self.connect()
+
+    def disconnect(self):
+        self.disconnectedEvent.emit()
+
+    def isConnected(self) -> bool:
+        return True
+
+    def run(self, *awaitables, timeout=None):
+        return util.run(*awaitables, timeout=timeout)
+
+    def sleep(self, secs: float = 0.02) -> bool:
+        util.run(asyncio.sleep(secs))
+        return True
+
+    def waitOnUpdate(self, timeout: float = 0) -> bool:
+        util.run(asyncio.wait_for(self.updateEvent.wait(), timeout or None))
+        return True
+
+    async def reqCurrentTimeAsync(self) -> datetime:
+        await self._request('reqCurrentTime')
+        return datetime.now()
+
+    def reqCurrentTime(self) -> datetime:
+        return self.run(self.reqCurrentTimeAsync())
+
+    # Pacing, latency and bookkeeping
+
+    async def _request(self, name: str):
+        self.request_counts[name] += 1
+        if self.pacing:
+            if self._pace_lock is None:
+                self._pace_lock = asyncio.Lock()
+            async with self._pace_lock:
+                wait = self._last_request + 1.0 / self.pacing - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_request = time.monotonic()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _open_line(self, con_id: int):
+        self._lines.add(con_id)
+        self.peak_lines = max(self.peak_lines, len(self._lines))
+
+    @property
+    def open_lines(self) -> int:
+        return len(self._lines)
+
+    def reset_stats(self):
+        """
+        Zeroes the request counters and restarts peak line tracking from the lines open now.
+        """
+        self.request_counts.clear()
+        self.peak_lines = len(self._lines)
+
+    def reset_market_data(self):
+        """
+        Drops every ticker and open line, as a fresh connection would start.
+        """
+        self._tickers.clear()
+        self._lines.clear()
+
+    # Contracts
+
+    def _matches(self, query: Contract) -> list:
+        matches = []
+        for contract in self._contracts:
+            if query.conId:
+                if contract.conId == query.conId:
+                    matches.append(contract)
+                continue
+            if query.symbol and contract.symbol != query.symbol:
+                continue
+            if query.secType and contract.secType != query.secType:
+                continue
+            if query.lastTradeDateOrContractMonth and \
+                    not contract.lastTradeDateOrContractMonth.startswith(query.lastTradeDateOrContractMonth):
+                continue
+            if query.strike and contract.strike != query.strike:
+                continue
+            if query.right and contract.right[:1] != query.right[:1]:
+                continue
+            if query.tradingClass and contract.tradingClass != query.tradingClass:
+                continue
+            if query.multiplier and contract.multiplier != query.multiplier:
+                continue
+            matches.append(contract)
+        return matches
+
+    def _resolved(self, match: Contract, query: Contract) -> Contract:
+        contract = copy.copy(match)
+        if query.exchange:
+            contract.exchange = query.exchange
+        return contract
+
+    async def qualifyContractsAsync(self, *contracts: Contract) -> list:
+        await self._request('qualifyContracts')
+        qualified = []
+        for contract in contracts:
+            matches = self._matches(contract)
+            if len(matches) == 1:
+                util.dataclassUpdate(contract, self._resolved(matches[0], contract))
+                qualified.append(contract)
+            else:
+                self.errorEvent.emit(-1, 200, f"No unique match for {contract} ({len(matches)} found)", contract)
+        return qualified
+
+    def qualifyContracts(self, *contracts: Contract) -> list:
+        return self.run(self.qualifyContractsAsync(*contracts))
+
+    async def reqContractDetailsAsync(self, contract: Contract) -> list:
+        await self._request('reqContractDetails')
+        return [ContractDetails(contract=self._resolved(match, contract)) for match in self._matches(contract)]
+
+    def reqContractDetails(self, contract: Contract) -> list:
+        return self.run(self.reqContractDetailsAsync(contract))
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol: str, futFopExchange: str, underlyingSecType: str,
+                                      underlyingConId: int) -> list:
+        await self._request('reqSecDefOptParams')
+        return [
+            OptionChain(entry['exchange'], entry['underlyingConId'], entry['tradingClass'], entry['multiplier'],
+                        entry['expirations'], entry['strikes'])
+            for entry in self._secdefs
+            if entry['symbol'] == underlyingSymbol and (not underlyingConId or
+                                                        entry['underlyingConId'] == underlyingConId)
+        ]
+
+    def reqSecDefOptParams(self, underlyingSymbol: str, futFopExchange: str, underlyingSecType: str,
+                           underlyingConId: int) -> list:
+        return self.run(self.reqSecDefOptParamsAsync(underlyingSymbol, futFopExchange, underlyingSecType,
+                                                     underlyingConId))
+
+    # Market data
+
+    def _ticker(self, contract: Contract) -> Ticker:
+        ticker = self._tickers.get(contract.conId)
+        if ticker is None:
+            ticker = Ticker(contract=contract)
+            self._tickers[contract.conId] = ticker
+        return ticker
+
+    def _deliver(self, ticker: Ticker):
+        quote = self._quotes.get(ticker.contract.conId)
+        if quote is None:
+            return
+        for field in ('bid', 'ask', 'last', 'bidSize', 'askSize', 'lastSize', 'close'):
+            if field in quote:
+                setattr(ticker, field, quote[field])
+        ticker.time = datetime.now(timezone.utc)
+        ticker.updateEvent.emit(ticker)
+        self.pendingTickersEvent.emit({ticker})
+        self.updateEvent.emit()
+
+    def reqMktData(self, contract: Contract, genericTickList: str = '', snapshot: bool = False,
+                   regulatorySnapshot: bool = False, mktDataOptions=None) -> Ticker:
+        self.request_counts['reqMktData'] += 1
+        ticker = self._ticker(contract)
+        self._open_line(contract.conId)
+        loop = asyncio.get_event_loop()
+
+        def deliver():
+            self._deliver(ticker)
+            if snapshot:
+                self._lines.discard(contract.conId)
+
+        loop.call_later(self.latency, deliver)
+        return ticker
+
+    def cancelMktData(self, contract: Contract):
+        self.request_counts['cancelMktData'] += 1
+        self._lines.discard(contract.conId)
+
+    def tickers(self) -> list:
+        return list(self._tickers.values())
+
+    async def reqTickersAsync(self, *contracts: Contract, regulatorySnapshot: bool = False) -> list:
+        await self._request('reqTickers')
+        tickers = [self._ticker(contract) for contract in contracts]
+        for contract in contracts:
+            self._open_line(contract.conId)
+        for ticker in tickers:
+            self._deliver(ticker)
+        for contract in contracts:
+            self._lines.discard(contract.conId)
+        return tickers
+
+    def reqTickers(self, *contracts: Contract, regulatorySnapshot: bool = False) -> list:
+        return self.run(self.reqTickersAsync(*contracts, regulatorySnapshot=regulatorySnapshot))
+
+    async def reqHistoricalDataAsync(self, contract: Contract, endDateTime='', durationStr='', barSizeSetting='',
+                                     whatToShow='', useRTH=True, formatDate=1, keepUpToDate=False,
+                                     chartOptions=None, timeout=60) -> list:
+        await self._request('reqHistoricalData')
+        return [BarData(date=datetime.strptime(bar['date'], '%Y%m%d').date(), open=bar['open'], high=bar['high'],
+                        low=bar['low'], close=bar['close'], volume=bar.get('volume', 0))
+                for bar in self._historical.get(contract.conId, [])]
+
+    def reqHistoricalData(self, contract: Contract, *args, **kwargs) -> list:
+        return self.run(self.reqHistoricalDataAsync(contract, *args, **kwargs))
+
+    # Orders
+
+    def _run_order_flow(self, trade: Trade):
+        loop = asyncio.get_event_loop()
+        interval = self._order_flow['interval']
+        for step, status in enumerate(self._order_flow['statuses'], start=1):
+            loop.call_later(self.latency + interval * step, self._set_status, trade, status)
+
+    def _set_status(self, trade: Trade, status: str):
+        if trade.orderStatus.status in OrderStatus.DoneStates:
+            return
+        trade.orderStatus.status = status
+        if status == 'Filled':
+            trade.orderStatus.filled = trade.order.totalQuantity
+            trade.orderStatus.remaining = 0
+            trade.orderStatus.avgFillPrice = trade.order.lmtPrice
+            execution = Execution(execId=f"fake.{trade.order.orderId}", time=datetime.now(timezone.utc),
+                                  side='SLD' if trade.order.action == 'SELL' else 'BOT',
+                                  shares=trade.order.totalQuantity, price=trade.order.lmtPrice,
+                                  orderId=trade.order.orderId, cumQty=trade.order.totalQuantity,
+                                  avgPrice=trade.order.lmtPrice, orderRef=trade.order.orderRef)
+            fill = Fill(trade.contract, execution, CommissionReport(), execution.time)
+            trade.fills.append(fill)
+            self._fills.append(fill)
+        trade.statusEvent.emit(trade)
+        self.orderStatusEvent.emit(trade)
+
+    def placeOrder(self, contract: Contract, order) -> Trade:
+        self.request_counts['placeOrder'] += 1
+        order.orderId = order.orderId or self.client.getReqId()
+        trade = Trade(contract, order, OrderStatus(orderId=order.orderId, status='PendingSubmit',
+                                                   remaining=order.totalQuantity))
+        self._trades.append(trade)
+        if not order.transmit:
+            self._staged[order.orderId] = trade
+        else:
+            # Transmitting a child releases its staged parent as well
+            parent = self._staged.pop(order.parentId, None) if order.parentId else None
+            if parent is not None:
+                self._run_order_flow(parent)
+            self._run_order_flow(trade)
+        return trade
+
+    async def whatIfOrderAsync(self, contract: Contract, order) -> OrderState:
+        await self._request('whatIfOrder')
+        margin = self._order_flow['init_margin_per_unit'] * order.totalQuantity
+        return OrderState(initMarginChange=str(margin))
+
+    def whatIfOrder(self, contract: Contract, order) -> OrderState:
+        return self.run(self.whatIfOrderAsync(contract, order))
+
+    def trades(self) -> list:
+        return list(self._trades)
+
+    def reqAllOpenOrders(self) -> list:
+        self.request_counts['reqAllOpenOrders'] += 1
+        return [trade.order for trade in self._trades if not trade.isDone()]
+
+    async def reqExecutionsAsync(self, execFilter=None) -> list:
+        await self._request('reqExecutions')
+        return list(self._fills)
+
+    def reqExecutions(self, execFilter=None) -> list:
+        return self.run(self.reqExecutionsAsync(execFilter))
+
+
+def _synthetic_quote(value: float) -> dict:
+    if value < 0.01:
+        return {"bid": -1.0, "ask": 0.05, "bidSize": 0, "askSize": 100}
+    return {"bid": round(value * 0.98, 2), "ask": round(value * 1.02 + 0.01, 2), "last": round(value, 2),
+            "bidSize": 100, "askSize": 100, "close": round(value, 2)}
+
+
+def generate_fixtures(out_dir: str, symbols: list, expiry: str, strike_span: int = 50, first_con_id: int = 1000000):
+    """
+    Writes a synthetic fixture set: one stock per symbol with a 0DTE option chain of 2 * strike_span + 1 strikes
+    (both rights), quotes priced from a simple intrinsic + time value curve, and a month of daily bars.
+    Underlyings with a conid in cfg.params keep it, so the qualification cache seeded from cfg resolves to them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    contracts, secdefs, quotes, historical = [], [], {}, {}
+    configured_ids = {symbol_params.get("conid") for symbol_params in cfg.params.values()}
+    synthetic_ids = (con_id for con_id in itertools.count(first_con_id) if con_id not in configured_ids)
+    for i, symbol in enumerate(symbols):
+        price = 100.0 + 7.3 * i
+        und_id = cfg.params.get(symbol, {}).get("conid") or next(synthetic_ids)
+        contracts.append(contract_to_dict(Contract(secType='STK', conId=und_id, symbol=symbol, exchange='SMART',
+                                                   primaryExchange='ARCA', currency='USD', localSymbol=symbol,
+                                                   tradingClass=symbol)))
+        quotes[und_id] = {"bid": price - 0.01, "ask": price + 0.01, "last": price, "bidSize": 500,
+                          "askSize": 500, "close": price}
+        start = datetime.strptime(expiry, '%Y%m%d') - timedelta(days=30)
+        historical[und_id] = [{"date": (start + timedelta(days=d)).strftime('%Y%m%d'), "open": price,
+                               "high": price, "low": price, "close": price, "volume": 1000}
+                              for d in range(30)]
+
+        strikes = [float(round(price) + k) for k in range(-strike_span, strike_span + 1)]
+        for strike in strikes:
+            for right in ('C', 'P'):
+                intrinsic = max(price - strike, 0.0) if right == 'C' else max(strike - price, 0.0)
+                value = intrinsic + 1.5 * math.exp(-abs(strike - price) / 2.0)
+                con_id = next(synthetic_ids)
+                contracts.append(contract_to_dict(Contract(
+                    secType='OPT', conId=con_id, symbol=symbol, lastTradeDateOrContractMonth=expiry, strike=strike,
+                    right=right, multiplier='100', exchange='SMART', currency='USD',
+                    localSymbol=f"{symbol} {expiry[2:]}{right}{int(strike * 1000):08d}", tradingClass=symbol)))
+                quotes[con_id] = _synthetic_quote(value)
+        secdefs.append({"symbol": symbol, "exchange": 'SMART', "underlyingConId": und_id, "tradingClass": symbol,
+                        "multiplier": '100', "expirations": [expiry], "strikes": strikes})
+
+    save_json(os.path.join(out_dir, CONTRACTS_FILE), contracts)
+    save_json(os.path.join(out_dir, SECDEF_FILE), secdefs)
+    save_json(os.path.join(out_dir, QUOTES_FILE), {str(k): v for k, v in quotes.items()})
+    save_json(os.path.join(out_dir, HISTORICAL_FILE), {str(k): v for k, v in historical.items()})
+    save_json(os.path.join(out_dir, ORDERS_FILE), DEFAULT_ORDER_FLOW)
+
+
+async def record_fixtures_async(ib, out_dir: str, underlyings: list, expiry: str, opt_exchange: str = 'SMART'):
+    """
+    Records a fixture set from a live IB session: the qualified underlyings, their option chain for one expiry,
+    sec-def option parameters, snapshot quotes for everything and a month of daily bars for the underlyings.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    contracts, secdefs, quotes, historical = [], [], {}, {}
+    for und_contract in await ib.qualifyContractsAsync(*underlyings):
+        option_secType = 'FOP' if und_contract.secType == 'FUT' else 'OPT'
+        details = await ib.reqContractDetailsAsync(Contract(
+            symbol=und_contract.symbol, secType=option_secType, exchange=opt_exchange,
+            currency=und_contract.currency, lastTradeDateOrContractMonth=expiry))
+        chain = [und_contract] + [detail.contract for detail in details]
+        contracts.extend(contract_to_dict(contract) for contract in chain)
+
+        for ticker in await ib.reqTickersAsync(*chain):
+            quotes[str(ticker.contract.conId)] = {
+                field: getattr(ticker, field)
+                for field in ('bid', 'ask', 'last', 'bidSize', 'askSize', 'lastSize', 'close')
+                if getattr(ticker, field) is not None and not math.isnan(getattr(ticker, field))
+            }
+
+        for entry in await ib.reqSecDefOptParamsAsync(und_contract.symbol, '', und_contract.secType,
+                                                      und_contract.conId):
+            secdefs.append({"symbol": und_contract.symbol, "exchange": entry.exchange,
+                            "underlyingConId": entry.underlyingConId, "tradingClass": entry.tradingClass,
+                            "multiplier": entry.multiplier, "expirations": sorted(entry.expirations),
+                            "strikes": sorted(entry.strikes)})
+
+        bars = await ib.reqHistoricalDataAsync(und_contract, endDateTime='', durationStr='1 M',
+                                               barSizeSetting='1 day', whatToShow='TRADES', useRTH=True)
+        historical[str(und_contract.conId)] = [
+            {"date": bar.date.strftime('%Y%m%d'), "open": bar.open, "high": bar.high, "low": bar.low,
+             "close": bar.close, "volume": bar.volume} for bar in bars]
+
+    save_json(os.path.join(out_dir, CONTRACTS_FILE), contracts)
+    save_json(os.path.join(out_dir, SECDEF_FILE), secdefs)
+    save_json(os.path.join(out_dir, QUOTES_FILE), quotes)
+    save_json(os.path.join(out_dir, HISTORICAL_FILE), historical)
+    save_json(os.path.join(out_dir, ORDERS_FILE), DEFAULT_ORDER_FLOW)
+    logger.info("Recorded %d contracts to %s", len(contracts), out_dir)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write a synthetic fixture set for the offline IB stand-in.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--symbols', nargs='+', default=cfg.SYMBOLS)
+    parser.add_argument('--expiry', default=None, help='Option expiry as YYYYMMDD (defaults to today)')
+    parser.add_argument('--strike-span', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_logging()
+    generate_fixtures(args.out_dir, args.symbols, args.expiry or datetime.today().strftime('%Y%m%d'), args.strike_span)
@@ -0,0 +1,153 @@
+from datetime import datetime
+import numpy as np
+from pytz import timezone
+import cfg
+
+SECONDS_PER_YEAR = 365.0 * 24 * 3600
+MIN_VOL = 1e-4
+MAX_VOL = 10.0
+
+# Abramowitz & Stegun 7.1.26 coefficients (absolute error below 1.5e-7)
+_A1, _A2, _A3, _A4, _A5, _P = 0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429, 0.3275911
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def norm_cdf(x):
+    """
+    Standard normal CDF, vectorized without scipy.
+    """
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + _P * z)
+    erf = 1.0 - (((((_A5 * t + _A4) * t) + _A3) * t + _A2) * t + _A1) * t * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def norm_pdf(x):
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def time_to_expiry(expiry: str, now: datetime = None) -> float:
+    """
+    Years from now until cfg.option_expiry_time (US/Eastern) on the expiry date, floored at
+    cfg.min_time_to_expiry_seconds so same-day options near the close stay priceable.
+    """
+    eastern = timezone('US/Eastern')
+    now = now or datetime.now(eastern)
+    close = eastern.localize(datetime.strptime(f"{expiry[:8]} {cfg.option_expiry_time}", '%Y%m%d %H:%M'))
+    seconds = max((close - now).total_seconds(), cfg.min_time_to_expiry_seconds)
+    return seconds / SECONDS_PER_YEAR
+
+
+def _d1_d2(spot, strike, t, vol, rate, dividend):
+    vol_sqrt_t = vol * np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate - dividend + 0.5 * vol * vol) * t) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t
+
+
+def bs_price(spot, strike, t, vol, is_call, rate=None, dividend=None):
+    """
+    Black-Scholes-Merton price for arrays of options (is_call is a boolean array).
+    """
+    rate = cfg.risk_free_rate if rate is None else rate
+    dividend = cfg.dividend_yield if dividend is None else dividend
+    d1, d2 = _d1_d2(spot, strike, t, vol, rate, dividend)
+    spot_df = spot * np.exp(-dividend * t)
+    strike_df = strike * np.exp(-rate * t)
+    call = spot_df * norm_cdf(d1) - strike_df * norm_cdf(d2)
+    put = strike_df * norm_cdf(-d2) - spot_df * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_vol(price, spot, strike, t, is_call, rate=None, dividend=None, tolerance=1e-6, max_iterations=20):
+    """
+    Implied volatility for arrays of option prices: safeguarded Newton steps inside a shrinking (geometric)
+    bisection bracket, run at once on every option that has a solution. NaN where the price is missing, outside
+    the no-arbitrage bounds or has no more than `tolerance` of time value (deep in or far out of the money, where
+    the vol is undetermined).
+    """
+    rate = cfg.risk_free_rate if rate is None else rate
+    dividend = cfg.dividend_yield if dividend is None else dividend
+    price, spot, strike, t, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=np.float64), np.asarray(spot, dtype=np.float64),
+        np.asarray(strike, dtype=np.float64), np.asarray(t, dtype=np.float64), np.asarray(is_call))
+    spot_df = spot * np.exp(-dividend * t)
+    strike_df = strike * np.exp(-rate * t)
+    lower_bound = np.where(is_call, np.maximum(spot_df - strike_df, 0.0), np.maximum(strike_df - spot_df, 0.0))
+    upper_bound = np.where(is_call, spot_df, strike_df)
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(price) & (price > lower_bound + tolerance) & (price < upper_bound)
+
+    # Only the options with a solution are iterated on (typically half of a quoted chain)
+    result = np.full(price.shape, np.nan)
+    price, spot, strike, t, is_call = price[valid], spot[valid], strike[valid], t[valid], is_call[valid]
+    spot_df, strike_df, lower_bound = spot_df[valid], strike_df[valid], lower_bound[valid]
+    sqrt_t = np.sqrt(t)
+
+    # Brenner-Subrahmanyam starting point, from the time value
+    vol = np.clip(np.sqrt(2.0 * np.pi / t) * (price - lower_bound) / spot, 0.05, 2.0)
+    low = np.full(price.shape, MIN_VOL)
+    high = np.full(price.shape, MAX_VOL)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iterations):
+            d1, d2 = _d1_d2(spot, strike, t, vol, rate, dividend)
+            # Puts are priced from the call through put-call parity, saving two normal CDFs per step
+            call = spot_df * norm_cdf(d1) - strike_df * norm_cdf(d2)
+            error = np.where(is_call, call, call - spot_df + strike_df) - price
+            if not np.any(np.abs(error) > tolerance):
+                break
+            high = np.where(error > 0, vol, high)
+            low = np.where(error < 0, vol, low)
+            step = vol - error / (spot_df * norm_pdf(d1) * sqrt_t)
+            # The bracket spans orders of magnitude, so it is halved in log space
+            vol = np.where((step > low) & (step < high), step, np.sqrt(low * high))
+    result[valid] = vol
+    return result
+
+
+def greeks(spot, strike, t, vol, is_call, rate=None, dividend=None) -> dict:
+    """
+    Delta, gamma, vega (per vol point) and theta (per calendar day) for arrays of options.
+    """
+    rate = cfg.risk_free_rate if rate is None else rate
+    dividend = cfg.dividend_yield if dividend is None else dividend
+    d1, d2 = _d1_d2(spot, strike, t, vol, rate, dividend)
+    spot_df = spot * np.exp(-dividend * t)
+    strike_df = strike * np.exp(-rate * t)
+    pdf_d1 = norm_pdf(d1)
+    sqrt_t = np.sqrt(t)
+
+    delta = np.where(is_call, np.exp(-dividend * t) * norm_cdf(d1), -np.exp(-dividend * t) * norm_cdf(-d1))
+    gamma = np.exp(-dividend * t) * pdf_d1 / (spot * vol * sqrt_t)
+    vega = spot_df * pdf_d1 * sqrt_t / 100.0
+    decay = -spot_df * pdf_d1 * vol / (2.0 * sqrt_t)
+    theta_call = decay - rate * strike_df * norm_cdf(d2) + dividend * spot_df * norm_cdf(d1)
+    theta_put = decay + rate * strike_df * norm_cdf(-d2) - dividend * spot_df * norm_cdf(-d1)
+    theta = np.where(is_call, theta_call, theta_put) / 365.0
+    return {"delta": delta, "gamma": gamma, "vega": vega, "theta": theta}
+
+
+def chain_greeks(strikes, rights, bids, asks, spot: float, t: float, rate=None, dividend=None) -> dict:
+    """
+    Implied vol and greeks for a whole chain in one pass, from the bid/ask midpoints.
+
+    Args:
+        strikes, rights, bids, asks: Parallel arrays (e.g. OptionChain.strikes / .rights and the quoted sides).
+            Missing or non-positive quotes give NaN results for that option.
+        spot: Underlying price.
+        t: Time to expiry in years (see time_to_expiry).
+
+    Returns:
+        dict: Arrays iv, delta, gamma, vega and theta.
+    """
+    bids = np.asarray(bids, dtype=np.float64)
+    asks = np.asarray(asks, dtype=np.float64)
+    mid = np.where((bids > 0) & (asks > 0), (bids + asks) / 2.0, np.nan)
+    strikes = np.asarray(strikes, dtype=np.float64)
+    rights = np.asarray(rights, dtype='U1')
+    is_call = (rights == 'C') | (rights == 'c')
+    iv = implied_vol(mid, spot, strikes, t, is_call, rate, dividend)
+    result = greeks(spot, strikes, t, np.where(np.isnan(iv), 1.0, iv), is_call, rate, dividend)
+    for name in result:
+        result[name] = np.where(np.isnan(iv), np.nan, result[name])
+    result["iv"] = iv
+    return result
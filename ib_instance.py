@@ -1,23 +1,17 @@
-from ib_insync import IB
-import time
+import os
+from connection import SessionPool
+from log_config import get_logger
 import cfg
 
+logger = get_logger(__name__)
 
-# Initialize IB instance
-ib = IB()
 
-# Variables for retry mechanism
-max_retries = 5  # Maximum number of retries if the connection fails
-retry_interval = 2  # Time (in seconds) to wait between retries
-
-# Try to connect
-for attempt in range(max_retries):
-    try:
-        print(f"Attempt {attempt + 1} to connect to Interactive Brokers...")
-        ib.connect(cfg.ib_host, cfg.ib_port, cfg.ib_clientid, readonly=False)
-        print('Successfully connected to Interactive Brokers!')
-        break
-    except Exception as e:
-        print(f'Failed to connect to pers Interactive Brokers on attempt {attempt + 1}. Error: {str(e)}')
-        if attempt < max_retries - 1:  # No need to sleep on the last attempt
-            time.sleep(retry_interval)
+if os.environ.get('EODSTR_FAKE_IB') or cfg.ib_fake_fixtures:
+    # Replay recorded fixtures instead of talking to TWS
+    from fake_ib import FakeIB
+    ib = FakeIB.from_config()
+    logger.info("Using offline IB stand-in with fixtures from %s", ib.fixture_dir)
+else:
+    # Nothing connects at import time: the first request connects (see connection.ConnectionManager). Calls are
+    # routed to the orders, market data or contract lookup session by method name.
+    ib = SessionPool(cfg.ib_host, cfg.ib_port, cfg.ib_sessions, readonly=False)
@@ -0,0 +1,89 @@
+import json
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+# Every span recorded in this process: dicts with run, symbol, stage, start and duration (seconds)
+_spans = []
+_run_id = uuid.uuid4().hex[:12]
+_null_span = nullcontext()
+
+
+@contextmanager
+def _timed_span(stage, symbol):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _spans.append({
+            "run": _run_id,
+            "symbol": symbol,
+            "stage": stage,
+            "start": start,
+            "duration": time.perf_counter() - start,
+        })
+
+
+def span(stage: str, symbol: str = ''):
+    """
+    Context manager timing one pipeline stage for a symbol. Returns a shared no-op context when
+    cfg.latency_tracking is off, so disabled spans cost one attribute lookup.
+
+    Usage:
+        with latency.span('chain_fetch', symbol):
+            ...
+    """
+    if not cfg.latency_tracking:
+        return _null_span
+    return _timed_span(stage, symbol)
+
+
+def get_spans() -> list:
+    return list(_spans)
+
+
+def reset():
+    global _run_id
+    _spans.clear()
+    _run_id = uuid.uuid4().hex[:12]
+
+
+def summary_table() -> str:
+    """
+    Per symbol and stage: call count, total and max milliseconds, in first-seen order.
+    """
+    rows = {}
+    for s in _spans:
+        row = rows.setdefault((s["symbol"], s["stage"]), [0, 0.0, 0.0])
+        row[0] += 1
+        row[1] += s["duration"]
+        row[2] = max(row[2], s["duration"])
+
+    lines = [f"{'Symbol':<8} {'Stage':<20} {'Calls':>5} {'Total ms':>10} {'Max ms':>10}"]
+    for (symbol, stage), (count, total, longest) in rows.items():
+        lines.append(f"{symbol or '-':<8} {stage:<20} {count:>5} {total * 1000:>10.1f} {longest * 1000:>10.1f}")
+    return "\n".join(lines)
+
+
+def dump_jsonl(path: str = None) -> None:
+    """
+    Appends every recorded span as one JSON object per line (defaults to cfg.latency_log).
+    """
+    path = path or cfg.latency_log
+    with open(path, 'a') as f:
+        for s in _spans:
+            f.write(json.dumps(s) + "\n")
+
+
+def report() -> None:
+    """
+    Logs the summary table and writes the JSONL dump, if tracking is on and anything was recorded.
+    """
+    if not cfg.latency_tracking or not _spans:
+        return
+    logger.info("Latency summary:\n%s", summary_table())
+    dump_jsonl()
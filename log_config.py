@@ -0,0 +1,83 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import cfg
+
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that only interpolates the message on the calling thread (arguments such as tickers keep
+    changing after the call) and leaves all formatting and I/O to the listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging():
+    """
+    Routes all logging through a queue drained by a background listener thread, writing plain text to the
+    console and JSONL to cfg.log_file. Levels come from cfg.log_level and the per-logger cfg.log_levels.
+    Called by the entry points only, so that importing a module never touches the root handlers. Safe to call
+    more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handlers = [console_handler]
+    if cfg.log_file:
+        file_handler = logging.FileHandler(cfg.log_file)
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    root.setLevel(cfg.log_level)
+    for name, level in cfg.log_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
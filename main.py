@@ -1,10 +1,19 @@
-from options import get_today_expiry, get_closest_strike
-from orders import submit_adaptive_order_trailing_stop
-from market_data import get_current_mid_price, get_combo_prices
-from qualify import qualify_contract
+import asyncio
+from options import get_today_expiry, get_closest_strike_async, get_strike_by_delta_async
+from orders import submit_adaptive_order_trailing_stop_async, submit_brackets_batch_async
+from market_data import get_current_mid_price_async, get_combo_prices_async
+from qualify import qualify_contract_async
 from orders import create_bag
+from ib_instance import ib
 from math import isnan
+from log_config import get_logger, setup_logging
 import cfg
+import chain_cache
+import qualify
+import latency
+import md_recorder
+
+logger = get_logger(__name__)
 
 
 def adjust_to_tick_size(price, tick_size):
@@ -21,68 +30,83 @@ def round_to_nearest_dollar(price):
     return round(price)
 
 
-def get_current_price(symbol, sec_type, exchange):
+async def get_current_price_async(symbol, sec_type, exchange):
     """
     Retrieves the current price of the underlying contract.
     """
-    und_contract = qualify_contract(
-        symbol=symbol, secType=sec_type, exchange=exchange, currency='USD'
-    )
-    current_price = get_current_mid_price(und_contract)
+    with latency.span('qualify', symbol):
+        und_contract = await qualify_contract_async(
+            symbol=symbol, secType=sec_type, exchange=exchange, currency='USD'
+        )
+    with latency.span('underlying_price', symbol):
+        current_price = await get_current_mid_price_async(und_contract)
 
     if current_price is None or isnan(current_price):
-        print(f"Error: Could not retrieve market data for {symbol}.")
-        return None
+        logger.error("Could not retrieve market data for %s.", symbol)
+        return None, und_contract
 
     return current_price, und_contract
 
 
-def get_strike_prices(und_contract, opt_exchange, expiry, rounded_price, params, min_tick):
+def selects_by_delta(params):
     """
-    Calculates the put and call strike prices.
+    True for symbols whose params pick strikes by delta ("put_delta" and "call_delta") rather than by distance.
     """
-    put_strike = adjust_to_tick_size(
-        get_closest_strike(contract=und_contract, right='P', exchange=opt_exchange, expiry=expiry,
-                           price=rounded_price - params["put_strike_distance"]),
-        min_tick
-    )
-    call_strike = adjust_to_tick_size(
-        get_closest_strike(contract=und_contract, right='C', exchange=opt_exchange, expiry=expiry,
-                           price=rounded_price + params["call_strike_distance"]),
-        min_tick
-    )
+    return "put_delta" in params and "call_delta" in params
+
+
+async def get_strike_prices_async(und_contract, opt_exchange, expiry, rounded_price, params, min_tick):
+    """
+    Calculates the put and call strike prices, looking up both sides concurrently. Symbols with "put_delta" and
+    "call_delta" in their params are selected by delta, the others by distance from the rounded price.
+    """
+    if selects_by_delta(params):
+        # The underlying was just priced, so this is answered from the ticker registry
+        spot = await get_current_mid_price_async(und_contract) or rounded_price
+        put_strike, call_strike = await asyncio.gather(
+            get_strike_by_delta_async(und_contract, 'P', opt_exchange, expiry, params["put_delta"], spot),
+            get_strike_by_delta_async(und_contract, 'C', opt_exchange, expiry, params["call_delta"], spot)
+        )
+    else:
+        put_strike, call_strike = await asyncio.gather(
+            get_closest_strike_async(contract=und_contract, right='P', exchange=opt_exchange, expiry=expiry,
+                                     price=rounded_price - params["put_strike_distance"]),
+            get_closest_strike_async(contract=und_contract, right='C', exchange=opt_exchange, expiry=expiry,
+                                     price=rounded_price + params["call_strike_distance"])
+        )
 
     if isnan(put_strike) or isnan(call_strike):
-        print(f"Error: Could not find valid strikes for {und_contract.symbol}.")
+        logger.error("Could not find valid strikes for %s.", und_contract.symbol)
         return None, None
 
-    return put_strike, call_strike
+    return adjust_to_tick_size(put_strike, min_tick), adjust_to_tick_size(call_strike, min_tick)
 
 
-def qualify_option_legs(symbol, expiry, put_strike, call_strike, opt_exchange):
+async def qualify_option_legs_async(symbol, expiry, put_strike, call_strike, opt_exchange):
     """
     Qualifies the option legs for the strangle.
     """
-    put_leg = qualify_contract(
-        symbol=symbol, secType='OPT', lastTradeDateOrContractMonth=expiry,
-        strike=put_strike, right='P', exchange=opt_exchange, currency='USD'
-    )
-    call_leg = qualify_contract(
-        symbol=symbol, secType='OPT', lastTradeDateOrContractMonth=expiry,
-        strike=call_strike, right='C', exchange=opt_exchange, currency='USD'
+    return await asyncio.gather(
+        qualify_contract_async(
+            symbol=symbol, secType='OPT', lastTradeDateOrContractMonth=expiry,
+            strike=put_strike, right='P', exchange=opt_exchange, currency='USD'
+        ),
+        qualify_contract_async(
+            symbol=symbol, secType='OPT', lastTradeDateOrContractMonth=expiry,
+            strike=call_strike, right='C', exchange=opt_exchange, currency='USD'
+        )
     )
-    return put_leg, call_leg
 
 
-def create_strangle_bag_contract(symbol):
+async def create_strangle_bag_contract_async(symbol):
     """
     Processes a single symbol to prepare for the strangle order.
     """
-    print(f"Processing symbol: {symbol}")
+    logger.info("Processing symbol: %s", symbol)
     params = cfg.params[symbol]
 
     # Fetch current price
-    current_price, und_contract = get_current_price(
+    current_price, und_contract = await get_current_price_async(
         symbol, params["sec_type"], params["exchange"]
     )
     if not current_price:
@@ -90,24 +114,25 @@ def create_strangle_bag_contract(symbol):
 
     # Round to nearest dollar
     rounded_price = round_to_nearest_dollar(current_price)
-    print(f"Current price for {symbol}: {current_price}, Rounded price: {rounded_price}")
+    logger.info("Current price for %s: %s, Rounded price: %s", symbol, current_price, rounded_price)
 
     # Use today's expiry
     expiry = get_today_expiry()
 
     # Get strike prices
-    put_strike, call_strike = get_strike_prices(
+    put_strike, call_strike = await get_strike_prices_async(
         und_contract, params["opt_exchange"], expiry, rounded_price, params, params["min_tick"]
     )
     if not put_strike or not call_strike:
         return None
 
-    print(f"Selected put strike: {put_strike}, call strike: {call_strike}")
+    logger.info("Selected put strike: %s, call strike: %s", put_strike, call_strike)
 
     # Qualify option legs
-    put_leg, call_leg = qualify_option_legs(
-        symbol, expiry, put_strike, call_strike, params["opt_exchange"]
-    )
+    with latency.span('leg_qualification', symbol):
+        put_leg, call_leg = await qualify_option_legs_async(
+            symbol, expiry, put_strike, call_strike, params["opt_exchange"]
+        )
 
     # Create combo bag
     bag_contract = create_bag(
@@ -119,10 +144,11 @@ def create_strangle_bag_contract(symbol):
 
     # Retrieve combo prices
     legs = [(put_leg, 'SELL', 1), (call_leg, 'SELL', 1)]
-    bid_price, mid_price, ask_price =  get_combo_prices(legs)
+    with latency.span('combo_pricing', symbol):
+        bid_price, mid_price, ask_price = await get_combo_prices_async(legs)
 
     if bid_price == 0.0 or isnan(bid_price):
-        print(f"Warning: Invalid bid price ({bid_price}) for {symbol} combo. Skipping order.")
+        logger.warning("Invalid bid price (%s) for %s combo. Skipping order.", bid_price, symbol)
         return None
 
     # Adjust prices to valid tick sizes
@@ -131,7 +157,7 @@ def create_strangle_bag_contract(symbol):
     mid_price = adjust_to_tick_size(mid_price, min_tick)
     ask_price = adjust_to_tick_size(ask_price, min_tick)
 
-    print(f"Combo prices - Adjusted Bid: {bid_price}, Mid: {mid_price}, Ask: {ask_price}")
+    logger.info("Combo prices - Adjusted Bid: %s, Mid: %s, Ask: %s", bid_price, mid_price, ask_price)
 
     return {
         "bag_contract": bag_contract,
@@ -140,16 +166,110 @@ def create_strangle_bag_contract(symbol):
         "params": params
     }
 
+
+def create_strangle_bag_contract(symbol):
+    """
+    Blocking wrapper around create_strangle_bag_contract_async.
+    """
+    return ib.run(create_strangle_bag_contract_async(symbol))
+
+
+def strangle_bracket_request(symbol_data):
+    """
+    Bracket parameters for a prepared symbol, as taken by submit_brackets_batch_async.
+    """
+    return {
+        "order_contract": symbol_data["bag_contract"],
+        "order_type": 'LMT',
+        "action": 'SELL',
+        "is_live": symbol_data["params"]["live_order"],
+        "quantity": symbol_data["params"]["quantity"],
+        "stop_loss_amt": symbol_data["mid_price"] * cfg.stop_loss_multiplier,
+        "limit_price": symbol_data["bid_price"],
+    }
+
+
+async def submit_strangle_async(symbol_data):
+    """
+    Sends the strangle bracket for a prepared symbol.
+    """
+    with latency.span('order_placement', symbol_data["bag_contract"].symbol):
+        return await submit_adaptive_order_trailing_stop_async(**strangle_bracket_request(symbol_data))
+
+
+async def process_symbol_async(symbol):
+    """
+    Prepares and submits the strangle for one symbol. Failures are contained to that symbol.
+    """
+    try:
+        with latency.span('total', symbol):
+            symbol_data = await create_strangle_bag_contract_async(symbol)
+            if not symbol_data:
+                return None
+            return await submit_strangle_async(symbol_data)
+    except Exception as e:
+        logger.exception("Failed to process symbol %s: %s", symbol, e)
+        return None
+
+
+async def save_caches_async():
+    """
+    Writes the local caches filled during a run, once and off the event loop.
+    """
+    await asyncio.gather(chain_cache.save_async(), qualify.save_async())
+
+
+async def run_symbols_async(symbols):
+    """
+    Runs the strangle entry for all symbols concurrently. Each order goes out as soon as its symbol is ready,
+    so total wall-clock tracks the slowest symbol rather than the sum.
+
+    Returns:
+        dict: symbol -> result of the order submission (None when the symbol was skipped or failed).
+    """
+    with latency.span('run'):
+        results = await asyncio.gather(*(process_symbol_async(symbol) for symbol in symbols))
+    await save_caches_async()
+    return dict(zip(symbols, results))
+
+
+async def prepare_symbol_async(symbol):
+    """
+    Prepares one symbol's strangle, containing any failure to that symbol.
+    """
+    try:
+        with latency.span('prepare', symbol):
+            return await create_strangle_bag_contract_async(symbol)
+    except Exception as e:
+        logger.exception("Failed to prepare symbol %s: %s", symbol, e)
+        return None
+
+
+async def run_symbols_batch_async(symbols, margin_budget=None):
+    """
+    Prepares all symbols concurrently, then submits the brackets as one batch with what-if margin checks
+    against the margin budget (defaults to cfg.margin_budget).
+
+    Returns:
+        dict: symbol -> result of the order submission (None when the symbol was skipped, dropped or failed).
+    """
+    with latency.span('run'):
+        prepared = await asyncio.gather(*(prepare_symbol_async(symbol) for symbol in symbols))
+        ready = [(symbol, symbol_data) for symbol, symbol_data in zip(symbols, prepared) if symbol_data]
+        with latency.span('order_placement'):
+            results = await submit_brackets_batch_async(
+                [strangle_bracket_request(symbol_data) for _, symbol_data in ready], margin_budget)
+    await save_caches_async()
+    submitted = {symbol: result for (symbol, _), result in zip(ready, results)}
+    return {symbol: submitted.get(symbol) for symbol in symbols}
+
+
 if __name__ == '__main__':
-    for symbol in cfg.SYMBOLS:
-        symbol_data = create_strangle_bag_contract(symbol)
-        if symbol_data:
-            submit_adaptive_order_trailing_stop(
-                order_contract=symbol_data["bag_contract"],
-                order_type='LMT',
-                action='SELL',
-                is_live=symbol_data["params"]["live_order"],
-                quantity=symbol_data["params"]["quantity"],
-                stop_loss_amt=symbol_data["mid_price"] * cfg.stop_loss_multiplier,
-                limit_price=symbol_data["bid_price"]
-            )
\ No newline at end of file
+    setup_logging()
+    if cfg.md_recording:
+        md_recorder.start()
+    if cfg.margin_budget is not None:
+        ib.run(run_symbols_batch_async(cfg.SYMBOLS))
+    else:
+        ib.run(run_symbols_async(cfg.SYMBOLS))
+    latency.report()
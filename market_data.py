@@ -1,55 +1,145 @@
-import time
+import asyncio
 import math
 from ib_insync import Contract
 from ib_instance import ib
+from qualify import qualify_contracts_async
+import md_lines
+import ticker_registry
 from typing import Optional
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+
+def is_valid_price(value) -> bool:
+    """
+    True when a ticker field holds a usable price (IB reports missing values as NaN or -1.0).
+    """
+    return value is not None and not math.isnan(value) and value != -1.0
+
+
+def has_valid_quote(ticker, allow_last=True) -> bool:
+    """
+    True when the ticker has a valid bid/ask pair, or a valid last price if allow_last is set.
+    """
+    if is_valid_price(ticker.bid) and is_valid_price(ticker.ask):
+        return True
+    return allow_last and is_valid_price(ticker.last)
+
+
+async def wait_for_quote_async(ticker, timeout=None, allow_last=True) -> bool:
+    """
+    Wait until the ticker carries a usable quote or the deadline expires, driven by the ticker's update events.
+
+    Args:
+        ticker: The ticker returned by reqMktData.
+        timeout: Seconds to wait at most (defaults to cfg.quote_timeout).
+        allow_last: Whether a valid last price counts as usable when bid/ask are missing.
+
+    Returns:
+        True if the quote is usable, False if the deadline expired first.
+    """
+    if has_valid_quote(ticker, allow_last):
+        return True
+
+    ready = asyncio.Event()
+
+    def on_update(updated_ticker):
+        if has_valid_quote(updated_ticker, allow_last):
+            ready.set()
+
+    ticker.updateEvent += on_update
+    try:
+        await asyncio.wait_for(ready.wait(), cfg.quote_timeout if timeout is None else timeout)
+        return True
+    except asyncio.TimeoutError:
+        return has_valid_quote(ticker, allow_last)
+    finally:
+        ticker.updateEvent -= on_update
+
+
+def quote_price(ticker) -> Optional[float]:
+    """
+    Midpoint of a ticker's bid/ask, falling back to its last price. None if neither is valid.
+    """
+    if is_valid_price(ticker.bid) and is_valid_price(ticker.ask):
+        return (ticker.bid + ticker.ask) / 2
+    if is_valid_price(ticker.last):
+        return ticker.last
+    return None
+
+
+def wait_for_quote(ticker, timeout=None, allow_last=True) -> bool:
+    """
+    Blocking wrapper around wait_for_quote_async.
+    """
+    return ib.run(wait_for_quote_async(ticker, timeout, allow_last))
+
 
 def get_current_mid_price(my_contract: Contract, max_retries=3, retry_interval=1, refresh=False) -> Optional[float]:
     """
+    Blocking wrapper around get_current_mid_price_async.
+    """
+    return ib.run(get_current_mid_price_async(my_contract, max_retries, retry_interval, refresh))
+
+
+async def get_current_mid_price_async(my_contract: Contract, max_retries=3, retry_interval=1,
+                                      refresh=False) -> Optional[float]:
+    """
     Retrieve the midpoint price for a contract, falling back to last price or previous close if bid/ask are unavailable.
 
     Args:
         my_contract: The contract to query.
         max_retries: Maximum number of retries for fetching data.
         retry_interval: Seconds to wait between retries.
-        refresh: Whether to refresh market data.
+        refresh: Whether to skip a recent quote already held in the ticker registry.
 
     Returns:
         The midpoint price if available, the last price as a fallback, or the previous close price as a final fallback.
     """
-    print(f"Entering function: get_current_mid_price with parameters: {locals()}")
+    logger.debug("get_current_mid_price_async: contract=%s max_retries=%s refresh=%s", my_contract, max_retries, refresh)
+
+    if not my_contract.conId:
+        await qualify_contracts_async(my_contract)
+
+    # Repeated lookups are answered from the shared live ticker while its quote is fresh
+    if not refresh:
+        ticker = ticker_registry.fresh_ticker(my_contract)
+        if ticker is not None and quote_price(ticker) is not None:
+            logger.debug("Using cached quote for %s: %s", my_contract.symbol, quote_price(ticker))
+            return quote_price(ticker)
 
     for attempt in range(max_retries):
         try:
-            # Request market data
-            ticker = ib.reqMktData(my_contract, '', refresh, True)
-            ib.sleep(1)
-
-            # Check for valid bid/ask prices
-            if (
-                ticker.bid is not None and ticker.ask is not None
-                and not math.isnan(ticker.bid) and not math.isnan(ticker.ask)
-                and ticker.bid != -1.0 and ticker.ask != -1.0
-            ):
-                mid_price = (ticker.bid + ticker.ask) / 2
-                print(f"Info: Midpoint price retrieved: {mid_price}")
-                return mid_price
-
-            # Fall back to last price if bid/ask are unavailable or invalid
-            if ticker.last is not None and not math.isnan(ticker.last) and ticker.last != -1.0:
-                print(f"Info: Bid/Ask unavailable. Using last price as fallback: {ticker.last}")
-                return ticker.last
-
-            print(f"Warning: No valid data: Bid={ticker.bid}, Ask={ticker.ask}, Last={ticker.last}")
+            # Stream the contract through the shared registry; the line stays live for later lookups
+            ticker = await ticker_registry.live_ticker_async(my_contract)
+            try:
+                await wait_for_quote_async(ticker)
+
+                # Check for valid bid/ask prices
+                if is_valid_price(ticker.bid) and is_valid_price(ticker.ask):
+                    mid_price = (ticker.bid + ticker.ask) / 2
+                    logger.info("Midpoint price retrieved: %s", mid_price)
+                    return mid_price
+
+                # Fall back to last price if bid/ask are unavailable or invalid
+                if is_valid_price(ticker.last):
+                    logger.info("Bid/Ask unavailable. Using last price as fallback: %s", ticker.last)
+                    return ticker.last
+
+                logger.warning("No valid data: Bid=%s, Ask=%s, Last=%s", ticker.bid, ticker.ask, ticker.last)
+            finally:
+                md_lines.release(my_contract)
 
         except Exception as e:
-            print(f"Error: Error retrieving price for {my_contract} on attempt {attempt + 1}: {e}")
+            logger.error("Error retrieving price for %s on attempt %d: %s", my_contract, attempt + 1, e)
 
-        time.sleep(retry_interval)
+        await asyncio.sleep(retry_interval)
 
     # Attempt to retrieve the previous close price as a final fallback
     try:
-        historical_data = ib.reqHistoricalData(
+        historical_data = await ib.reqHistoricalDataAsync(
             my_contract,
             endDateTime='',
             durationStr='1 D',
@@ -59,38 +149,40 @@ def get_current_mid_price(my_contract: Contract, max_retries=3, retry_interval=1
         )
         if historical_data:
             prev_close_price = historical_data[-1].close
-            print(f"Info: Using previous close price as fallback: {prev_close_price}")
+            logger.info("Using previous close price as fallback: %s", prev_close_price)
             return prev_close_price
         else:
-            print(f"Error: No historical data available for previous close price fallback.")
+            logger.error("No historical data available for previous close price fallback.")
 
     except Exception as e:
-        print(f"Error: Failed to retrieve previous close price for {my_contract}: {e}")
+        logger.error("Failed to retrieve previous close price for %s: %s", my_contract, e)
 
-    print(f"Error: Failed to retrieve price for {my_contract} after all attempts.")
+    logger.error("Failed to retrieve price for %s after all attempts.", my_contract)
     return None
+
+
 def round_to_tick(price, tick_size):
-    print(f"Entering function: round_to_tick with parameters: {locals()}")
     return round(price / tick_size) * tick_size
 
-def get_combo_prices(legs):
+def combo_prices_from_tickers(legs, leg_tickers):
     """
-    Function to retrieve bid, mid, and ask prices for a combo contract by summing individual leg prices.
+    Sum leg quotes into combo bid, mid and ask prices (rounded to 0.1).
+
+    Args:
+        legs: List of (contract, action, ratio) tuples.
+        leg_tickers: Tickers for the legs, in the same order.
+
+    Returns:
+        tuple: (bid, mid, ask)
     """
-    print(f"Entering function: get_combo_prices with parameters: {locals()}")
     total_bid = 0.0
     total_ask = 0.0
 
-    for leg_contract, action, ratio in legs:
-        leg_contract = ib.qualifyContracts(leg_contract)[0]
-        leg_ticker = ib.reqMktData(leg_contract, '', False, False)
-
-        # Wait for market data to populate
-        ib.sleep(1)
-        print(f"Debug: LEG: {action} {leg_ticker.contract.strike}, Bid: {leg_ticker.bid}, Ask: {leg_ticker.ask}")
+    for (leg_contract, action, ratio), leg_ticker in zip(legs, leg_tickers):
+        logger.debug("LEG: %s %s, Bid: %s, Ask: %s", action, leg_ticker.contract.strike, leg_ticker.bid, leg_ticker.ask)
 
-        bid = leg_ticker.bid if leg_ticker.bid is not None and not math.isnan(leg_ticker.bid) and leg_ticker.bid != -1.0 else 0.0
-        ask = leg_ticker.ask if leg_ticker.ask is not None and not math.isnan(leg_ticker.ask) and leg_ticker.ask != -1.0 else 0.0
+        bid = leg_ticker.bid if is_valid_price(leg_ticker.bid) else 0.0
+        ask = leg_ticker.ask if is_valid_price(leg_ticker.ask) else 0.0
 
         if action.upper() == 'BUY':
             total_bid -= bid * ratio
@@ -105,6 +197,45 @@ def get_combo_prices(legs):
     mid = round_to_tick(mid, 0.1)
     total_bid = round_to_tick(total_bid, 0.1)
     total_ask = round_to_tick(total_ask, 0.1)
+    return total_bid, mid, total_ask
+
+
+def get_combo_prices(legs):
+    """
+    Function to retrieve bid, mid, and ask prices for a combo contract by summing individual leg prices.
+    """
+    return ib.run(get_combo_prices_async(legs))
+
+
+async def get_combo_prices_async(legs):
+    """
+    Async version of get_combo_prices. Legs without a conId are qualified in a single request, all legs are
+    subscribed together and the quotes are awaited as one set, so pricing time does not grow with the leg count.
+    """
+    logger.debug("get_combo_prices_async: legs=%s", legs)
+    for leg_contract, action, ratio in legs:
+        if action.upper() not in ('BUY', 'SELL'):
+            raise ValueError(f"Error: Invalid action {action} for leg {leg_contract.localSymbol}")
+
+    # Only qualify legs that have not been qualified already
+    unqualified = [leg_contract for leg_contract, _, _ in legs if not leg_contract.conId]
+    if unqualified:
+        await qualify_contracts_async(*unqualified)
+
+    # Legs quoted moments ago (e.g. by the strike scan) are priced from memory
+    leg_contracts = [leg_contract for leg_contract, _, _ in legs]
+    cached = [ticker_registry.fresh_ticker(leg_contract) for leg_contract in leg_contracts]
+    if all(ticker is not None and has_valid_quote(ticker, allow_last=False) for ticker in cached):
+        total_bid, mid, total_ask = combo_prices_from_tickers(legs, cached)
+    else:
+        async with md_lines.subscribed_async(*leg_contracts) as leg_tickers:
+            for leg_ticker in leg_tickers:
+                ticker_registry.track(leg_ticker)
+
+            # Wait for market data to populate on all legs at once
+            await asyncio.gather(*(wait_for_quote_async(leg_ticker, allow_last=False) for leg_ticker in leg_tickers))
+
+            total_bid, mid, total_ask = combo_prices_from_tickers(legs, leg_tickers)
 
-    print(f"Info: get_combo_prices(): Returning prices: Bid: {total_bid}, Mid: {mid}, Ask: {total_ask}")
+    logger.info("get_combo_prices(): Returning prices: Bid: %s, Mid: %s, Ask: %s", total_bid, mid, total_ask)
     return total_bid, mid, total_ask
\ No newline at end of file
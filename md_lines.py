@@ -0,0 +1,214 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from ib_insync import Contract, Ticker
+from ib_instance import ib
+from log_config import get_logger
+import cfg
+
+logger = get_logger(__name__)
+
+# IB informational codes (connectivity and data farm status) that are not worth a warning
+_INFO_CODES = range(2100, 2200)
+
+# conId -> [contract, ticker, refcount] for every open streaming line, least recently used first
+_lines = OrderedDict()
+# Lines held by snapshot requests in flight
+_reserved = 0
+_peak = 0
+_changed = None
+
+
+def _condition() -> asyncio.Condition:
+    global _changed
+    if _changed is None:
+        _changed = asyncio.Condition()
+    return _changed
+
+
+def open_lines() -> int:
+    """
+    Lines in use right now: streaming subscriptions (held or idle) plus reserved snapshot lines.
+    """
+    return len(_lines) + _reserved
+
+
+def peak_lines() -> int:
+    return _peak
+
+
+def is_streaming(contract: Contract) -> bool:
+    """
+    True while the contract has an open streaming line (held or idle).
+    """
+    return contract.conId in _lines
+
+
+def _held_lines() -> int:
+    """
+    Lines that cannot be evicted right now: streaming lines with a holder plus reserved snapshot lines.
+    """
+    return sum(1 for _, _, refcount in _lines.values() if refcount) + _reserved
+
+
+def _note_usage():
+    global _peak
+    _peak = max(_peak, open_lines())
+
+
+def _evict_idle(needed: int) -> int:
+    """
+    Cancels up to `needed` idle lines, least recently used first. Returns how many were cancelled.
+    """
+    evicted = 0
+    for con_id in list(_lines):
+        if evicted >= needed:
+            break
+        contract, _, refcount = _lines[con_id]
+        if refcount == 0:
+            del _lines[con_id]
+            ib.cancelMktData(contract)
+            evicted += 1
+    if evicted:
+        logger.debug("Evicted %d idle market data lines", evicted)
+    return evicted
+
+
+async def _wait_for_lines(count: int):
+    """
+    Waits until `count` more lines fit in cfg.md_line_budget, evicting idle lines first. Must be called with the
+    condition held. Requests larger than the whole budget are let through once nothing else is open.
+    """
+    changed = _condition()
+    needed = min(count, cfg.md_line_budget)
+    while cfg.md_line_budget - open_lines() < needed:
+        shortfall = needed - (cfg.md_line_budget - open_lines())
+        if _evict_idle(shortfall) >= shortfall:
+            break
+        logger.debug("Market data line budget of %d reached, waiting for %d lines", cfg.md_line_budget, needed)
+        try:
+            await asyncio.wait_for(changed.wait(), cfg.md_line_wait_timeout)
+        except asyncio.TimeoutError:
+            logger.error("No market data line freed within %ss: %d of %d lines are held and %d more are needed. "
+                         "Raise md_line_budget or subscribe fewer strikes.", cfg.md_line_wait_timeout,
+                         _held_lines(), cfg.md_line_budget, needed)
+            raise
+
+
+async def acquire_async(contract: Contract, genericTickList: str = '') -> Ticker:
+    """
+    Streaming ticker for a qualified contract within the line budget. A contract that already has a line shares
+    it; otherwise a new line is opened, evicting idle lines or waiting for a release when the budget is full.
+    Every acquire must be paired with a release(). Raises asyncio.TimeoutError if no line frees up within
+    cfg.md_line_wait_timeout.
+    """
+    entry = _lines.get(contract.conId)
+    if entry is None:
+        async with _condition():
+            entry = _lines.get(contract.conId)
+            if entry is None:
+                await _wait_for_lines(1)
+                entry = _lines[contract.conId] = [contract, ib.reqMktData(contract, genericTickList, False, False), 0]
+                _note_usage()
+    entry[2] += 1
+    _lines.move_to_end(contract.conId)
+    return entry[1]
+
+
+def release(contract: Contract) -> None:
+    """
+    Gives back a line taken with acquire_async. The line stays open while idle so the next caller can reuse it,
+    until it is evicted to make room for another contract.
+    """
+    entry = _lines.get(contract.conId)
+    if entry is None:
+        return
+    entry[2] = max(entry[2] - 1, 0)
+    if entry[2] == 0:
+        _notify()
+
+
+def _notify():
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # nobody can be waiting without a running loop
+    changed = _condition()
+
+    async def notify():
+        async with changed:
+            changed.notify_all()
+    loop.create_task(notify())
+
+
+@asynccontextmanager
+async def subscribed_async(*contracts: Contract):
+    """
+    Acquires lines for the contracts for the duration of the block.
+
+    Usage:
+        async with md_lines.subscribed_async(put_leg, call_leg) as tickers:
+            ...
+    """
+    tickers = []
+    try:
+        for contract in contracts:
+            tickers.append(await acquire_async(contract))
+        yield tickers
+    finally:
+        for contract in contracts[:len(tickers)]:
+            release(contract)
+
+
+@asynccontextmanager
+async def reserved_async(count: int):
+    """
+    Holds `count` lines of the budget for snapshot requests for the duration of the block.
+    """
+    global _reserved
+    async with _condition():
+        await _wait_for_lines(count)
+        _reserved += count
+        _note_usage()
+    try:
+        yield
+    finally:
+        _reserved -= count
+        _notify()
+
+
+async def req_tickers_async(*contracts: Contract) -> list:
+    """
+    reqTickersAsync within the line budget: the contracts are snapshotted in chunks no larger than
+    cfg.md_snapshot_chunk (or the free budget), so whole-chain scans queue instead of exceeding the line limit.
+    """
+    tickers = []
+    start = 0
+    while start < len(contracts):
+        # Sized against the lines nobody holds, so the chunk fits once idle lines are evicted
+        chunk = max(min(cfg.md_snapshot_chunk, cfg.md_line_budget - _held_lines()), 1)
+        batch = contracts[start:start + chunk]
+        start += len(batch)
+        async with reserved_async(len(batch)):
+            tickers.extend(await ib.reqTickersAsync(*batch))
+    return tickers
+
+
+def release_all() -> None:
+    """
+    Cancels every open streaming line, held or idle.
+    """
+    for contract, _, _ in _lines.values():
+        ib.cancelMktData(contract)
+    _lines.clear()
+
+
+def _on_error(reqId, errorCode, errorString, contract):
+    if errorCode in _INFO_CODES:
+        logger.debug("IB info %s (reqId %s): %s", errorCode, reqId, errorString)
+    else:
+        logger.warning("IB error %s (reqId %s, %s): %s", errorCode, reqId,
+                       getattr(contract, 'localSymbol', '') or getattr(contract, 'symbol', ''), errorString)
+
+
+ib.errorEvent += _on_error
@@ -0,0 +1,173 @@
+import atexit
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from ib_instance import ib
+from log_config import get_logger
+import cfg
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, recording is disabled without it
+    pa = pq = None
+
+logger = get_logger(__name__)
+
+COLUMNS = ('ts', 'conId', 'symbol', 'secType', 'expiry', 'strike', 'right', 'exchange', 'bid', 'ask', 'last',
+           'bidSize', 'askSize', 'lastSize', 'delta', 'gamma', 'vega', 'theta', 'impliedVol', 'undPrice')
+
+_GREEK_FIELDS = ('delta', 'gamma', 'vega', 'theta', 'impliedVol', 'undPrice')
+_NO_GREEKS = (None,) * len(_GREEK_FIELDS)
+
+_queue = queue.SimpleQueue()
+_writer_thread = None
+_stop = object()
+
+
+def _schema():
+    return pa.schema([
+        ('ts', pa.timestamp('us', tz='UTC')),
+        ('conId', pa.int64()),
+        ('symbol', pa.string()),
+        ('secType', pa.string()),
+        ('expiry', pa.string()),
+        ('strike', pa.float64()),
+        ('right', pa.string()),
+        ('exchange', pa.string()),
+    ] + [(name, pa.float64()) for name in COLUMNS[8:]])
+
+
+def _number(value):
+    return None if value is None or math.isnan(value) else float(value)
+
+
+def _snapshot(ticker) -> tuple:
+    """
+    Copies the fields of a ticker into a row. Runs on the event loop, so it only reads attributes: tickers keep
+    changing after the event, so they cannot be handed to the writer thread as they are.
+    """
+    contract = ticker.contract
+    greeks = ticker.modelGreeks
+    greek_values = _NO_GREEKS if greeks is None else tuple(_number(getattr(greeks, name)) for name in _GREEK_FIELDS)
+    return (ticker.time or datetime.now(timezone.utc), contract.conId, contract.symbol, contract.secType,
+            contract.lastTradeDateOrContractMonth, contract.strike, contract.right, contract.exchange,
+            _number(ticker.bid), _number(ticker.ask), _number(ticker.last), _number(ticker.bidSize),
+            _number(ticker.askSize), _number(ticker.lastSize)) + greek_values
+
+
+def _on_pending_tickers(tickers):
+    for ticker in tickers:
+        _queue.put(_snapshot(ticker))
+
+
+class _ColumnarWriter:
+    """
+    Appends row batches to a Parquet file (one row group per batch) or an Arrow IPC stream.
+    """
+
+    def __init__(self, path: str, file_format: str):
+        self.schema = _schema()
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        elif file_format == 'arrow':
+            self._writer = pa.ipc.new_stream(path, self.schema)
+        else:
+            raise ValueError(f"Unsupported market data record format: {file_format}")
+
+    def write(self, rows: list):
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays([pa.array(column, type=field.type)
+                                            for column, field in zip(columns, self.schema)], schema=self.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+def _drain(writer: _ColumnarWriter):
+    """
+    Writer thread: collects rows until a batch is full or its oldest row has waited cfg.md_record_flush_interval,
+    then writes them.
+    """
+    rows = []
+    deadline = None  # monotonic time by which the oldest buffered row must be written
+    stopping = False
+    while not stopping:
+        timeout = cfg.md_record_flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            row = _queue.get(timeout=timeout)
+        except queue.Empty:
+            row = None
+        if row is _stop:
+            stopping = True
+        elif row is not None:
+            if not rows:
+                deadline = time.monotonic() + cfg.md_record_flush_interval
+            rows.append(row)
+            if len(rows) < cfg.md_record_batch_size and time.monotonic() < deadline:
+                continue
+        if rows:
+            deadline = None
+            try:
+                writer.write(rows)
+            except Exception as e:
+                logger.error("Dropped %d market data rows: %s", len(rows), e)
+            rows = []
+    writer.close()
+
+
+def start(path: str = None) -> bool:
+    """
+    Starts recording every ticker update to a columnar file in cfg.md_record_dir (Parquet or Arrow IPC, per
+    cfg.md_record_format). Rows are captured on the event loop and written in batches on a background thread.
+
+    Returns:
+        bool: True if recording is running, False if pyarrow is not installed.
+    """
+    global _writer_thread
+    if _writer_thread is not None:
+        return True
+    if pa is None:
+        logger.warning("pyarrow is not installed, market data recording is disabled.")
+        return False
+
+    if path is None:
+        os.makedirs(cfg.md_record_dir, exist_ok=True)
+        extension = 'parquet' if cfg.md_record_format == 'parquet' else 'arrows'
+        path = os.path.join(cfg.md_record_dir,
+                            f"md_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.{extension}")
+    writer = _ColumnarWriter(path, cfg.md_record_format)
+
+    _writer_thread = threading.Thread(target=_drain, args=(writer,), name='md-recorder', daemon=True)
+    _writer_thread.start()
+    ib.pendingTickersEvent += _on_pending_tickers
+    atexit.register(stop)
+    logger.info("Recording market data to %s", path)
+    return True
+
+
+def stop():
+    """
+    Stops recording, flushing the queued rows and closing the file.
+    """
+    global _writer_thread
+    if _writer_thread is None:
+        return
+    ib.pendingTickersEvent -= _on_pending_tickers
+    _queue.put(_stop)
+    _writer_thread.join()
+    _writer_thread = None
+
+
+def load(path: str):
+    """
+    Reads a recorded file back as a pyarrow Table.
+    """
+    if path.endswith('.parquet'):
+        return pq.read_table(path)
+    with pa.ipc.open_stream(path) as reader:
+        return reader.read_all()
@@ -0,0 +1,127 @@
+from typing import Optional
+import numpy as np
+from ib_insync import Contract
+
+
+class OptionChain:
+    """
+    Option chain held as parallel NumPy arrays (expiry, strike, right, trading class, conId, exchange), sorted by
+    expiry, right and strike so the strikes of each expiry and right ascend. Contract objects are only created for
+    the entries that are actually selected.
+    """
+
+    def __init__(self, symbol: str, sec_type: str, exchange: str, currency: str, expirations, strikes, rights,
+                 trading_classes, multipliers, con_ids=None, exchanges=None):
+        self.symbol = symbol
+        self.sec_type = sec_type
+        self.exchange = exchange
+        self.currency = currency
+        self.expirations = np.asarray(expirations, dtype='U8')
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.rights = np.asarray(rights, dtype='U1')
+        self.trading_classes = np.asarray(trading_classes, dtype=str)
+        self.multipliers = np.asarray(multipliers, dtype=str)
+        self.con_ids = np.zeros(len(self.strikes), dtype=np.int64) if con_ids is None else \
+            np.asarray(con_ids, dtype=np.int64)
+        # Each entry keeps the exchange it was listed on; `exchange` is only the chain's default
+        self.exchanges = np.full(len(self.strikes), exchange, dtype=object) if exchanges is None else \
+            np.asarray(exchanges, dtype=object)
+        order = np.lexsort((self.strikes, self.rights, self.expirations))
+        for name in ('expirations', 'strikes', 'rights', 'trading_classes', 'multipliers', 'con_ids', 'exchanges'):
+            setattr(self, name, getattr(self, name)[order])
+
+    @classmethod
+    def from_sec_def(cls, symbol: str, sec_type: str, currency: str, sec_def_params: list, expiries=None,
+                     rights=('C', 'P')) -> 'OptionChain':
+        """
+        Builds the chain from reqSecDefOptParams results: every expiration x strike x right of each entry, limited
+        to the given expiries. Entries keep the exchange of the sec def entry they came from (stock chains come
+        back once per exchange). conIds are unknown (0) until the selected contracts are qualified.
+        """
+        columns = ([], [], [], [], [], [], [])
+        exchange = ''
+        for params in sec_def_params:
+            expirations = np.array(sorted(params.expirations if expiries is None else
+                                          set(params.expirations) & set(expiries)), dtype='U8')
+            strikes = np.array(sorted(strike for strike in params.strikes if strike), dtype=np.float64)
+            count = len(expirations) * len(strikes) * len(rights)
+            if not count:
+                continue
+            exchange = exchange or params.exchange
+            columns[0].append(np.repeat(expirations, len(strikes) * len(rights)))
+            columns[1].append(np.tile(np.repeat(strikes, len(rights)), len(expirations)))
+            columns[2].append(np.tile(np.array(rights, dtype='U1'), len(expirations) * len(strikes)))
+            columns[3].append(np.full(count, params.tradingClass))
+            columns[4].append(np.full(count, params.multiplier))
+            columns[5].append(np.zeros(count, dtype=np.int64))
+            columns[6].append(np.full(count, params.exchange, dtype=object))
+        arrays = [np.concatenate(column) if column else np.array([]) for column in columns]
+        return cls(symbol, sec_type, exchange, currency, *arrays[:6], exchanges=arrays[6])
+
+    @classmethod
+    def from_contracts(cls, contracts: list) -> 'OptionChain':
+        """
+        Builds the chain from qualified option contracts (e.g. from chain_cache), keeping their conIds.
+        """
+        first = contracts[0] if contracts else Contract()
+        return cls(first.symbol, first.secType, first.exchange, first.currency,
+                   [c.lastTradeDateOrContractMonth for c in contracts], [c.strike for c in contracts],
+                   [c.right[:1] for c in contracts], [c.tradingClass for c in contracts],
+                   [c.multiplier for c in contracts], [c.conId for c in contracts],
+                   exchanges=[c.exchange for c in contracts])
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    def __repr__(self) -> str:
+        return (f"OptionChain({self.symbol} {self.sec_type} on {self.exchange}: {len(self)} options, "
+                f"{len(self.expiries())} expiries)")
+
+    def expiries(self) -> np.ndarray:
+        return np.unique(self.expirations)
+
+    def mask(self, right: str = None, low: float = None, high: float = None) -> np.ndarray:
+        """
+        Boolean mask of the entries with the given right and a strike within [low, high].
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if right is not None:
+            mask &= self.rights == right[:1]
+        if low is not None:
+            mask &= self.strikes >= low
+        if high is not None:
+            mask &= self.strikes <= high
+        return mask
+
+    def strikes_between(self, low: float, high: float, right: str = None) -> np.ndarray:
+        return np.flatnonzero(self.mask(right, low, high))
+
+    def nearest(self, price, right: str = None, count: int = 1) -> np.ndarray:
+        """
+        Indexes of the `count` strikes closest to each price (ties go to the lower strike). With an array of
+        prices, returns one row of indexes per price.
+        """
+        candidates = np.flatnonzero(self.mask(right))
+        if not len(candidates):
+            return np.empty((*np.shape(price), 0), dtype=np.int64)
+        distance = np.abs(self.strikes[candidates] - np.asarray(price, dtype=np.float64)[..., None])
+        order = np.argsort(distance, axis=-1, kind='stable')[..., :count]
+        return candidates[order]
+
+    def nearest_strike(self, price: float, right: str = None) -> Optional[float]:
+        index = self.nearest(price, right)
+        return float(self.strikes[index[0]]) if len(index) else None
+
+    def contract(self, index: int) -> Contract:
+        """
+        Contract for one entry, created on demand.
+        """
+        return Contract(secType=self.sec_type, conId=int(self.con_ids[index]), symbol=self.symbol,
+                        lastTradeDateOrContractMonth=str(self.expirations[index]), strike=float(self.strikes[index]),
+                        right=str(self.rights[index]), multiplier=str(self.multipliers[index]),
+                        exchange=str(self.exchanges[index]), currency=self.currency,
+                        tradingClass=str(self.trading_classes[index]))
+
+    def contracts(self, indexes=None) -> list:
+        indexes = range(len(self)) if indexes is None else np.atleast_1d(indexes)
+        return [self.contract(i) for i in indexes]
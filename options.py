@@ -1,26 +1,39 @@
 from datetime import datetime
-from ib_insync import Contract, Option
+import numpy as np
+from ib_insync import Option
 from ib_instance import ib
+from market_data import is_valid_price
+from qualify import qualify_contracts_async
+import chain_cache
+from option_chain import OptionChain
+import md_lines
+import ticker_registry
+import greeks
+from log_config import get_logger
+import cfg
+import latency
 import math
 import logging
 
-logging.getLogger('ib_insync').setLevel(logging.CRITICAL)
+logger = get_logger(__name__)
 
 
-def get_option_chain(symbol,und_conid,expiry, exchange, sectype):
+def get_option_chain(symbol, und_conid, expiry, exchange, sectype):
     """
     Retrieve the option chain for a given symbol and expiry using reqSecDefOptParams.
 
     Args:
         symbol (str): The symbol for the underlying (e.g., 'ES').
+        und_conid (int): conId of the underlying (0 if unknown).
         expiry (str): Expiration date in 'YYYYMMDD' format.
         exchange (str): Exchange for the options.
-        sectype (str): The security type (e.g., 'FUT' for futures).
+        sectype (str): The security type of the underlying (e.g., 'FUT' for futures).
 
     Returns:
-        list: A list of Option contracts.
+        OptionChain: Calls and puts for every strike of the matching entries, held as arrays. Use
+            chain.contract(i) / chain.contracts(indexes) to create Contracts for the strikes actually needed.
     """
-    print(f"Fetching option chain parameters for {symbol} on {exchange}...")
+    logger.info("Fetching option chain parameters for %s on %s...", symbol, exchange)
 
     # Request security definition option parameters
     opt_params = ib.reqSecDefOptParams(
@@ -36,43 +49,65 @@ def get_option_chain(symbol,und_conid,expiry, exchange, sectype):
     ]
 
     if not matching_params:
-        print(f"No matching option chain found for {symbol} with expiry {expiry}.")
-        return []
-
-    print(f"Found matching option parameters for {symbol}.")
-
-    # Extract strike prices and create option contracts
-    option_contracts = []
-    for params in matching_params:
-        for strike in params.strikes:
-            if strike:  # Ensure strike is valid
-                option_contracts.append(
-                    Contract(
-                        symbol=symbol,
-                        secType="FOP",
-                        exchange=params.exchange,
-                        currency='USD',
-                        strike=strike,
-                        right="C",  # Call; you can also include "P" for Put
-                        lastTradeDateOrContractMonth=expiry
-                    )
-                )
-                option_contracts.append(
-                    Contract(
-                        symbol=symbol,
-                        secType="FOP",
-                        exchange=params.exchange,
-                        currency='USD',
-                        strike=strike,
-                        right="P",  # Put
-                        lastTradeDateOrContractMonth=expiry
-                    )
-                )
-
-    print(f"Retrieved {len(option_contracts)} option contracts.")
-    return option_contracts
-
-def get_closest_strike(contract, right, exchange, expiry, price):
+        logger.warning("No matching option chain found for %s with expiry %s.", symbol, expiry)
+        return OptionChain.from_sec_def(symbol, '', 'USD', [])
+
+    logger.info("Found matching option parameters for %s.", symbol)
+
+    option_secType = 'FOP' if sectype == 'FUT' else 'OPT'
+    chain = OptionChain.from_sec_def(symbol, option_secType, 'USD', matching_params, expiries=[expiry])
+
+    logger.info("Retrieved %d option contracts.", len(chain))
+    return chain
+
+def get_closest_strike(contract, right, exchange, expiry, price, window=None):
+    """
+    Blocking wrapper around get_closest_strike_async.
+    """
+    return ib.run(get_closest_strike_async(contract, right, exchange, expiry, price, window))
+
+
+async def _find_closest_strike_windowed_async(chain, price, window):
+    """
+    Find the strike closest to price that has a valid bid, quoting only a window of strikes around the target.
+
+    The window starts at `window` strikes on each side of the target and doubles whenever no quoted strike has
+    a valid bid, or when an unquoted strike just outside the window could still be closer than the best one found.
+
+    Returns:
+        Closest strike price or None if no strike in the chain has a valid bid.
+    """
+    strikes = chain.strikes
+    center = int(chain.nearest(price)[0])
+    lo = max(center - window, 0)
+    hi = min(center + window + 1, len(strikes))
+    bids = {}
+
+    while True:
+        to_quote = [i for i in range(lo, hi) if i not in bids]
+        if to_quote:
+            tickers = await md_lines.req_tickers_async(*chain.contracts(to_quote))
+            ticker_registry.record(*tickers)
+            for i, ticker in zip(to_quote, tickers):
+                bids[i] = ticker.bid
+
+        valid = [i for i in range(lo, hi) if is_valid_price(bids[i])]
+        if valid:
+            best = min(valid, key=lambda i: abs(strikes[i] - price))
+            outside = [abs(strikes[i] - price) for i in (lo - 1, hi) if 0 <= i < len(strikes)]
+            if not outside or abs(strikes[best] - price) <= min(outside):
+                logger.info("Quoted %d of %d strikes to find closest strike %s", len(bids), len(strikes), strikes[best])
+                return float(strikes[best])
+
+        if lo == 0 and hi == len(strikes):
+            return None
+
+        window *= 2
+        lo = max(center - window, 0)
+        hi = min(center + window + 1, len(strikes))
+
+
+async def get_closest_strike_async(contract, right, exchange, expiry, price, window=None):
     """
     Find the closest strike price to the given target price.
 
@@ -82,117 +117,263 @@ def get_closest_strike(contract, right, exchange, expiry, price):
         exchange: The exchange to query.
         expiry: Expiry date in 'YYYYMMDD' format.
         price: Target price for which the closest strike is needed.
+        window: Number of strikes on each side of the target to quote first (defaults to
+            cfg.strike_search_window). 0 quotes the whole chain.
 
     Returns:
         Closest strike price or NaN if none found.
     """
-    print(f"Entering function: get_closest_strike with parameters: {locals()}")
+    logger.debug("get_closest_strike_async: contract=%s right=%s exchange=%s expiry=%s price=%s window=%s", contract,
+                 right, exchange, expiry, price, window)
 
     try:
         # Determine the security type
         option_secType = 'FOP' if contract.secType == 'FUT' else 'OPT'
 
-        # Define the option contract for the request
-        option_contract = Contract()
-        option_contract.symbol = contract.symbol
-        option_contract.secType = option_secType
-        option_contract.exchange = exchange
-        option_contract.currency = contract.currency
-        option_contract.lastTradeDateOrContractMonth = expiry
-        option_contract.right = right  # 'C' for Call, 'P' for Put
-
-        # Fetch option chain
-        option_chain = ib.reqContractDetails(option_contract)
-        if not option_chain:
-            print(f"Warning: No options found for symbol {contract.symbol}, expiry {expiry}, right {right}, exchange {exchange}.")
+        # Fetch option chain (served from the chain cache when possible)
+        with latency.span('chain_fetch', contract.symbol):
+            chain = await chain_cache.get_option_chain_async(
+                contract.symbol, option_secType, expiry, right, exchange, contract.currency)
+        if not len(chain):
+            logger.warning("No options found for symbol %s, expiry %s, right %s, exchange %s.", contract.symbol, expiry,
+                           right, exchange)
             return float('nan')
 
         # Log available expirations and strikes
-        available_expirations = set(detail.contract.lastTradeDateOrContractMonth for detail in option_chain)
-        available_strikes = [detail.contract.strike for detail in option_chain]
-        print(f"Info: Available expirations for {contract.symbol} on {exchange}: {sorted(available_expirations)}")
-        print(f"Info: Available strikes for {contract.symbol} on {exchange}, expiry {expiry}: {sorted(available_strikes)}")
-
-        # Fetch tickers for all option contracts
-        option_contracts = [detail.contract for detail in option_chain]
-        tickers = ib.reqTickers(*option_contracts)
-
-        # Find the closest strike to the target price
-        closest_strike = None
-        min_difference = float('inf')
-
-        for option, ticker in zip(option_contracts, tickers):
-            bid_price = ticker.bid
-            if bid_price is None or math.isnan(bid_price):
-                continue
-
-            strike = option.strike
-            difference = abs(strike - price)
-            if difference < min_difference:
-                min_difference = difference
-                closest_strike = strike
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Available expirations for %s on %s: %s", contract.symbol, exchange,
+                         chain.expiries().tolist())
+            logger.debug("Available strikes for %s on %s, expiry %s: %s", contract.symbol, exchange, expiry,
+                         chain.strikes.tolist())
+
+        if window is None:
+            window = cfg.strike_search_window
+
+        with latency.span('strike_selection', contract.symbol):
+            if window > 0:
+                closest_strike = await _find_closest_strike_windowed_async(chain, price, window)
+            else:
+                # Fetch tickers for all option contracts
+                option_contracts = chain.contracts()
+                tickers = await md_lines.req_tickers_async(*option_contracts)
+                ticker_registry.record(*tickers)
+
+                # Find the closest strike to the target price
+                closest_strike = None
+                min_difference = float('inf')
+
+                for option, ticker in zip(option_contracts, tickers):
+                    bid_price = ticker.bid
+                    if bid_price is None or math.isnan(bid_price):
+                        continue
+
+                    strike = option.strike
+                    difference = abs(strike - price)
+                    if difference < min_difference:
+                        min_difference = difference
+                        closest_strike = strike
 
         if closest_strike is not None:
-            print(f"Info: Closest strike for price {price} and right {right} is {closest_strike}")
+            logger.info("Closest strike for price %s and right %s is %s", price, right, closest_strike)
             return closest_strike
         else:
-            print(f"Warning: No matching strike found with valid bid prices for price {price}.")
+            logger.warning("No matching strike found with valid bid prices for price %s.", price)
             return float('nan')
 
     except Exception as e:
-        print(f"Error: Exception occurred while fetching closest strike: {e}")
+        logger.error("Exception occurred while fetching closest strike: %s", e)
         return float('nan')
 
+def get_strike_by_delta(contract, right, exchange, expiry, target_delta, spot):
+    """
+    Blocking wrapper around get_strike_by_delta_async.
+    """
+    return ib.run(get_strike_by_delta_async(contract, right, exchange, expiry, target_delta, spot))
+
+
+async def get_strike_by_delta_async(contract, right, exchange, expiry, target_delta, spot):
+    """
+    Find the strike whose delta, computed locally from its bid/ask midpoint, is closest to the target delta.
+
+    Args:
+        contract: The underlying contract.
+        right: 'C' for Call, 'P' for Put.
+        exchange: The exchange to query.
+        expiry: Expiry date in 'YYYYMMDD' format.
+        target_delta: Delta to aim for, e.g. -0.10 for puts or 0.10 for calls (the sign is taken from the right).
+        spot: Current underlying price.
+
+    Returns:
+        Closest strike price or NaN if none could be priced.
+    """
+    logger.debug("get_strike_by_delta_async: contract=%s right=%s exchange=%s expiry=%s delta=%s spot=%s", contract,
+                 right, exchange, expiry, target_delta, spot)
+    try:
+        option_secType = 'FOP' if contract.secType == 'FUT' else 'OPT'
+        with latency.span('chain_fetch', contract.symbol):
+            chain = await chain_cache.get_option_chain_async(
+                contract.symbol, option_secType, expiry, right, exchange, contract.currency)
+
+        # Only strikes within cfg.delta_search_range of spot are quoted
+        indexes = chain.strikes_between(spot * (1 - cfg.delta_search_range), spot * (1 + cfg.delta_search_range),
+                                        right)
+        if not len(indexes):
+            logger.warning("No options found for symbol %s, expiry %s, right %s near %s.", contract.symbol, expiry,
+                           right, spot)
+            return float('nan')
+
+        with latency.span('strike_selection', contract.symbol):
+            tickers = await md_lines.req_tickers_async(*chain.contracts(indexes))
+            ticker_registry.record(*tickers)
+            bids = np.array([ticker.bid for ticker in tickers], dtype=np.float64)
+            asks = np.array([ticker.ask for ticker in tickers], dtype=np.float64)
+            result = greeks.chain_greeks(chain.strikes[indexes], chain.rights[indexes], bids, asks, spot,
+                                         greeks.time_to_expiry(expiry))
+
+        target = abs(target_delta) * (1 if right == 'C' else -1)
+        distance = np.abs(result["delta"] - target)
+        if np.all(np.isnan(distance)):
+            logger.warning("No strike could be priced for delta %s, right %s.", target, right)
+            return float('nan')
+        best = int(np.nanargmin(distance))
+        strike = float(chain.strikes[indexes[best]])
+        logger.info("Strike for delta %s and right %s is %s (delta %.3f, iv %.3f)", target, right, strike,
+                    result["delta"][best], result["iv"][best])
+        return strike
+
+    except Exception as e:
+        logger.error("Exception occurred while selecting strike by delta: %s", e)
+        return float('nan')
+
+
 def get_today_expiry():
-    print(f"Entering function: get_today_expiry")
     return datetime.today().strftime('%Y%m%d')
     #return "20241202"
 
 
 def get_atm_strike(qualified_contract, exchange, opt_exchange, expiry, current_price, secType):
-    print(f"Entering function: get_atm_strike with parameters: {locals()}")
+    logger.debug("get_atm_strike: contract=%s exchange=%s expiry=%s price=%s secType=%s", qualified_contract,
+                 exchange, expiry, current_price, secType)
     try:
-        option_contract = Contract()
-        option_contract.symbol = qualified_contract.symbol
-        option_contract.secType = secType
-        option_contract.exchange = exchange
-        option_contract.currency = qualified_contract.currency
-        option_contract.lastTradeDateOrContractMonth = expiry
-
-        option_details = ib.reqContractDetails(option_contract)
-        if not option_details:
-            print("Warning: No options found for the given expiry.")
+        chain = ib.run(chain_cache.get_option_chain_async(
+            qualified_contract.symbol, secType, expiry, '', exchange, qualified_contract.currency))
+        if not len(chain):
+            logger.warning("No options found for the given expiry.")
             return float('nan')
 
-        closest_strike = None
-        min_difference = float('inf')
-
-        for detail in option_details:
-            strike = detail.contract.strike
-            difference = abs(strike - current_price)
-            if difference < min_difference:
-                min_difference = difference
-                closest_strike = strike
+        closest_strike = chain.nearest_strike(current_price)
 
         if closest_strike is not None:
-            print(f"Info: Closest ATM strike for price {current_price} is {closest_strike}")
+            logger.info("Closest ATM strike for price %s is %s", current_price, closest_strike)
             return closest_strike
         else:
-            print("Warning: No ATM strike found.")
+            logger.warning("No ATM strike found.")
             return float('nan')
     except Exception as e:
-        print(f"Error: Error fetching ATM strike: {e}")
+        logger.error("Error fetching ATM strike: %s", e)
         return float('nan')
 
 
-def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target_price, atm_strike):
-    print(f"Entering function: get_option_by_target_price with parameters: {locals()}")
+def _target_side_price(ticker, right):
+    """
+    Premium compared against the target: the ask for puts, the bid for calls. None when not quoted.
+    """
+    price = ticker.ask if right == 'P' else ticker.bid
+    if price is None or math.isnan(price) or price == float('inf') or price <= 0:
+        return None
+    return price
+
+
+async def _find_option_by_target_price_bisect_async(und_contract, right, opt_exchange, expiry, target_price, strikes,
+                                                    trading_classes):
+    """
+    Bisection over the sorted strike ladder for the premium closest to target_price, quoting two adjacent strikes
+    per step. Premiums rise with the strike for puts and fall for calls, so the ladder is walked in order of
+    rising premium. A strike without a usable quote (no bid/ask, or dropped by the snapshot request) says nothing
+    about which side the target is on, so the nearest quoted strike is probed in its place.
+
+    Returns:
+        tuple: (option contract, price), or (None, None) if no strike could be priced.
+    """
+    ladder = strikes if right == 'P' else strikes[::-1]
+    quotes = {}
+
+    async def quote(*indexes):
+        indexes = [i for i in indexes if 0 <= i < len(ladder) and i not in quotes]
+        if not indexes:
+            return
+        options = [Option(symbol=und_contract.symbol, lastTradeDateOrContractMonth=expiry, strike=ladder[i],
+                          right=right, exchange=opt_exchange, currency=und_contract.currency,
+                          tradingClass=trading_class)
+                   for i in indexes for trading_class in trading_classes]
+        qualified = await qualify_contracts_async(*options)
+        tickers = await md_lines.req_tickers_async(*qualified) if qualified else []
+        ticker_registry.record(*tickers)
+        for i in indexes:
+            quotes[i] = (None, None)
+        for ticker in tickers:
+            price = _target_side_price(ticker, right)
+            i = indexes[[ladder[j] for j in indexes].index(ticker.contract.strike)]
+            if price is not None and (quotes[i][0] is None or abs(price - target_price) < abs(quotes[i][1] -
+                                                                                               target_price)):
+                quotes[i] = (ticker.contract, price)
+
+    def priced(i):
+        return i in quotes and quotes[i][0] is not None
+
+    async def nearest_priced(mid, lo, hi):
+        # Quoted strike closest to mid strictly between lo and hi, each probe quoting its outward neighbour too
+        for step in range(hi - lo):
+            for i in (mid,) if step == 0 else (mid + step, mid - step):
+                if lo < i < hi:
+                    outward = i + 1 if i >= mid else i - 1
+                    await quote(i, outward if lo < outward < hi else i)
+                    if priced(i):
+                        return i
+        return None
+
+    # Invariant over priced strikes: premium(lo) < target <= premium(hi), with lo = -1 and hi = len(ladder) as
+    # open ends; unpriced strikes in between are skipped
+    lo, hi = -1, len(ladder)
+    while hi - lo > 1:
+        i = await nearest_priced((lo + hi) // 2, lo, hi)
+        if i is None:
+            break
+        if quotes[i][1] >= target_price:
+            hi = i
+        else:
+            lo = i
+            if i + 1 < hi and priced(i + 1) and quotes[i + 1][1] >= target_price:
+                hi = i + 1
+
+    # The closest premium is on one side of the crossing; ties go to the richer strike
+    candidates = [quotes[i] + (i,) for i in (lo, hi) if priced(i)]
+    if not candidates:
+        return None, None
+    logger.info("Quoted %d of %d strikes to find the closest premium to %s", len(quotes), len(ladder), target_price)
+    contract, price, _ = min(candidates, key=lambda c: (abs(c[1] - target_price), -c[2]))
+    return contract, price
+
+
+def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target_price, atm_strike, search=None):
+    """
+    Option on one side of the ATM strike whose premium (ask for puts, bid for calls) is closest to target_price.
+
+    Args:
+        search: 'bisect' to quote O(log N) strikes along the sorted ladder, or 'scan' to quote every strike
+            (defaults to cfg.target_price_search).
+
+    Returns:
+        tuple: (option contract, price), or (None, None) if nothing suitable was found.
+    """
+    logger.debug("get_option_by_target_price: contract=%s right=%s expiry=%s target=%s atm=%s search=%s",
+                 und_contract, right, expiry, target_price, atm_strike, search)
     try:
         chains = ib.reqSecDefOptParams(
             und_contract.symbol, '', und_contract.secType, und_contract.conId)
-        print(f"Info: Option chains retrieved: {chains}")
+        logger.debug("Option chains retrieved: %s", chains)
     except Exception as e:
-        print(f"Error: Error retrieving option chains: {e}")
+        logger.error("Error retrieving option chains: %s", e)
         return None, None
 
     all_strikes = set()
@@ -206,10 +387,20 @@ def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target
             trading_classes.add(chain.tradingClass)
 
     if not all_strikes:
-        print("Warning: No strikes found for the given expiry and ATM filtering.")
+        logger.warning("No strikes found for the given expiry and ATM filtering.")
         return None, None
 
     strikes = sorted(all_strikes)
+    if (search or cfg.target_price_search) == 'bisect':
+        selected_option, selected_price = ib.run(_find_option_by_target_price_bisect_async(
+            und_contract, right, opt_exchange, expiry, target_price, strikes, sorted(trading_classes)))
+        if selected_option is None:
+            logger.warning("No options with valid ask/bid prices found.")
+        else:
+            logger.info("Option closest to target price found: %s with bid/ask price %s", selected_option,
+                        selected_price)
+        return selected_option, selected_price
+
     contracts = []
     for strike in strikes:
         for trading_class in trading_classes:
@@ -222,16 +413,17 @@ def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target
                 currency=und_contract.currency,
                 tradingClass=trading_class)
             contracts.append(option)
-    print(f"Info: Created {len(contracts)} option contracts with right '{right}' and filtered strikes.")
+    logger.info("Created %d option contracts with right '%s' and filtered strikes.", len(contracts), right)
 
     qualified_contracts = ib.qualifyContracts(*contracts)
 
     if not qualified_contracts:
-        print("Warning: No qualified contracts found.")
+        logger.warning("No qualified contracts found.")
         return None, None
 
-    tickers = ib.reqTickers(*qualified_contracts)
-    ib.sleep(2)
+    # reqTickers returns once every snapshot has completed, no extra wait needed
+    tickers = ib.run(md_lines.req_tickers_async(*qualified_contracts))
+    ticker_registry.record(*tickers)
 
     valid_options = []
     for ticker in tickers:
@@ -241,7 +433,7 @@ def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target
             valid_options.append((ticker.contract, ticker.bid))
 
     if not valid_options:
-        print("Warning: No options with valid ask/bid prices found.")
+        logger.warning("No options with valid ask/bid prices found.")
         return None, None
 
     if right == 'P':
@@ -251,7 +443,7 @@ def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target
         min_diff = min(abs(bid - target_price) for _, bid in valid_options)
         closest_options = [(contract, bid) for contract, bid in valid_options if abs(bid - target_price) == min_diff]
 
-    print(f"Info: Options with minimum price difference: {closest_options}")
+    logger.debug("Options with minimum price difference: %s", closest_options)
 
     if right == 'P':
         closest_options.sort(key=lambda x: x[0].strike, reverse=True)
@@ -261,6 +453,6 @@ def get_option_by_target_price(und_contract, right, opt_exchange, expiry, target
     selected_option = closest_options[0][0]
     selected_price = closest_options[0][1]
 
-    print(f"Info: Option closest to target price found: {selected_option} with bid/ask price {selected_price}")
+    logger.info("Option closest to target price found: %s with bid/ask price %s", selected_option, selected_price)
 
     return selected_option, selected_price
\ No newline at end of file
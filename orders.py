@@ -1,12 +1,101 @@
+import asyncio
+import copy
 from ib_insync import LimitOrder, ComboLeg, Contract, Order, TagValue, PriceCondition, Trade
 from ib_instance import ib
 from datetime import datetime, timedelta
 from typing import Optional
 import cfg
-from math import isnan
+from math import isnan, isinf
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Statuses set locally by ib_insync before TWS has acknowledged the order
+ORDER_PENDING_STATES = ('', 'PendingSubmit', 'ApiPending')
+# Statuses of an order IB has acknowledged and not rejected or cancelled
+ORDER_OK_STATES = ('Submitted', 'PreSubmitted', 'Filled')
+UNSET_DOUBLE = 1.7976931348623157e308
+
+
+async def wait_for_order_ack_async(trade: Trade, timeout: float = None) -> str:
+    """
+    Wait until IB acknowledges an order (its status moves past PendingSubmit), driven by the trade's status
+    events, or until the timeout expires.
+
+    Args:
+        trade: The Trade returned by placeOrder.
+        timeout: Seconds to wait at most (defaults to cfg.order_ack_timeout).
+
+    Returns:
+        The order status at the time of acknowledgement, or the still pending status at the timeout (see
+        order_accepted).
+    """
+    if trade.orderStatus.status not in ORDER_PENDING_STATES:
+        return trade.orderStatus.status
+
+    acked = asyncio.Event()
+
+    def on_status(updated_trade):
+        if updated_trade.orderStatus.status not in ORDER_PENDING_STATES:
+            acked.set()
+
+    trade.statusEvent += on_status
+    try:
+        await asyncio.wait_for(acked.wait(), cfg.order_ack_timeout if timeout is None else timeout)
+    except asyncio.TimeoutError:
+        logger.warning("No acknowledgement for order %s within timeout, status is %s", trade.order.orderId,
+                       trade.orderStatus.status)
+    finally:
+        trade.statusEvent -= on_status
+    return trade.orderStatus.status
+
+
+def order_accepted(trade: Trade, transmitted: bool) -> bool:
+    """
+    Whether an order went through: acknowledged by IB with a working or filled status or, when it was staged
+    without transmitting, placed in TWS (where it stays pending). A transmitted order still pending after the
+    acknowledgement wait is not counted as accepted.
+    """
+    status = trade.orderStatus.status
+    return status in ORDER_OK_STATES or (not transmitted and status in ORDER_PENDING_STATES)
+
+
+def wait_for_order_ack(trade: Trade, timeout: float = None) -> str:
+    """
+    Blocking wrapper around wait_for_order_ack_async.
+    """
+    return ib.run(wait_for_order_ack_async(trade, timeout))
+
+
+def reserve_order_ids(count: int) -> list:
+    """
+    Takes `count` order IDs from the client's local ID sequence without sending anything to IB.
+    """
+    return [ib.client.getReqId() for _ in range(count)]
+
+
+async def place_bracket_async(order_contract: Contract, parent_order: Order, child_order: Order) -> tuple:
+    """
+    Assigns local IDs to a parent/child pair, links them and places both back to back, then waits for both
+    acknowledgements together. The parent should have transmit=False so the pair is released by the child.
+
+    Returns:
+        tuple: (parent_trade, child_trade)
+    """
+    parent_order.orderId, child_order.orderId = reserve_order_ids(2)
+    child_order.parentId = parent_order.orderId
+
+    parent_trade = ib.placeOrder(order_contract, parent_order)
+    child_trade = ib.placeOrder(order_contract, child_order)
+
+    # A staged (untransmitted) bracket is never acknowledged, so only wait when it was sent
+    if child_order.transmit:
+        await asyncio.gather(wait_for_order_ack_async(parent_trade), wait_for_order_ack_async(child_trade))
+    return parent_trade, child_trade
+
 
 def create_bag(und_contract: Contract, legs: list, actions: list, ratios: list) -> Contract:
-    print(f"Creating combo bag with parameters: {locals()}")
+    logger.debug("create_bag: und_contract=%s legs=%s actions=%s ratios=%s", und_contract, legs, actions, ratios)
     bag_contract = Contract()
     bag_contract.symbol = und_contract.symbol
     bag_contract.secType = 'BAG'
@@ -26,27 +115,34 @@ def create_bag(und_contract: Contract, legs: list, actions: list, ratios: list)
     return bag_contract
 
 def submit_limit_order(order_contract, limit_price: float, action: str, is_live: bool, quantity: int):
-    print(f"Entering function: submit_limit_order with parameters: {locals()}")
+    return ib.run(submit_limit_order_async(order_contract, limit_price, action, is_live, quantity))
+
+
+async def submit_limit_order_async(order_contract, limit_price: float, action: str, is_live: bool, quantity: int):
+    logger.debug("submit_limit_order_async: contract=%s limit_price=%s action=%s is_live=%s quantity=%s", order_contract,
+                 limit_price, action, is_live, quantity)
     order = LimitOrder(action=action, lmtPrice=limit_price, transmit=is_live, totalQuantity=quantity)
-    print(f"Submitting order for {order_contract.symbol} at limit price {limit_price}.")
+    logger.info("Submitting order for %s at limit price %s.", order_contract.symbol, limit_price)
     order.orderRef = cfg.myStrategyTag
 
     try:
         trade = ib.placeOrder(order_contract, order)
-        ib.sleep(2)
+        # A staged (untransmitted) order is never acknowledged, so only wait when it was sent
+        if order.transmit:
+            await wait_for_order_ack_async(trade)
 
-        if trade.orderStatus.status in ('Submitted', 'PendingSubmit', 'PreSubmitted', 'Filled'):
+        if order_accepted(trade, order.transmit):
             status = f"Order sent with status: {trade.orderStatus.status}"
         else:
             status = f"Order failed with status: {trade.orderStatus.status}"
         return status
     except Exception as e:
         error_message = f"Error: Order placement failed with error: {str(e)}"
-        print(error_message)
+        logger.error(error_message)
         return error_message
 
 def create_bag(und_contract: Contract, legs: list, actions: list, ratios: list) -> Contract:
-    print(f"Entering function: create_bag with parameters: {locals()}")
+    logger.debug("create_bag: und_contract=%s legs=%s actions=%s ratios=%s", und_contract, legs, actions, ratios)
     bag_contract = Contract()
     bag_contract.symbol = und_contract.symbol
     bag_contract.secType = 'BAG'
@@ -66,27 +162,24 @@ def create_bag(und_contract: Contract, legs: list, actions: list, ratios: list)
     return bag_contract
 
 def get_active_orders():
-    print(f"Entering function: get_active_orders with parameters: {locals()}")
     try:
-        print("Requesting active orders from IB account...")
+        logger.info("Requesting active orders from IB account...")
         active_orders = ib.reqAllOpenOrders()
-        print(f"Number of active orders retrieved: {len(active_orders)}")
+        logger.info("Number of active orders retrieved: %d", len(active_orders))
 
         for order in active_orders:
-            print(f"Active Order - ID: {order.orderId}, Symbol: {order.contract.symbol}, "
-                  f"Type: {order.orderType}, Quantity: {order.totalQuantity}, "
-                  f"Status: {order.status}")
+            logger.info("Active Order - ID: %s, Symbol: %s, Type: %s, Quantity: %s, Status: %s", order.orderId,
+                        order.contract.symbol, order.orderType, order.totalQuantity, order.status)
 
         return active_orders
 
     except Exception as e:
-        print(f"Error: Failed to retrieve active orders: {e}")
+        logger.error("Failed to retrieve active orders: %s", e)
         return []
 
 def get_recently_filled_orders(timeframe='today'):
-    print(f"Entering function: get_recently_filled_orders with parameters: {locals()}")
     try:
-        print(f"Requesting filled orders for timeframe: {timeframe}.")
+        logger.info("Requesting filled orders for timeframe: %s.", timeframe)
         all_trades = ib.reqExecutions()
 
         if timeframe == 'today':
@@ -97,22 +190,22 @@ def get_recently_filled_orders(timeframe='today'):
             try:
                 start_time = datetime.strptime(timeframe, '%Y-%m-%d')
             except ValueError:
-                print("Error: Invalid date format. Use 'today', 'yesterday', or 'YYYY-MM-DD'.")
+                logger.error("Invalid date format. Use 'today', 'yesterday', or 'YYYY-MM-DD'.")
                 return []
 
         end_time = start_time + timedelta(days=1)
         filled_orders = [trade for trade in all_trades if start_time <= trade.time < end_time]
-        print(f"Number of filled orders retrieved: {len(filled_orders)}")
+        logger.info("Number of filled orders retrieved: %d", len(filled_orders))
 
         for trade in filled_orders:
-            print(f"Filled Order - ID: {trade.order.orderId}, Symbol: {trade.contract.symbol}, "
-                  f"Type: {trade.order.orderType}, Quantity: {trade.order.totalQuantity}, "
-                  f"Time: {trade.time}, Fill Price: {trade.execution.avgPrice}")
+            logger.info("Filled Order - ID: %s, Symbol: %s, Type: %s, Quantity: %s, Time: %s, Fill Price: %s",
+                        trade.order.orderId, trade.contract.symbol, trade.order.orderType, trade.order.totalQuantity,
+                        trade.time, trade.execution.avgPrice)
 
         return filled_orders
 
     except Exception as e:
-        print(f"Error: Failed to retrieve filled orders: {e}")
+        logger.error("Failed to retrieve filled orders: %s", e)
         return []
 
 
@@ -125,6 +218,23 @@ def submit_adaptive_order_conditional_stop(
         trigger_price: float,
         underlying_contract: Contract,
         limit_price: float = None
+) -> Optional[Order]:
+    """
+    Blocking wrapper around submit_adaptive_order_conditional_stop_async.
+    """
+    return ib.run(submit_adaptive_order_conditional_stop_async(
+        order_contract, order_type, action, is_live, quantity, trigger_price, underlying_contract, limit_price))
+
+
+async def submit_adaptive_order_conditional_stop_async(
+        order_contract: Contract,
+        order_type: str,
+        action: str,
+        is_live: bool,
+        quantity: int,
+        trigger_price: float,
+        underlying_contract: Contract,
+        limit_price: float = None
 ) -> Optional[Order]:
     """
     Submits a bracket order with a primary order and a conditional stop-loss order (no take profit).
@@ -139,20 +249,23 @@ def submit_adaptive_order_conditional_stop(
     :param underlying_contract: The underlying contract for the stop condition.
     :return: The parent order object if successful, None otherwise.
     """
-    print(f"Entering function: submit_adaptive_order_with_bracket_stop with parameters: {locals()}")
+    logger.debug("submit_adaptive_order_conditional_stop_async: contract=%s order_type=%s action=%s is_live=%s quantity=%s "
+                 "trigger_price=%s limit_price=%s", order_contract, order_type, action, is_live, quantity, trigger_price,
+                 limit_price)
 
     # Validate inputs
     if action not in ["BUY", "SELL"]:
-        print(f"Error: Invalid action: {action}. Must be 'BUY' or 'SELL'.")
+        logger.error("Invalid action: %s. Must be 'BUY' or 'SELL'.", action)
         return None
 
     if order_type not in ["MKT", "LMT"]:
-        print(f"Error: Invalid order type: {order_type}. Must be 'MKT' or 'LMT'.")
+        logger.error("Invalid order type: %s. Must be 'MKT' or 'LMT'.", order_type)
         return None
 
     try:
         # Create the primary (entry) order
-        print(f"Creating primary order with action: {action}, order type: {order_type}, limit price: {limit_price}")
+        logger.info("Creating primary order with action: %s, order type: %s, limit price: %s", action, order_type,
+                    limit_price)
         parent_order = Order(
             orderType=order_type,
             action=action,
@@ -166,25 +279,14 @@ def submit_adaptive_order_conditional_stop(
 
         if order_type == 'LMT':
             parent_order.lmtPrice = limit_price
-            print(f"Primary order limit price set to: {limit_price}")
+            logger.debug("Primary order limit price set to: %s", limit_price)
 
-        # Place the primary order
-        print(f"Placing primary order: {parent_order}")
-        ib.placeOrder(order_contract, parent_order)
-        ib.sleep(1)  # Allow time for order ID generation
-
-        if not parent_order.orderId:
-            print("Error: Primary order failed to generate an order ID.")
-            return None
-        print(f"Primary order placed successfully with order ID: {parent_order.orderId}")
-
-        # Create the stop-loss order
+        # Create the stop-loss order (linked to the parent when the bracket is placed)
         stop_loss_order = Order(
             orderType='STP',
             action='SELL' if action == 'BUY' else 'BUY',
             totalQuantity=quantity,
             auxPrice=trigger_price,
-            parentId=parent_order.orderId,
             tif='DAY',
             transmit=is_live,  # Transmit this order when ready
             orderRef=cfg.myStrategyTag
@@ -198,21 +300,34 @@ def submit_adaptive_order_conditional_stop(
             exch=underlying_contract.exchange
         )
         stop_loss_order.conditions = [condition]
-        print(f"Condition added to stop-loss order: {condition}")
-
-        # Place the stop-loss order
-        print(f"Placing stop-loss order: {stop_loss_order}")
-        ib.placeOrder(order_contract, stop_loss_order)
-        print("Bracket order with stop-loss submitted successfully.")
+        logger.debug("Condition added to stop-loss order: %s", condition)
+
+        # Place both orders back to back
+        logger.debug("Placing bracket: %s / %s", parent_order, stop_loss_order)
+        parent_trade, stop_loss_trade = await place_bracket_async(order_contract, parent_order, stop_loss_order)
+        logger.info("Primary order placed with order ID: %s", parent_order.orderId)
+        status = stop_loss_trade.orderStatus.status
+        if not order_accepted(stop_loss_trade, stop_loss_order.transmit):
+            logger.error("Stop-loss order failed with status: %s", status)
+            return None
+        logger.info("Bracket order with stop-loss submitted successfully.")
 
         return parent_order
 
     except Exception as e:
-        print(f"Error: Failed to submit bracket order with stop-loss: {str(e)}")
+        logger.error("Failed to submit bracket order with stop-loss: %s", e)
         return None
 
 def submit_adaptive_order(order_contract, limit_price: float = None, order_type: str = 'MKT', action: str = 'BUY', is_live: bool = False, quantity: int = 1):
     """
+    Blocking wrapper around submit_adaptive_order_async.
+    """
+    return ib.run(submit_adaptive_order_async(order_contract, limit_price, order_type, action, is_live, quantity))
+
+
+async def submit_adaptive_order_async(order_contract, limit_price: float = None, order_type: str = 'MKT',
+                                      action: str = 'BUY', is_live: bool = False, quantity: int = 1):
+    """
     Submits an adaptive order (limit or market) for the given contract and checks the status.
 
     Args:
@@ -228,13 +343,11 @@ def submit_adaptive_order(order_contract, limit_price: float = None, order_type:
     """
     try:
         order_contract.exchange = 'SMART' # override for adaptive order type.
-        print("---- Starting submit_adaptive_order ----")
-        print(f"Contract Details: {order_contract}")
-        print(f"Parameters -> Limit Price: {limit_price}, Order Type: {order_type}, Action: {action}, Is Live: {is_live}, Quantity: {quantity}")
+        logger.debug("submit_adaptive_order_async: contract=%s limit_price=%s order_type=%s action=%s is_live=%s quantity=%s",
+                     order_contract, limit_price, order_type, action, is_live, quantity)
 
         # Define Adaptive Algo parameters
         algo_params = [TagValue(tag='adaptivePriority', value='Normal')]
-        print(f"Algo Params: {algo_params}")
 
         # Create the order object
         order = Order(
@@ -246,66 +359,46 @@ def submit_adaptive_order(order_contract, limit_price: float = None, order_type:
             algoParams=algo_params,
             transmit=is_live
         )
-        print(f"Order created: {order}")
+        logger.debug("Order created: %s", order)
 
         # Place the order using IB
         trade = ib.placeOrder(order_contract, order)
-        print("Order submitted to IB API. Waiting for status update...")
+        logger.info("Order submitted to IB API. Waiting for status update...")
 
-        # Sleep for 2 seconds to allow order status to propagate
-        ib.sleep(2)
+        # Wait for IB to acknowledge the order; a staged (untransmitted) order never is
+        if order.transmit:
+            await wait_for_order_ack_async(trade)
 
         # Fetch and log the final order status
         final_status = trade.orderStatus.status
-        print(f"Order submitted successfully:")
-        print(f"    Order ID: {trade.order.orderId}")
-        print(f"    Final Status: {final_status}")
-        print(f"    Filled Quantity: {trade.orderStatus.filled}, Remaining Quantity: {trade.orderStatus.remaining}")
+        logger.info("Order submitted successfully: Order ID: %s, Final Status: %s, Filled Quantity: %s, "
+                    "Remaining Quantity: %s", trade.order.orderId, final_status, trade.orderStatus.filled,
+                    trade.orderStatus.remaining)
 
         return trade
 
     except Exception as e:
-        print("Error occurred during submit_adaptive_order execution:")
-        print(f"    Error: {e}")
+        logger.error("Error occurred during submit_adaptive_order execution: %s", e)
         return None
 
-def submit_adaptive_order_trailing_stop(
-        order_contract: Contract,
-        order_type: str,
-        action: str,
-        is_live: bool,
-        quantity: int,
-        stop_loss_amt: float,
-        limit_price: float = None
-) -> Optional[tuple[Trade, Trade]]:
+def build_trailing_stop_bracket(order_type: str, action: str, is_live: bool, quantity: int, stop_loss_amt: float,
+                                limit_price: float = None) -> Optional[tuple[Order, Order]]:
     """
-    Submits an adaptive order with a trailing stop and returns both orders (parent and child) as Trade objects.
-
-    Args:
-        order_contract: The contract for the order.
-        order_type: 'LMT' or 'MKT'.
-        action: 'BUY' or 'SELL'.
-        is_live: Whether to transmit the orders immediately.
-        quantity: Number of contracts.
-        stop_loss_amt: The trailing stop loss amount.
-        limit_price: Limit price for the primary order (optional for LMT orders).
+    Builds the adaptive primary order and its trailing stop child, without IDs or placement.
 
     Returns:
-        A tuple of (primary_trade, trailing_stop_trade) if successful, None otherwise.
+        A tuple of (primary_order, trailing_stop_order), or None if the parameters are invalid.
     """
-    print(f"Entering function: submit_adaptive_order_trailing_stop with parameters: {locals()}")
-    order_contract.exchange = 'SMART'
-
     if action not in ["BUY", "SELL"]:
-        print(f"Error: Invalid action: {action}. Must be 'BUY' or 'SELL'.")
+        logger.error("Invalid action: %s. Must be 'BUY' or 'SELL'.", action)
         return None
 
     if order_type not in ["MKT", "LMT"]:
-        print(f"Error: Invalid order type: {order_type}. Must be 'MKT' or 'LMT'.")
+        logger.error("Invalid order type: %s. Must be 'MKT' or 'LMT'.", order_type)
         return None
 
     if order_type == "LMT" and (limit_price is None or isnan(limit_price)):
-        print(f"Error: Must specify a limit price for adaptive LMT orders")
+        logger.error("Must specify a limit price for adaptive LMT orders")
         return None
 
     # Create the primary order
@@ -323,33 +416,194 @@ def submit_adaptive_order_trailing_stop(
     if order_type == 'LMT':
         primary_order.lmtPrice = limit_price
 
-    # Place the primary order
-    primary_trade = ib.placeOrder(order_contract, primary_order)
-    ib.sleep(1)
-
-    if not primary_order.orderId:
-        print("Error: Primary order failed to generate an order ID.")
-        return None
-
-    # Create the trailing stop order
+    # Create the trailing stop order (linked to the primary when the bracket is placed)
     trailing_stop_order = Order(
         orderType='TRAIL',
         action='SELL' if action == 'BUY' else 'BUY',
         totalQuantity=quantity,
         auxPrice=stop_loss_amt,
-        parentId=primary_order.orderId,
         orderRef=cfg.myStrategyTag,
         tif='DAY',
         transmit=is_live  # Transmit live if specified
     )
 
-    # Place the trailing stop order
-    trailing_stop_trade = ib.placeOrder(order_contract, trailing_stop_order)
+    return primary_order, trailing_stop_order
 
-    if primary_trade.orderStatus.status and trailing_stop_trade.orderStatus.status:
-        print("Info: Adaptive order with linked trailing stop submitted successfully.")
+
+def submit_adaptive_order_trailing_stop(
+        order_contract: Contract,
+        order_type: str,
+        action: str,
+        is_live: bool,
+        quantity: int,
+        stop_loss_amt: float,
+        limit_price: float = None
+) -> Optional[tuple[Trade, Trade]]:
+    """
+    Blocking wrapper around submit_adaptive_order_trailing_stop_async.
+    """
+    return ib.run(submit_adaptive_order_trailing_stop_async(
+        order_contract, order_type, action, is_live, quantity, stop_loss_amt, limit_price))
+
+
+async def submit_adaptive_order_trailing_stop_async(
+        order_contract: Contract,
+        order_type: str,
+        action: str,
+        is_live: bool,
+        quantity: int,
+        stop_loss_amt: float,
+        limit_price: float = None
+) -> Optional[tuple[Trade, Trade]]:
+    """
+    Submits an adaptive order with a trailing stop and returns both orders (parent and child) as Trade objects.
+
+    Args:
+        order_contract: The contract for the order.
+        order_type: 'LMT' or 'MKT'.
+        action: 'BUY' or 'SELL'.
+        is_live: Whether to transmit the orders immediately.
+        quantity: Number of contracts.
+        stop_loss_amt: The trailing stop loss amount.
+        limit_price: Limit price for the primary order (optional for LMT orders).
+
+    Returns:
+        A tuple of (primary_trade, trailing_stop_trade) if successful, None otherwise.
+    """
+    logger.debug("submit_adaptive_order_trailing_stop_async: contract=%s order_type=%s action=%s is_live=%s "
+                 "quantity=%s stop_loss_amt=%s limit_price=%s", order_contract, order_type, action, is_live, quantity,
+                 stop_loss_amt, limit_price)
+    order_contract.exchange = 'SMART'
+
+    bracket = build_trailing_stop_bracket(order_type, action, is_live, quantity, stop_loss_amt, limit_price)
+    if bracket is None:
+        return None
+    primary_order, trailing_stop_order = bracket
+
+    # Place both orders back to back
+    primary_trade, trailing_stop_trade = await place_bracket_async(order_contract, primary_order, trailing_stop_order)
+
+    # The bracket is transmitted (or staged) as a whole by its child order
+    transmitted = trailing_stop_order.transmit
+    if order_accepted(primary_trade, transmitted) and order_accepted(trailing_stop_trade, transmitted):
+        logger.info("Adaptive order with linked trailing stop submitted successfully.")
     else:
-        print("Error: Order submission failed.")
+        logger.error("Order submission failed with statuses %s / %s.", primary_trade.orderStatus.status,
+                     trailing_stop_trade.orderStatus.status)
+        return None
+
+    return primary_trade, trailing_stop_trade
+
+async def check_margin_async(order_contract: Contract, order: Order) -> Optional[float]:
+    """
+    Runs a what-if check for the order and returns its initial margin change, or None if IB did not report one
+    within cfg.order_ack_timeout or the check failed.
+    """
+    what_if_order = copy.copy(order)
+    what_if_order.orderId = 0
+    what_if_order.transmit = True
+    try:
+        state = await asyncio.wait_for(ib.whatIfOrderAsync(order_contract, what_if_order), cfg.order_ack_timeout)
+        margin = float(state.initMarginChange)
+    except Exception as e:
+        # Any failure (including a timeout or lost connection) only drops this bag, not the whole batch
+        logger.warning("What-if margin check failed for %s: %s", order_contract.symbol,
+                       str(e) or type(e).__name__)
         return None
+    # IB reports unset values as Double.MAX_VALUE
+    return None if margin >= UNSET_DOUBLE else margin
+
+
+def allocate_margin(quantities: list, margins: list, margin_budget: float) -> list:
+    """
+    Quantities admitted for bags taken in list order against a margin budget. A bag that would exceed the
+    remaining budget is shrunk to the units that still fit, and dropped (0) when not even one unit fits, its
+    margin is unknown (None) or it asks for no units. An infinite budget admits every bag at full size.
+
+    Args:
+        quantities: Requested quantity of each bag.
+        margins: What-if initial margin change of each bag at its requested quantity (None if unknown).
+        margin_budget: Maximum total initial margin change.
 
-    return primary_trade, trailing_stop_trade
\ No newline at end of file
+    Returns:
+        list: Admitted quantity of each bag.
+    """
+    if isinf(margin_budget):
+        return list(quantities)
+    remaining = margin_budget
+    admitted = []
+    for quantity, margin in zip(quantities, margins):
+        if margin is None or quantity <= 0:
+            admitted.append(0)
+            continue
+        per_unit = max(margin, 0.0) / quantity
+        fit = quantity if per_unit == 0 else max(min(quantity, int(remaining // per_unit)), 0)
+        admitted.append(fit)
+        remaining -= per_unit * fit
+    return admitted
+
+
+async def submit_brackets_batch_async(bags: list, margin_budget: float = None) -> list:
+    """
+    Submits several trailing-stop brackets together. When a margin budget is set, what-if margin checks for all
+    bags run concurrently first; bags are then admitted in list order, shrinking the quantity of any bag that
+    would exceed the remaining budget and dropping those that cannot fit a single unit.
+
+    Args:
+        bags: List of dicts with keys order_contract, order_type, action, is_live, quantity, stop_loss_amt and
+            limit_price (the arguments of submit_adaptive_order_trailing_stop_async).
+        margin_budget: Maximum total initial margin change (defaults to cfg.margin_budget; None or inf means no
+            cap, so no checks are made).
+
+    Returns:
+        list: (primary_trade, trailing_stop_trade) or None for each bag, in the same order.
+    """
+    if margin_budget is None:
+        margin_budget = cfg.margin_budget
+
+    brackets = []
+    for bag in bags:
+        bag["order_contract"].exchange = 'SMART'
+        brackets.append(build_trailing_stop_bracket(bag["order_type"], bag["action"], bag["is_live"],
+                                                    bag["quantity"], bag["stop_loss_amt"], bag["limit_price"]))
+
+    if margin_budget is not None and not isinf(margin_budget):
+        checked = [i for i, bracket in enumerate(brackets) if bracket]
+        margins = await asyncio.gather(*(check_margin_async(bags[i]["order_contract"], brackets[i][0])
+                                         for i in checked))
+        quantities = allocate_margin([bags[i]["quantity"] for i in checked], margins, margin_budget)
+        for i, margin, quantity in zip(checked, margins, quantities):
+            symbol = bags[i]["order_contract"].symbol
+            if quantity == 0:
+                if margin is None:
+                    logger.warning("Dropping %s: no margin estimate available.", symbol)
+                else:
+                    logger.warning("Dropping %s: margin %.2f does not fit the remaining budget.", symbol, margin)
+                brackets[i] = None
+            elif quantity < bags[i]["quantity"]:
+                logger.warning("Reducing %s from %d to %d to stay within the margin budget.", symbol,
+                               bags[i]["quantity"], quantity)
+                for order in brackets[i]:
+                    order.totalQuantity = quantity
+
+    # A failed placement (lost connection, rejected order) only drops its own bag; the others may already be live
+    placed = await asyncio.gather(*(
+        place_bracket_async(bag["order_contract"], *bracket) if bracket else asyncio.sleep(0)
+        for bag, bracket in zip(bags, brackets)
+    ), return_exceptions=True)
+
+    results = []
+    for bag, bracket, trades in zip(bags, brackets, placed):
+        if isinstance(trades, Exception):
+            logger.error("Bracket for %s failed: %s", bag["order_contract"].symbol,
+                         str(trades) or type(trades).__name__)
+            results.append(None)
+        elif trades and all(order_accepted(trade, bracket[1].transmit) for trade in trades):
+            logger.info("Bracket for %s submitted.", bag["order_contract"].symbol)
+            results.append(trades)
+        else:
+            if trades:
+                logger.error("Bracket for %s failed with statuses %s / %s.", bag["order_contract"].symbol,
+                             trades[0].orderStatus.status, trades[1].orderStatus.status)
+            results.append(None)
+    return results
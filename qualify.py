@@ -1,13 +1,28 @@
-from ib_insync import Contract, Future, FuturesOption, Stock, Index, Option
+import atexit
+import copy
+from datetime import datetime
+from ib_insync import Contract, Future, FuturesOption, Stock, Index, Option, util
 from operator import attrgetter
 from ib_instance import ib
+from cache_store import cache_path, load_json, save_json, save_json_async, contract_to_dict, contract_from_dict
+from log_config import get_logger
+import cfg
 
+logger = get_logger(__name__)
 
-def qualify_contract(symbol: str, secType: str, lastTradeDateOrContractMonth: str = '', exchange: str = 'SMART',
-                     currency: str = 'USD', strike: float = 0.0, right: str = '',
-                     multiplier: str = ''):
-    #print(f"Entering function: qualify_contract with parameters: {locals()}")
+QUALIFY_CACHE_FILE = 'qualified_contracts.json'
 
+# contract spec -> qualified Contract
+_qualified = {}
+_qualified_loaded = False
+# Set when _qualified changed since it was last written; the file is written once per run (see save_async)
+_qualified_dirty = False
+# Keys of entries seeded from cfg.params that only carry a conId; filled in from IB on first use, never saved
+_partial = set()
+
+
+def _build_contract(symbol: str, secType: str, lastTradeDateOrContractMonth: str = '', exchange: str = 'SMART',
+                    currency: str = 'USD', strike: float = 0.0, right: str = '', multiplier: str = '') -> Contract:
     if secType.upper() == 'STK':
         contract = Stock(symbol=symbol, exchange=exchange, currency=currency)
     elif secType.upper() == 'FUT':
@@ -31,23 +46,173 @@ def qualify_contract(symbol: str, secType: str, lastTradeDateOrContractMonth: st
     else:
         raise ValueError("Unsupported contract type. Supported types are STK, FUT, FOP, OPT, IND.")
 
+    return contract
+
+
+def _spec_key(contract: Contract) -> tuple:
+    return (contract.secType, contract.symbol, contract.lastTradeDateOrContractMonth, float(contract.strike),
+            contract.right, contract.exchange, contract.currency, contract.multiplier, contract.tradingClass)
+
+
+def _is_expired(contract: Contract) -> bool:
+    expiry = contract.lastTradeDateOrContractMonth[:8]
+    if contract.secType not in ('OPT', 'FOP', 'FUT') or not expiry:
+        return False
+    return expiry < datetime.today().strftime('%Y%m%d')[:len(expiry)]
+
+
+def _seed_from_config():
+    """
+    Seed the cache with the underlyings whose conId is already known in cfg.params. Seeds only carry the conId,
+    so they are marked partial and qualified by conId on first use, which also fills in primaryExchange,
+    localSymbol and tradingClass.
+    """
+    for symbol, symbol_params in cfg.params.items():
+        if not symbol_params.get("conid"):
+            continue
+        try:
+            contract = _build_contract(symbol, symbol_params["sec_type"], exchange=symbol_params["exchange"])
+        except ValueError:
+            continue
+        contract.conId = symbol_params["conid"]
+        key = _spec_key(contract)
+        if key not in _qualified:
+            _qualified[key] = contract
+            _partial.add(key)
+
+
+def _load_qualify_cache():
+    global _qualified_loaded
+    if _qualified_loaded:
+        return
+    _qualified_loaded = True
+    for entry in load_json(cache_path(QUALIFY_CACHE_FILE), default=[]):
+        contract = contract_from_dict(entry['contract'])
+        if not _is_expired(contract):
+            _qualified[tuple(entry['key'])] = contract
+    _seed_from_config()
+
+
+def _serialize(entries: list) -> list:
+    return [{'key': list(key), 'contract': contract_to_dict(contract)} for key, contract in entries]
+
+
+def _complete_entries() -> list:
+    return [(key, contract) for key, contract in _qualified.items() if key not in _partial]
+
+
+def save() -> None:
+    """
+    Writes the qualification cache file if the cache changed since the last write.
+    """
+    global _qualified_dirty
+    if _qualified_dirty:
+        _qualified_dirty = False
+        save_json(cache_path(QUALIFY_CACHE_FILE), _serialize(_complete_entries()))
+
+
+async def save_async() -> None:
+    """
+    Same as save, with the serialization and the write done off the event loop.
+    """
+    global _qualified_dirty
+    if _qualified_dirty:
+        _qualified_dirty = False
+        entries = _complete_entries()
+        await save_json_async(cache_path(QUALIFY_CACHE_FILE), lambda: _serialize(entries))
+
+
+def get_cached_qualification(contract: Contract):
+    """
+    Return a copy of the cached qualified contract matching the given spec, or None.
+    """
+    _load_qualify_cache()
+    key = _spec_key(contract)
+    cached = _qualified.get(key)
+    if cached is None:
+        return None
+    if _is_expired(cached):
+        del _qualified[key]
+        return None
+    return copy.copy(cached)
+
+
+def clear_qualify_cache():
+    global _qualified_loaded, _qualified_dirty
+    # Counts as loaded, so the stale file is not read back before the emptied cache is written over it
+    _qualified.clear()
+    _partial.clear()
+    _qualified_loaded = True
+    _qualified_dirty = True
+    _seed_from_config()
+
+
+async def qualify_contracts_async(*contracts: Contract) -> list:
+    """
+    Qualify contracts in place, answering from the qualification cache where possible and sending the
+    remaining ones to IB in a single request. Partial seeds are sent along by conId; if IB cannot complete one,
+    the contract keeps the seeded conId and is retried on the next call.
+
+    Returns:
+        list: The contracts that were qualified successfully.
+    """
+    global _qualified_dirty
+    missing = []
+    for contract in contracts:
+        key = _spec_key(contract)
+        cached = get_cached_qualification(contract)
+        if cached is None:
+            missing.append((key, contract))
+        elif key in _partial:
+            contract.conId = cached.conId
+            missing.append((key, contract))
+        else:
+            util.dataclassUpdate(contract, cached)
+
+    if missing:
+        qualified = await ib.qualifyContractsAsync(*[contract for _, contract in missing])
+        qualified_ids = {id(contract) for contract in qualified}
+        for key, contract in missing:
+            if id(contract) in qualified_ids:
+                _qualified[key] = copy.copy(contract)
+                _partial.discard(key)
+                _qualified_dirty = True
+            elif key in _partial:
+                logger.warning("Could not complete the configured contract for %s, using conId %s only.",
+                               contract.symbol, contract.conId)
+
+    return [contract for contract in contracts if contract.conId]
+
+
+def qualify_contract(symbol: str, secType: str, lastTradeDateOrContractMonth: str = '', exchange: str = 'SMART',
+                     currency: str = 'USD', strike: float = 0.0, right: str = '',
+                     multiplier: str = ''):
+    return ib.run(qualify_contract_async(symbol, secType, lastTradeDateOrContractMonth, exchange, currency, strike,
+                                         right, multiplier))
+
+
+async def qualify_contract_async(symbol: str, secType: str, lastTradeDateOrContractMonth: str = '',
+                                 exchange: str = 'SMART', currency: str = 'USD', strike: float = 0.0, right: str = '',
+                                 multiplier: str = ''):
+    contract = _build_contract(symbol, secType, lastTradeDateOrContractMonth, exchange, currency, strike, right,
+                               multiplier)
+
     try:
-        #print(f"Info: Attempting to qualify contract: {contract}")
-        ib.qualifyContracts(contract)
+        await qualify_contracts_async(contract)
 
         # Verify if contract qualification was successful
         if contract.conId == 0:
             raise ValueError(f"Error: Failed to qualify contract: {contract}")
 
-        print(f"Info: Contract qualified successfully: {contract}")
+        logger.info("Contract qualified successfully: %s", contract)
         return contract
     except Exception as e:
-        print(f"Error: Failed to qualify contract: {e}")
+        logger.error("Failed to qualify contract: %s", e)
         raise
 
 
 def test_option_chain(contract, exchange, expiry):
-    print(f"Entering function: test_option_chain with parameters: {locals()}")
+    logger.debug("test_option_chain: contract=%s exchange=%s expiry=%s", contract, exchange, expiry)
     try:
         chain = ib.reqSecDefOptParams(underlyingSymbol=contract.symbol,
                                       futFopExchange=exchange,
@@ -57,28 +222,30 @@ def test_option_chain(contract, exchange, expiry):
             if expiry in c.expirations:
                 return chain
     except Exception as e:
-        print(f"Error: Error occurred while fetching option chain: {e}")
+        logger.error("Error occurred while fetching option chain: %s", e)
         return None
     return None
 
 
 def get_front_month_contract_date(future_symbol, exchange, mult, expiry):
-    print(f"Entering function: get_front_month_contract_date with parameters: {locals()}")
+    logger.debug("get_front_month_contract_date: symbol=%s exchange=%s mult=%s expiry=%s", future_symbol, exchange,
+                 mult, expiry)
     contract = Future(symbol=future_symbol, exchange=exchange, multiplier=mult,currency='USD')
     contract_details_list = ib.reqContractDetails(contract)
-    print(contract_details_list)
+    logger.debug("Contract details: %s", contract_details_list)
     contracts = [cd.contract for cd in contract_details_list]
     sorted_contracts = sorted(contracts, key=attrgetter('lastTradeDateOrContractMonth'))
 
     for contract in sorted_contracts:
         option_chain = test_option_chain(contract, exchange=exchange, expiry=expiry)
         if option_chain:
-            print(f"Info: Front-month contract date for {future_symbol}: {contract.lastTradeDateOrContractMonth}")
+            logger.info("Front-month contract date for %s: %s", future_symbol, contract.lastTradeDateOrContractMonth)
             return str(contract.lastTradeDateOrContractMonth)
 
 
 def get_front_month_contract(symbol, exchange, multiplier, currency, lastTradeDateOrContractMonth):
-    print(f"Entering function: get_front_month_contract with parameters: {locals()}")
+    logger.debug("get_front_month_contract: symbol=%s exchange=%s multiplier=%s currency=%s expiry=%s", symbol,
+                 exchange, multiplier, currency, lastTradeDateOrContractMonth)
     contract = Contract()
     contract.symbol = symbol
     contract.secType = 'FUT'
@@ -87,14 +254,18 @@ def get_front_month_contract(symbol, exchange, multiplier, currency, lastTradeDa
     contract.currency = currency
     contract.multiplier = multiplier
 
-    print(f"Info: Requesting all available contracts for symbol: {symbol}")
+    logger.info("Requesting all available contracts for symbol: %s", symbol)
     possible_contracts = ib.reqContractDetails(contract)
     if not possible_contracts:
-        print("Warning: No contracts found for the given parameters.")
+        logger.warning("No contracts found for the given parameters.")
         return None
 
     possible_contracts.sort(key=lambda x: x.contract.lastTradeDateOrContractMonth)
     front_month_contract = possible_contracts[0].contract
-    print(f"Info: Selected front-month contract: {front_month_contract}")
+    logger.info("Selected front-month contract: %s", front_month_contract)
+
+    return front_month_contract
+
 
-    return front_month_contract
\ No newline at end of file
+# Anything qualified after the last save_async (e.g. through the blocking wrappers) is written on exit
+atexit.register(save)
@@ -0,0 +1,144 @@
+from datetime import datetime
+import pytest
+
+np = pytest.importorskip("numpy")
+pa = pytest.importorskip("pyarrow")
+pytz = pytest.importorskip("pytz")
+
+import backtest
+
+DAY = '20261015'
+EASTERN = pytz.timezone('US/Eastern')
+
+
+def _ts(hhmmss: str) -> datetime:
+    return EASTERN.localize(datetime.strptime(f"{DAY} {hhmmss}", '%Y%m%d %H:%M:%S')).astimezone(pytz.utc)
+
+
+def _record(path, rows):
+    """
+    Writes (time, symbol, secType, strike, right, bid, ask, last) rows as an md_recorder Arrow IPC file.
+    """
+    columns = list(zip(*rows))
+    table = pa.table({
+        'ts': pa.array([_ts(t) for t in columns[0]], pa.timestamp('us', tz='UTC')),
+        'symbol': pa.array(columns[1], pa.string()),
+        'secType': pa.array(columns[2], pa.string()),
+        'expiry': pa.array([DAY if sec_type == 'OPT' else '' for sec_type in columns[2]], pa.string()),
+        'strike': pa.array(columns[3], pa.float64()),
+        'right': pa.array(columns[4], pa.string()),
+        'bid': pa.array(columns[5], pa.float64()),
+        'ask': pa.array(columns[6], pa.float64()),
+        'last': pa.array(columns[7], pa.float64()),
+    })
+    with pa.ipc.new_stream(str(path), table.schema) as writer:
+        writer.write_table(table)
+    return str(path)
+
+
+def _load(path):
+    return backtest.load_history([path], entry_time='15:50', session_end='16:00', bar_seconds=60)
+
+
+def test_row_at_session_end_stays_in_its_own_symbol_day(tmp_path):
+    path = _record(tmp_path / 'close.arrow', [
+        ('15:49:00', 'QQQ', 'STK', 0.0, '', 499.9, 500.1, 500.0),
+        ('15:49:00', 'QQQ', 'OPT', 495.0, 'P', 1.0, 1.2, None),
+        ('15:49:00', 'SPY', 'STK', 0.0, '', 599.9, 600.1, 600.0),
+        ('15:49:00', 'SPY', 'OPT', 595.0, 'P', 2.0, 2.2, None),
+        ('16:00:00', 'QQQ', 'OPT', 495.0, 'P', 0.05, 0.1, None),
+        ('16:00:00', 'SPY', 'OPT', 595.0, 'P', 0.15, 0.2, None),
+    ])
+    history = _load(path)
+
+    assert list(history.symbols) == ['QQQ', 'SPY']
+    assert history.put_bid.shape == (2, 11, 1)
+    assert history.put_bid[0, 0, 0] == 1.0
+    assert history.put_bid[1, 0, 0] == 2.0
+    assert history.put_bid[0, -1, 0] == 0.05
+    assert history.put_bid[1, -1, 0] == 0.15
+
+
+def test_lost_bid_is_not_carried_forward(tmp_path):
+    path = _record(tmp_path / 'no_bid.arrow', [
+        ('15:40:00', 'SPY', 'STK', 0.0, '', 599.9, 600.1, 600.0),
+        ('15:40:00', 'SPY', 'OPT', 595.0, 'P', 1.0, 1.2, None),
+        ('15:40:00', 'SPY', 'OPT', 605.0, 'C', 1.0, 1.2, None),
+        ('15:45:00', 'SPY', 'OPT', 595.0, 'P', -1.0, 0.05, None),
+        ('15:52:30', 'SPY', 'OPT', 605.0, 'C', -1.0, 0.05, None),
+        ('15:55:30', 'SPY', 'OPT', 605.0, 'C', None, 0.1, None),
+    ])
+    history = _load(path)
+    put = history.strikes[0] == 595.0
+    call = history.strikes[0] == 605.0
+
+    # The put lost its bid before entry, so it cannot be sold at bar 0
+    assert np.all(np.isnan(history.put_bid[0, :, put]))
+    assert np.all(history.put_ask[0, :, put] == 0.05)
+    # The call keeps its bid until it is pulled at 15:52:30, and an unset side does not bring it back
+    assert np.all(history.call_bid[0, :3, call] == 1.0)
+    assert np.all(np.isnan(history.call_bid[0, 3:, call]))
+
+
+def test_quote_at_the_entry_time_is_in_bar_zero(tmp_path):
+    path = _record(tmp_path / 'entry.arrow', [
+        ('15:49:00', 'SPY', 'STK', 0.0, '', 599.9, 600.1, 600.0),
+        ('15:49:00', 'SPY', 'OPT', 595.0, 'P', 1.0, 1.2, None),
+        ('15:50:00', 'SPY', 'OPT', 595.0, 'P', 1.1, 1.3, None),
+        ('15:50:01', 'SPY', 'OPT', 595.0, 'P', 1.4, 1.6, None),
+        ('15:51:00', 'SPY', 'OPT', 595.0, 'P', 1.5, 1.7, None),
+        ('15:51:01', 'SPY', 'OPT', 595.0, 'P', 1.8, 2.0, None),
+    ])
+    history = _load(path)
+
+    assert history.put_bid[0, :3, 0].tolist() == [1.1, 1.5, 1.8]
+
+
+def _history(underlying, put_quotes, call_quotes) -> backtest.ChainHistory:
+    """
+    Two symbol-days over four bars with strikes 95/100/105, where only the 95 put and the 105 call are quoted:
+    put_quotes and call_quotes hold one (bid, ask) per bar for each day.
+    """
+    quotes = {}
+    for name, strike_index, legs in (('put', 0, put_quotes), ('call', 2, call_quotes)):
+        for side in (0, 1):
+            values = np.full((2, 4, 3), np.nan)
+            values[:, :, strike_index] = np.array(legs, dtype=float)[..., side]
+            quotes[f"{name}_{'ask' if side else 'bid'}"] = values
+    return backtest.ChainHistory(np.array(['20261014', '20261015']), np.array(['SPY', 'SPY']),
+                                 np.array(underlying, dtype=float), np.array([[95.0, 100.0, 105.0]] * 2), **quotes)
+
+
+def test_run_backtest_stops_out_and_settles_by_hand():
+    history = _history(
+        underlying=[[100.2, 101.0, 104.0, 106.0], [99.8, 100.0, 97.0, 100.0]],
+        # Combo mids: day 1 falls from 2.2 to 0.3; day 2 falls to 1.6, then jumps to 4.0 before easing to 3.0
+        put_quotes=[[(1.0, 1.2), (0.5, 0.6), (0.2, 0.3), (0.0, 0.05)],
+                    [(1.0, 1.2), (0.7, 0.9), (1.9, 2.1), (1.4, 1.6)]],
+        call_quotes=[[(1.0, 1.2), (1.0, 1.1), (0.3, 0.4), (0.1, 0.45)],
+                     [(1.0, 1.2), (0.7, 0.9), (1.9, 2.1), (1.4, 1.6)]],
+    )
+    grid = backtest.parameter_grid([5], [5], [1.0, 2.0])
+
+    result = backtest.run_backtest(history, grid)
+
+    # Entry: sold at the leg bids (2.0) with a mid of 2.2, so the trail is 2.2 (x1) or 4.4 (x2)
+    # Day 1 is never stopped and settles with the 105 call 1.0 in the money at 106: (2.0 - 1.0) x 100
+    # Day 2 with trail 2.2: 4.0 >= 1.6 + 2.2 at bar 2, bought back at the combo ask 4.2: (2.0 - 4.2) x 100
+    # Day 2 with trail 4.4: never stopped, both legs expire worthless at 100: 2.0 x 100
+    np.testing.assert_allclose(result.pnl, [[100.0, -220.0], [100.0, 200.0]])
+    assert result.stopped.tolist() == [[False, True], [False, False]]
+
+
+def test_run_backtest_skips_days_without_an_entry_bid():
+    history = _history(
+        underlying=[[100.0] * 4, [100.0] * 4],
+        put_quotes=[[(1.0, 1.2)] * 4, [(np.nan, 0.05)] * 4],
+        call_quotes=[[(1.0, 1.2)] * 4, [(1.0, 1.2)] * 4],
+    )
+
+    result = backtest.run_backtest(history, backtest.parameter_grid([5], [5], [1.0]), multiplier=50.0)
+
+    # Day 1 holds the 2.0 credit to expiry at the 50 multiplier; day 2 has no put to sell
+    assert result.pnl[0, 0] == 100.0
+    assert np.isnan(result.pnl[0, 1]) and not result.stopped[0, 1]
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("ib_insync")
+pytest.importorskip("numpy")
+
+from ib_insync import Contract
+import chain_cache
+
+EXPIRY = '20991217'
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """
+    An empty chain cache in a temporary directory, backed by an IB stub that counts contract detail requests.
+    """
+    requests = []
+
+    async def req_contract_details_async(contract):
+        requests.append(contract.symbol)
+        await asyncio.sleep(0.01)
+        return [SimpleNamespace(contract=Contract(symbol=contract.symbol, secType=contract.secType, conId=1000 + i,
+                                                  strike=500.0 + i, right='C',
+                                                  lastTradeDateOrContractMonth=contract.lastTradeDateOrContractMonth))
+                for i in range(3)]
+
+    monkeypatch.setattr(chain_cache.cfg, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(chain_cache, 'ib', SimpleNamespace(reqContractDetailsAsync=req_contract_details_async))
+    monkeypatch.setattr(chain_cache, '_chains', {})
+    monkeypatch.setattr(chain_cache, '_pending', {})
+    monkeypatch.setattr(chain_cache, '_arrays', {})
+    monkeypatch.setattr(chain_cache, '_loaded', False)
+    monkeypatch.setattr(chain_cache, '_dirty', False)
+    return requests
+
+
+def _get(symbol: str = 'SPY', expiry: str = EXPIRY):
+    return chain_cache.get_option_contracts_async(symbol, 'OPT', expiry, 'C', 'SMART')
+
+
+def test_month_expiry_is_fresh_through_its_month():
+    this_month = datetime.today().strftime('%Y%m')
+
+    assert chain_cache._is_fresh(time.time(), this_month)
+    assert chain_cache._is_fresh(time.time(), datetime.today().strftime('%Y%m%d'))
+    assert not chain_cache._is_fresh(time.time(), '202001')
+    assert not chain_cache._is_fresh(time.time(), '20200117')
+
+
+def test_second_lookup_is_served_from_the_cache(cache):
+    async def run():
+        first = await _get()
+        return first, await _get()
+
+    first, second = asyncio.run(run())
+
+    assert cache == ['SPY']
+    assert second is first and len(first) == 3
+
+
+def test_concurrent_lookups_share_one_request(cache):
+    async def run():
+        return await asyncio.gather(_get(), _get(), _get('QQQ'))
+
+    spy, spy_again, qqq = asyncio.run(run())
+
+    assert sorted(cache) == ['QQQ', 'SPY']
+    assert spy is spy_again and qqq is not spy
+    assert chain_cache._pending == {}
+
+
+def test_stale_chains_are_fetched_again(cache, monkeypatch):
+    asyncio.run(_get())
+    monkeypatch.setattr(chain_cache.cfg, 'chain_cache_ttl', 60)
+    key = chain_cache.chain_key('SPY', 'OPT', EXPIRY, 'C', 'SMART')
+    fetched_at, contracts = chain_cache._chains[key]
+    chain_cache._chains[key] = (fetched_at - 61, contracts)
+
+    asyncio.run(_get())
+
+    assert cache == ['SPY', 'SPY']
+
+
+def test_invalidate_drops_only_matching_chains(cache):
+    async def run():
+        await asyncio.gather(_get(), _get('QQQ'))
+        chain_cache.invalidate(symbol='SPY')
+        await asyncio.gather(_get(), _get('QQQ'))
+
+    asyncio.run(run())
+
+    assert sorted(cache) == ['QQQ', 'SPY', 'SPY']
+
+
+def test_cache_file_is_written_once_per_change(cache, monkeypatch):
+    writes = []
+    save_json_async = chain_cache.save_json_async
+
+    async def counting_save_json_async(path, build):
+        writes.append(path)
+        await save_json_async(path, build)
+
+    monkeypatch.setattr(chain_cache, 'save_json_async', counting_save_json_async)
+
+    async def run():
+        await asyncio.gather(_get(), _get('QQQ'))
+        await chain_cache.save_async()
+        await _get()
+        await chain_cache.save_async()
+
+    asyncio.run(run())
+
+    assert len(writes) == 1
+    with open(writes[0]) as f:
+        assert sorted(entry['key'][0] for entry in json.load(f)) == ['QQQ', 'SPY']
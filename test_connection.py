@@ -0,0 +1,233 @@
+import asyncio
+from datetime import datetime
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from eventkit import Event
+from ib_insync import Contract, Ticker
+import connection
+
+
+class StubIB:
+    """
+    The connection-facing parts of ib_insync.IB: connects after `failures` failed attempts and records every
+    request it receives.
+    """
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.connected = False
+        self.connect_attempts = 0
+        self.calls = []
+        self.tickers = []
+        self.errorEvent = Event('errorEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+
+    def isConnected(self) -> bool:
+        return self.connected
+
+    async def connectAsync(self, host, port, clientId, timeout=None, readonly=False):
+        self.connect_attempts += 1
+        if self.connect_attempts <= self.failures:
+            raise ConnectionRefusedError("refused")
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+        self.disconnectedEvent.emit()
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        self.calls.append('reqMktData')
+        self.tickers.append(Ticker(contract=contract))
+        return self.tickers[-1]
+
+    def placeOrder(self, contract, order):
+        self.calls.append('placeOrder')
+
+    async def qualifyContractsAsync(self, *contracts):
+        self.calls.append('qualifyContractsAsync')
+        return list(contracts)
+
+    async def reqCurrentTimeAsync(self):
+        self.calls.append('reqCurrentTime')
+        return datetime(2026, 10, 16, 15, 50)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(connection.cfg, 'ib_connect_retries', 3)
+    monkeypatch.setattr(connection.cfg, 'ib_connect_backoff', 0.001)
+    monkeypatch.setattr(connection.cfg, 'ib_connect_backoff_max', 0.002)
+    monkeypatch.setattr(connection.cfg, 'ib_auto_reconnect', True)
+
+
+@pytest.fixture
+def sync_loop():
+    """
+    A current event loop for the blocking API, which runs on it (asyncio.run leaves none behind).
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def _managed(stub: StubIB) -> connection.ManagedIB:
+    return connection.ManagedIB(stub, connection.ConnectionManager(stub, 'localhost', 7496, 1))
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(connection.cfg, 'ib_connect_backoff', 1.0)
+    monkeypatch.setattr(connection.cfg, 'ib_connect_backoff_max', 5.0)
+
+    assert list(connection._backoff_delays(6)) == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_connect_retries_until_an_attempt_succeeds():
+    stub = StubIB(failures=2)
+
+    asyncio.run(connection.ConnectionManager(stub, 'localhost', 7496, 1).connect_async())
+
+    assert stub.connected and stub.connect_attempts == 3
+
+
+def test_connect_gives_up_after_the_configured_attempts():
+    stub = StubIB(failures=5)
+    manager = connection.ConnectionManager(stub, 'localhost', 7496, 1)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(manager.connect_async())
+    assert stub.connect_attempts == 3
+    assert manager.last_error == "refused"
+
+
+def test_requests_connect_on_first_use(sync_loop):
+    stub = StubIB()
+    ib = _managed(stub)
+
+    assert not stub.connected
+    ib.placeOrder(Contract(), None)
+
+    assert stub.connected and stub.calls == ['placeOrder']
+
+
+def test_disconnect_reconnects_and_resubscribes_streaming_data():
+    stub = StubIB()
+    ib = _managed(stub)
+    contract = Contract(conId=1)
+
+    async def run():
+        await ib.connection.connect_async()
+        ticker = ib.reqMktData(contract)
+        ib.reqMktData(Contract(conId=2), snapshot=True)
+        stub.disconnect()  # dropped by the socket, not closed by the manager
+        await ib.connection._reconnect_task
+        return ticker
+
+    ticker = asyncio.run(run())
+
+    assert stub.connected and ib.connection.reconnects == 1
+    # The streaming line is re-requested, the snapshot is not
+    assert stub.calls == ['reqMktData', 'reqMktData', 'reqMktData']
+    # Updates on the new line reach the ticker callers already hold
+    new_ticker = stub.tickers[-1]
+    new_ticker.bid = 1.25
+    new_ticker.updateEvent.emit(new_ticker)
+    assert new_ticker is not ticker and ticker.bid == 1.25
+
+
+def test_close_does_not_reconnect():
+    stub = StubIB()
+    ib = _managed(stub)
+
+    async def run():
+        await ib.connection.connect_async()
+        ib.connection.close()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert not stub.connected and stub.connect_attempts == 1
+
+
+def test_async_requests_wait_for_a_reconnect_but_sync_ones_raise():
+    # A sync call cannot block inside the running loop, so only async requests ride out the reconnect
+    stub = StubIB(failures=0)
+    ib = _managed(stub)
+
+    async def run():
+        await ib.connection.connect_async()
+        stub.failures = 2
+        stub.disconnect()  # dropped by the socket, not closed by the manager
+        with pytest.raises(ConnectionError, match="reconnecting"):
+            ib.placeOrder(Contract(), None)
+        return await ib.qualifyContractsAsync(Contract(conId=1))
+
+    qualified = asyncio.run(run())
+
+    assert stub.connected and qualified[0].conId == 1
+    assert stub.calls == ['qualifyContractsAsync']
+
+
+def test_ping_reports_latency_when_connected(sync_loop):
+    stub = StubIB()
+    ib = _managed(stub)
+
+    assert ib.ping()["latency_ms"] is None
+    ib.connection.connect()
+    health = ib.ping()
+
+    assert health["connected"] and health["latency_ms"] >= 0
+    assert health["server_time"] == datetime(2026, 10, 16, 15, 50)
+
+
+@pytest.fixture
+def stub_sessions(monkeypatch):
+    """
+    Makes SessionPool build StubIB sessions, returned in creation order.
+    """
+    created = []
+
+    def stub_ib():
+        created.append(StubIB())
+        return created[-1]
+
+    monkeypatch.setattr(connection, 'IB', stub_ib)
+    return created
+
+
+def test_pool_routes_each_call_to_its_role_session(stub_sessions, sync_loop):
+    pool = connection.SessionPool('localhost', 7496, {'orders': 1, 'market_data': 2, 'contracts': 3})
+    orders, market_data, contracts = stub_sessions
+
+    pool.run(pool.qualifyContractsAsync(Contract(conId=1)))
+    pool.reqMktData(Contract(conId=1))
+    pool.placeOrder(Contract(conId=1), None)
+
+    assert [pool.sessions[role].connection.client_id for role in ('orders', 'market_data', 'contracts')] == [1, 2, 3]
+    assert orders.calls == ['placeOrder']
+    assert market_data.calls == ['reqMktData']
+    assert contracts.calls == ['qualifyContractsAsync']
+
+
+def test_pool_roles_with_one_client_id_share_a_session(stub_sessions):
+    pool = connection.SessionPool('localhost', 7496, {'orders': 1, 'market_data': 2, 'contracts': 2})
+
+    assert len(stub_sessions) == 2
+    assert pool.session('market_data') is pool.session('contracts')
+    assert pool.session('orders') is not pool.session('market_data')
+
+
+def test_pool_merged_events_fire_once_per_session_event(stub_sessions):
+    pool = connection.SessionPool('localhost', 7496, {'orders': 1, 'market_data': 2, 'contracts': 2})
+    errors, disconnects = [], []
+    pool.errorEvent += lambda *args: errors.append(args)
+    pool.disconnectedEvent += lambda: disconnects.append(True)
+
+    stub_sessions[1].errorEvent.emit(-1, 2104, "Market data farm connection is OK", None)
+    pool.disconnect()
+
+    assert errors == [(-1, 2104, "Market data farm connection is OK", None)]
+    assert len(disconnects) == 2
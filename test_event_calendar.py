@@ -0,0 +1,79 @@
+from datetime import datetime
+import pytest
+
+pytest.importorskip("pytz")
+
+import event_calendar
+
+EASTERN = event_calendar.EASTERN
+
+
+@pytest.fixture
+def calendar(monkeypatch, tmp_path):
+    """
+    Loads a small calendar covering FOMC and CPI for 2026 only.
+    """
+    path = tmp_path / 'events.csv'
+    path.write_text("# test calendar\n"
+                    "date,time,kind\n"
+                    "\n"
+                    "20261110,08:30,cpi\n"
+                    "20261028,14:00,FOMC\n"
+                    "20261209,14:00,FOMC\n"
+                    "20261210,08:30,CPI\n")
+    monkeypatch.setattr(event_calendar.cfg, 'event_calendar_file', str(path))
+    monkeypatch.setattr(event_calendar.cfg, 'blocking_event_kinds', ('FOMC', 'CPI'))
+    monkeypatch.setattr(event_calendar.cfg, 'event_settle_minutes', 5)
+    event_calendar.reload()
+    yield
+    # The next user loads the configured calendar again
+    event_calendar._events = None
+
+
+def _at(text: str) -> datetime:
+    return EASTERN.localize(datetime.strptime(text, '%Y%m%d %H:%M'))
+
+
+def test_events_are_loaded_sorted_and_normalised(calendar):
+    events = event_calendar.load_events()
+
+    assert [(event.release.strftime('%Y%m%d'), event.kind) for event in events] == [
+        ('20261028', 'FOMC'), ('20261110', 'CPI'), ('20261209', 'FOMC'), ('20261210', 'CPI')]
+
+
+def test_blocking_events_cover_now_through_the_end_of_the_expiry_day(calendar):
+    now = _at('20261016 15:50')
+
+    assert event_calendar.blocking_events('20261027', now=now) == []
+    assert [event.kind for event in event_calendar.blocking_events('20261028', now=now)] == ['FOMC']
+    assert [event.kind for event in event_calendar.blocking_events('20261110', now=now)] == ['FOMC', 'CPI']
+    assert [event.kind for event in event_calendar.blocking_events('20261110', kinds=('CPI',), now=now)] == ['CPI']
+
+
+def test_event_keeps_blocking_until_it_has_settled(calendar):
+    release = '20261028'
+
+    assert event_calendar.blocking_events(release, now=_at('20261028 14:04'))
+    assert event_calendar.blocking_events(release, now=_at('20261028 14:05')) == []
+    assert event_calendar.safe_to_trade(release, now=_at('20261028 14:06'))
+    assert not event_calendar.safe_to_trade(release, now=_at('20261028 13:59'))
+
+
+def test_missing_kinds_fail_closed(calendar, caplog):
+    now = _at('20261216 15:50')
+
+    assert event_calendar.missing_kinds('20261218', now=now) == []
+    assert event_calendar.missing_kinds('20261218', kinds=('NFP',), now=now) == ['NFP']
+    assert event_calendar.missing_kinds('20270108', now=now) == ['FOMC', 'CPI']
+
+    # Nothing is scheduled before either expiry, but the 2027 one cannot be vouched for
+    assert event_calendar.safe_to_trade('20261218', now=now)
+    assert not event_calendar.safe_to_trade('20270108', now=now)
+    assert "lists no FOMC/CPI releases for 2027" in caplog.text
+
+
+def test_missing_calendar_file_blocks_everything(monkeypatch, tmp_path, calendar):
+    monkeypatch.setattr(event_calendar.cfg, 'event_calendar_file', str(tmp_path / 'missing.csv'))
+    event_calendar.reload()
+
+    assert not event_calendar.safe_to_trade('20261218', now=_at('20261216 15:50'))
@@ -0,0 +1,80 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pytz")
+
+import greeks
+
+SPOT = 500.0
+T = 2 * 3600 / greeks.SECONDS_PER_YEAR  # two hours to a same-day expiry
+
+
+def _chain(count: int):
+    strikes = np.linspace(SPOT * 0.95, SPOT * 1.05, count)
+    is_call = np.arange(count) % 2 == 0
+    vols = np.linspace(0.12, 0.45, count)
+    return strikes, is_call, vols
+
+
+def test_implied_vol_recovers_the_pricing_vol():
+    strikes, is_call, vols = _chain(200)
+    prices = greeks.bs_price(SPOT, strikes, T, vols, is_call)
+    # Options with less than a tick of time value (far OTM or deep ITM) carry no usable vol information
+    intrinsic = np.where(is_call, np.maximum(SPOT - strikes, 0), np.maximum(strikes - SPOT, 0))
+    priced = prices - intrinsic > 0.01
+
+    iv = greeks.implied_vol(prices, SPOT, strikes, T, is_call)
+
+    assert priced.sum() > 30
+    np.testing.assert_allclose(iv[priced], vols[priced], rtol=1e-4)
+
+
+def test_implied_vol_is_nan_outside_no_arbitrage_bounds():
+    strikes = np.array([490.0, 510.0, 500.0])
+    is_call = np.array([True, False, True])
+    intrinsic = np.array([10.0, 10.0, 0.0])
+    prices = np.array([intrinsic[0] - 0.5, intrinsic[1] - 0.5, np.nan])
+
+    assert np.all(np.isnan(greeks.implied_vol(prices, SPOT, strikes, T, is_call)))
+
+
+def test_delta_signs_and_put_call_parity():
+    strikes, _, vols = _chain(101)
+    calls = greeks.greeks(SPOT, strikes, T, vols, np.ones(len(strikes), dtype=bool))
+    puts = greeks.greeks(SPOT, strikes, T, vols, np.zeros(len(strikes), dtype=bool))
+
+    assert np.all((calls["delta"] >= 0) & (calls["delta"] <= 1))
+    assert np.all((puts["delta"] <= 0) & (puts["delta"] >= -1))
+    # Deltas fall with the strike for both rights
+    assert np.all(np.diff(calls["delta"]) <= 0) and np.all(np.diff(puts["delta"]) <= 0)
+    # Call delta - put delta = exp(-qT), and both share gamma and vega
+    dividend_factor = np.exp(-greeks.cfg.dividend_yield * T)
+    np.testing.assert_allclose(calls["delta"] - puts["delta"], dividend_factor, atol=1e-6)
+    np.testing.assert_allclose(calls["gamma"], puts["gamma"])
+    np.testing.assert_allclose(calls["vega"], puts["vega"])
+
+
+def test_chain_greeks_skips_unquoted_options():
+    strikes = np.array([499.0, 500.0, 501.0])
+    rights = np.array(['P', 'C', 'C'])
+    prices = greeks.bs_price(SPOT, strikes, T, 0.2, rights == 'C')
+    bids = np.array([prices[0] - 0.01, prices[1] - 0.01, -1.0])
+    asks = prices + 0.01
+
+    result = greeks.chain_greeks(strikes, rights, bids, asks, SPOT, T)
+
+    assert result["delta"][0] < 0 < result["delta"][1]
+    assert np.isnan(result["iv"][2]) and np.isnan(result["delta"][2])
+
+
+def test_chain_greeks_prices_a_full_chain():
+    strikes, is_call, vols = _chain(500)
+    prices = greeks.bs_price(SPOT, strikes, T, vols, is_call)
+    rights = np.where(is_call, 'C', 'P')
+    intrinsic = np.where(is_call, np.maximum(SPOT - strikes, 0), np.maximum(strikes - SPOT, 0))
+    priced = prices - intrinsic > 0.01
+
+    result = greeks.chain_greeks(strikes, rights, prices - 0.01, prices + 0.01, SPOT, T)
+
+    assert all(len(result[key]) == len(strikes) for key in ("iv", "delta", "gamma", "vega", "theta"))
+    np.testing.assert_allclose(result["iv"][priced], vols[priced], rtol=1e-4)
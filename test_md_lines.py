@@ -0,0 +1,150 @@
+import asyncio
+from collections import OrderedDict
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import Contract
+from fake_ib import FakeIB
+import md_lines
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    """
+    Empty line bookkeeping against a FakeIB without fixtures, with a budget of three lines.
+    """
+    fake_ib = FakeIB(str(tmp_path))
+    monkeypatch.setattr(md_lines, 'ib', fake_ib)
+    monkeypatch.setattr(md_lines, '_lines', OrderedDict())
+    monkeypatch.setattr(md_lines, '_reserved', 0)
+    monkeypatch.setattr(md_lines, '_peak', 0)
+    monkeypatch.setattr(md_lines, '_changed', None)
+    monkeypatch.setattr(md_lines.cfg, 'md_line_budget', 3)
+    monkeypatch.setattr(md_lines.cfg, 'md_line_wait_timeout', 1.0)
+    monkeypatch.setattr(md_lines.cfg, 'md_snapshot_chunk', 50)
+    return fake_ib
+
+
+def _contracts(count: int, first: int = 1) -> list:
+    return [Contract(conId=con_id, symbol='SPY', secType='OPT') for con_id in range(first, first + count)]
+
+
+def test_acquire_waits_at_the_budget_until_a_release(fake):
+    held = _contracts(3)
+    extra = Contract(conId=9, symbol='SPY', secType='OPT')
+
+    async def run():
+        for contract in held:
+            await md_lines.acquire_async(contract)
+        waiter = asyncio.ensure_future(md_lines.acquire_async(extra))
+        await asyncio.sleep(0.02)
+        blocked = not waiter.done()
+        md_lines.release(held[1])
+        await asyncio.wait_for(waiter, 0.5)
+        return blocked
+
+    assert asyncio.run(run())
+    assert not md_lines.is_streaming(held[1])
+    assert md_lines.open_lines() == 3 and fake.open_lines == 3
+
+
+def test_acquire_times_out_when_every_line_is_held(fake, monkeypatch):
+    monkeypatch.setattr(md_lines.cfg, 'md_line_wait_timeout', 0.02)
+
+    async def run():
+        for contract in _contracts(3):
+            await md_lines.acquire_async(contract)
+        await md_lines.acquire_async(Contract(conId=9))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert md_lines.open_lines() == 3
+
+
+def test_only_idle_lines_are_evicted_least_recently_used_first(fake):
+    first, second, third = _contracts(3)
+
+    async def run():
+        for contract in (first, second, third):
+            await md_lines.acquire_async(contract)
+        md_lines.release(third)
+        md_lines.release(first)
+        await md_lines.acquire_async(Contract(conId=9))
+
+    asyncio.run(run())
+
+    # first and third are both idle; first was acquired longest ago, and second is held
+    assert not md_lines.is_streaming(first)
+    assert md_lines.is_streaming(second) and md_lines.is_streaming(third)
+    assert fake.request_counts['cancelMktData'] == 1
+
+
+def test_shared_lines_are_counted_once(fake):
+    contract = Contract(conId=1)
+
+    async def run():
+        return await md_lines.acquire_async(contract), await md_lines.acquire_async(Contract(conId=1))
+
+    first, second = asyncio.run(run())
+
+    assert first is second
+    assert md_lines.open_lines() == 1 and fake.request_counts['reqMktData'] == 1
+    md_lines.release(contract)
+    assert md_lines._lines[1][2] == 1
+
+
+def test_reservation_is_not_leaked_on_timeout_or_error(fake, monkeypatch):
+    monkeypatch.setattr(md_lines.cfg, 'md_line_wait_timeout', 0.02)
+
+    async def run():
+        with pytest.raises(ValueError):
+            async with md_lines.reserved_async(2):
+                assert md_lines.open_lines() == 2
+                raise ValueError("snapshot failed")
+        for contract in _contracts(3):
+            await md_lines.acquire_async(contract)
+        with pytest.raises(asyncio.TimeoutError):
+            async with md_lines.reserved_async(1):
+                pass
+
+    asyncio.run(run())
+
+    assert md_lines._reserved == 0
+    assert md_lines.open_lines() == 3
+
+
+def test_snapshots_are_chunked_by_the_lines_nobody_holds(fake):
+    held = _contracts(3)
+
+    async def run():
+        for contract in held:
+            await md_lines.acquire_async(contract)
+        md_lines.release(held[0])
+        return await md_lines.req_tickers_async(*_contracts(5, first=10))
+
+    tickers = asyncio.run(run())
+
+    # Two lines stay held, so each snapshot chunk gets the one line left once the idle line is evicted
+    assert [ticker.contract.conId for ticker in tickers] == [10, 11, 12, 13, 14]
+    assert fake.request_counts['reqTickers'] == 5
+    assert md_lines.peak_lines() == 3 and fake.peak_lines == 3
+
+
+def test_snapshots_wait_while_every_line_is_held(fake):
+    held = _contracts(3)
+
+    async def run():
+        for contract in held:
+            await md_lines.acquire_async(contract)
+        snapshot = asyncio.ensure_future(md_lines.req_tickers_async(*_contracts(4, first=10)))
+        await asyncio.sleep(0.02)
+        blocked = not snapshot.done()
+        for contract in held:
+            md_lines.release(contract)
+        return blocked, await asyncio.wait_for(snapshot, 0.5)
+
+    blocked, tickers = asyncio.run(run())
+
+    assert blocked and len(tickers) == 4
+    assert md_lines.peak_lines() == 3 and md_lines._reserved == 0
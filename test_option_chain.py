@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("ib_insync")
+
+from option_chain import OptionChain
+
+EXPIRIES = ['20261016', '20261023']
+
+
+def _sec_def(exchange: str = 'CBOE', strikes=(495.0, 500.0, 505.0), expirations=EXPIRIES):
+    return SimpleNamespace(exchange=exchange, expirations=list(expirations), strikes=list(strikes),
+                           tradingClass='SPY', multiplier='100')
+
+
+def _sec_def_chain(*sec_defs, expiries=None) -> OptionChain:
+    return OptionChain.from_sec_def('SPY', 'OPT', 'USD', list(sec_defs), expiries=expiries)
+
+
+def test_entries_are_sorted_by_expiry_right_and_strike():
+    chain = OptionChain('SPY', 'OPT', 'SMART', 'USD',
+                        expirations=['20261023', '20261016', '20261016', '20261016', '20261023'],
+                        strikes=[500.0, 505.0, 495.0, 500.0, 495.0], rights=['P', 'C', 'P', 'C', 'C'],
+                        trading_classes=['SPY'] * 5, multipliers=['100'] * 5, con_ids=[1, 2, 3, 4, 5])
+
+    assert list(zip(chain.expirations, chain.rights, chain.strikes)) == [
+        ('20261016', 'C', 500.0), ('20261016', 'C', 505.0), ('20261016', 'P', 495.0),
+        ('20261023', 'C', 495.0), ('20261023', 'P', 500.0)]
+    # Every column moves with its entry
+    assert chain.con_ids.tolist() == [4, 2, 3, 5, 1]
+
+
+def test_sec_def_and_contract_chains_match():
+    from_sec_def = _sec_def_chain(_sec_def(), expiries=['20261016'])
+    contracts = from_sec_def.contracts()
+    for con_id, contract in enumerate(contracts, start=1):
+        contract.conId = con_id
+
+    from_contracts = OptionChain.from_contracts(contracts[::-1])
+
+    assert len(from_sec_def) == len(from_contracts) == 6
+    for name in ('expirations', 'strikes', 'rights', 'trading_classes', 'multipliers', 'exchanges'):
+        np.testing.assert_array_equal(getattr(from_sec_def, name), getattr(from_contracts, name))
+    assert from_contracts.con_ids.tolist() == list(range(1, 7))
+    assert from_contracts.contracts() == contracts
+
+
+def test_sec_def_entries_keep_their_exchange_and_expiry_filter():
+    chain = _sec_def_chain(_sec_def('CBOE'), _sec_def('AMEX', strikes=(510.0,)), expiries=['20261023'])
+
+    assert set(chain.expirations) == {'20261023'}
+    assert chain.exchange == 'CBOE'
+    assert sorted(set(zip(chain.strikes, chain.exchanges))) == [(495.0, 'CBOE'), (500.0, 'CBOE'), (505.0, 'CBOE'),
+                                                                 (510.0, 'AMEX')]
+
+
+def test_strikes_between_includes_both_edges():
+    chain = _sec_def_chain(_sec_def(), expiries=['20261016'])
+
+    assert chain.strikes[chain.strikes_between(495.0, 500.0, 'C')].tolist() == [495.0, 500.0]
+    assert chain.strikes[chain.strikes_between(495.01, 504.99, 'P')].tolist() == [500.0]
+    assert len(chain.strikes_between(506.0, 600.0)) == 0
+    assert len(chain.strikes_between(495.0, 505.0)) == 6
+
+
+def test_nearest_strike_ties_go_to_the_lower_strike():
+    chain = _sec_def_chain(_sec_def(), expiries=['20261016'])
+
+    assert chain.nearest_strike(502.5, 'C') == 500.0
+    assert chain.nearest_strike(503.0) == 505.0
+    assert chain.strikes[chain.nearest([490.0, 506.0], 'P', count=2)].tolist() == [[495.0, 500.0], [505.0, 500.0]]
+
+
+def test_empty_chain_has_no_nearest_strike():
+    chain = _sec_def_chain()
+
+    assert len(chain) == 0
+    assert chain.nearest_strike(500.0) is None
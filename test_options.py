@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("ib_insync")
+pytest.importorskip("numpy")
+
+from ib_insync import Contract, Ticker
+import options
+
+EXPIRY = '20261016'
+STRIKES = [float(strike) for strike in range(480, 521)]
+UNDERLYING = Contract(symbol='SPY', secType='STK', conId=756733, exchange='SMART', currency='USD')
+
+
+def _premium(right: str, strike: float) -> float:
+    # Rises with the strike for puts and falls for calls, about 0.10 per strike away from 500
+    return round(max(0.05, 2.0 + 0.1 * ((strike - 500) if right == 'P' else (500 - strike))), 2)
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    """
+    Answers option qualification and snapshots from _premium. Strikes in `unquoted` come back without a bid or
+    ask, those in `dropped` are left out of the snapshot results; `requested` counts the strikes quoted.
+    """
+    state = SimpleNamespace(unquoted=set(), dropped=set(), requested=[])
+
+    def qualify(*contracts):
+        for contract in contracts:
+            contract.conId = int(contract.strike * 10) + (1 if contract.right == 'C' else 0)
+        return list(contracts)
+
+    async def qualify_async(*contracts):
+        return qualify(*contracts)
+
+    async def req_tickers_async(*contracts):
+        state.requested.extend(contract.strike for contract in contracts)
+        tickers = []
+        for contract in contracts:
+            if contract.strike in state.dropped:
+                continue
+            price = float('nan') if contract.strike in state.unquoted else _premium(contract.right, contract.strike)
+            tickers.append(Ticker(contract=contract, bid=price, ask=price))
+        return tickers
+
+    sec_def = SimpleNamespace(expirations=[EXPIRY], strikes=STRIKES, tradingClass='SPY')
+    monkeypatch.setattr(options, 'ib', SimpleNamespace(reqSecDefOptParams=lambda *args: [sec_def],
+                                                       qualifyContracts=qualify, run=asyncio.run))
+    monkeypatch.setattr(options, 'qualify_contracts_async', qualify_async)
+    monkeypatch.setattr(options.md_lines, 'req_tickers_async', req_tickers_async)
+    monkeypatch.setattr(options.ticker_registry, 'record', lambda *tickers: None)
+    return state
+
+
+def _select(right: str, target: float, search: str):
+    contract, price = options.get_option_by_target_price(UNDERLYING, right, 'SMART', EXPIRY, target, 500.0, search)
+    return (contract.strike if contract else None), price
+
+
+@pytest.mark.parametrize("right", ['P', 'C'])
+def test_bisect_matches_scan_for_every_target(chain, right):
+    for target in [0.01, 0.05, 0.33, 1.0, 1.04, 1.5, 1.96, 2.0, 2.5]:
+        assert _select(right, target, 'bisect') == _select(right, target, 'scan'), target
+
+
+def test_bisect_quotes_a_fraction_of_the_ladder(chain):
+    _select('P', 1.23, 'bisect')
+
+    assert len(chain.requested) < len(STRIKES) // 2
+
+
+@pytest.mark.parametrize("right, richer", [('P', 493.0), ('C', 507.0)])
+def test_ties_go_to_the_richer_strike(chain, right, richer):
+    # 1.25 sits halfway between the 1.20 and 1.30 premiums
+    assert _select(right, 1.25, 'bisect') == _select(right, 1.25, 'scan') == (richer, 1.3)
+
+
+@pytest.mark.parametrize("gap", ['unquoted', 'dropped'])
+@pytest.mark.parametrize("right", ['P', 'C'])
+def test_quote_gap_near_the_money_does_not_cut_off_the_answer(chain, gap, right):
+    # The strikes priced nearest the target, and the first strikes the bisection probes, have no quote
+    near = [493.0, 494.0, 495.0] if right == 'P' else [505.0, 506.0, 507.0]
+    getattr(chain, gap).update(near + [490.0, 510.0])
+
+    for target in [1.3, 1.4, 1.5, 1.0]:
+        assert _select(right, target, 'bisect') == _select(right, target, 'scan'), target
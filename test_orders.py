@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import Contract, OrderStatus, Trade
+import orders
+
+
+def test_allocate_margin_admits_everything_within_budget():
+    assert orders.allocate_margin([1, 2], [1000.0, 3000.0], 10000.0) == [1, 2]
+
+
+def test_allocate_margin_shrinks_the_bag_that_overflows():
+    # 4 units at 1000 each with 2500 left after the first bag: 2 units still fit
+    assert orders.allocate_margin([1, 4], [500.0, 4000.0], 3000.0) == [1, 2]
+
+
+def test_allocate_margin_drops_bags_that_cannot_fit_or_are_unknown():
+    assert orders.allocate_margin([1, 1, 1], [900.0, 500.0, None], 1000.0) == [1, 0, 0]
+
+
+def test_allocate_margin_lets_margin_reducing_bags_through():
+    assert orders.allocate_margin([3], [-200.0], 0.0) == [3]
+
+
+def test_allocate_margin_admits_nothing_for_empty_bags():
+    assert orders.allocate_margin([0, 1], [0.0, 500.0], 1000.0) == [0, 1]
+
+
+def test_allocate_margin_unbounded_budget_admits_every_bag():
+    assert orders.allocate_margin([2, 5], [1e9, None], float('inf')) == [2, 5]
+
+
+def _bag(symbol: str, quantity: int) -> dict:
+    return {"order_contract": Contract(symbol=symbol, secType='BAG', exchange='SMART', currency='USD'),
+            "order_type": 'LMT', "action": 'SELL', "is_live": True, "quantity": quantity, "stop_loss_amt": 1.0,
+            "limit_price": 1.5}
+
+
+@pytest.fixture
+def placed(monkeypatch):
+    """
+    Records the brackets submit_brackets_batch_async places, answering what-if checks from fixed per-bag margins.
+    """
+    margins = {"AAA": 1000.0, "BBB": 4000.0, "CCC": 2500.0}
+    calls = {"what_if": [], "placed": {}}
+
+    async def check_margin_async(order_contract, order):
+        calls["what_if"].append(order_contract.symbol)
+        return margins[order_contract.symbol]
+
+    async def place_bracket_async(order_contract, parent_order, child_order):
+        calls["placed"][order_contract.symbol] = (parent_order.totalQuantity, child_order.totalQuantity)
+        trade = SimpleNamespace(orderStatus=SimpleNamespace(status='Submitted'))
+        return trade, trade
+
+    monkeypatch.setattr(orders, 'check_margin_async', check_margin_async)
+    monkeypatch.setattr(orders, 'place_bracket_async', place_bracket_async)
+    return calls
+
+
+def test_batch_shrinks_and_drops_against_the_budget(placed):
+    bags = [_bag("AAA", 1), _bag("BBB", 2), _bag("CCC", 1)]
+
+    results = asyncio.run(orders.submit_brackets_batch_async(bags, margin_budget=3500.0))
+
+    # AAA takes 1000, BBB shrinks to the one 2000 unit that fits, CCC's 2500 no longer does
+    assert placed["placed"] == {"AAA": (1, 1), "BBB": (1, 1)}
+    assert [result is not None for result in results] == [True, True, False]
+
+
+def test_batch_unbounded_budget_skips_checks(placed):
+    bags = [_bag("AAA", 1), _bag("BBB", 2)]
+
+    results = asyncio.run(orders.submit_brackets_batch_async(bags, margin_budget=float('inf')))
+
+    assert placed["what_if"] == []
+    assert placed["placed"] == {"AAA": (1, 1), "BBB": (2, 2)}
+    assert all(results)
+
+
+def test_batch_isolates_a_failed_placement(placed, monkeypatch):
+    place_bracket_async = orders.place_bracket_async
+
+    async def failing_place_bracket_async(order_contract, parent_order, child_order):
+        if order_contract.symbol == "BBB":
+            raise ConnectionError("Not connected")
+        return await place_bracket_async(order_contract, parent_order, child_order)
+
+    monkeypatch.setattr(orders, 'place_bracket_async', failing_place_bracket_async)
+    bags = [_bag("AAA", 1), _bag("BBB", 1), _bag("CCC", 1)]
+
+    results = asyncio.run(orders.submit_brackets_batch_async(bags, margin_budget=float('inf')))
+
+    assert placed["placed"] == {"AAA": (1, 1), "CCC": (1, 1)}
+    assert [result is not None for result in results] == [True, False, True]
+
+
+@pytest.fixture
+def silent_ib(monkeypatch):
+    """
+    An IB whose orders are placed but never acknowledged, with a short acknowledgement timeout.
+    """
+    order_ids = iter(range(1, 100))
+
+    def place_order(contract, order):
+        return Trade(contract, order, OrderStatus(orderId=order.orderId, status='PendingSubmit'))
+
+    monkeypatch.setattr(orders, 'ib', SimpleNamespace(placeOrder=place_order,
+                                                      client=SimpleNamespace(getReqId=lambda: next(order_ids))))
+    monkeypatch.setattr(orders.cfg, 'order_ack_timeout', 0.01)
+
+
+def test_unacknowledged_order_is_not_accepted(silent_ib):
+    contract = Contract(symbol="AAA", secType='BAG', exchange='SMART', currency='USD')
+
+    result = asyncio.run(orders.submit_adaptive_order_trailing_stop_async(contract, 'LMT', 'SELL', True, 1, 1.0, 1.5))
+    status = asyncio.run(orders.submit_limit_order_async(contract, 1.5, 'SELL', True, 1))
+
+    assert result is None
+    assert status.startswith("Order failed")
+
+
+def test_staged_order_is_accepted_while_pending(silent_ib):
+    contract = Contract(symbol="AAA", secType='BAG', exchange='SMART', currency='USD')
+
+    result = asyncio.run(orders.submit_adaptive_order_trailing_stop_async(contract, 'LMT', 'SELL', False, 1, 1.0, 1.5))
+
+    assert result is not None
+    assert [trade.orderStatus.status for trade in result] == ['PendingSubmit', 'PendingSubmit']
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import Contract, Option, Stock
+import qualify
+from cache_store import contract_to_dict
+
+
+class StubIB:
+    """
+    Qualifies any contract with a symbol, giving it a conId and the fields only IB fills in; records each call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def qualifyContractsAsync(self, *contracts):
+        self.calls.append([(contract.symbol, contract.conId) for contract in contracts])
+        qualified = []
+        for contract in contracts:
+            if contract.symbol == 'NONE':
+                continue
+            contract.conId = contract.conId or 1000 + len(self.calls) * 10 + len(qualified)
+            contract.primaryExchange = 'ARCA'
+            contract.localSymbol = contract.symbol
+            contract.tradingClass = contract.tradingClass or contract.symbol
+            qualified.append(contract)
+        return qualified
+
+
+@pytest.fixture
+def stub_ib(monkeypatch, tmp_path):
+    stub = StubIB()
+    monkeypatch.setattr(qualify, 'ib', stub)
+    monkeypatch.setattr(qualify.cfg, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(qualify.cfg, 'params', {'SPY': {"conid": 756733, "exchange": 'SMART', "sec_type": 'STK'}})
+    monkeypatch.setattr(qualify, '_qualified', {})
+    monkeypatch.setattr(qualify, '_partial', set())
+    monkeypatch.setattr(qualify, '_qualified_loaded', False)
+    monkeypatch.setattr(qualify, '_qualified_dirty', False)
+    return stub
+
+
+def _option(strike: float, trading_class: str = '', expiry: str = '20991217') -> Option:
+    return Option(symbol='SPX', lastTradeDateOrContractMonth=expiry, strike=strike, right='C', exchange='SMART',
+                  currency='USD', tradingClass=trading_class)
+
+
+def test_misses_are_qualified_in_one_request(stub_ib):
+    async def run():
+        await qualify.qualify_contracts_async(_option(5000.0))
+        return await qualify.qualify_contracts_async(_option(5000.0), _option(5005.0), _option(5010.0))
+
+    qualified = asyncio.run(run())
+
+    assert len(qualified) == 3
+    assert [len(call) for call in stub_ib.calls] == [1, 2]
+
+
+def test_trading_class_is_part_of_the_cache_key(stub_ib):
+    async def run():
+        spx = await qualify.qualify_contracts_async(_option(5000.0, 'SPX'))
+        spxw = await qualify.qualify_contracts_async(_option(5000.0, 'SPXW'))
+        return spx[0], spxw[0]
+
+    spx, spxw = asyncio.run(run())
+
+    assert len(stub_ib.calls) == 2
+    assert spx.conId != spxw.conId
+
+
+def test_failed_qualifications_are_not_cached(stub_ib):
+    async def run():
+        await qualify.qualify_contracts_async(Stock('NONE', 'SMART', 'USD'))
+        return await qualify.qualify_contracts_async(Stock('NONE', 'SMART', 'USD'))
+
+    assert asyncio.run(run()) == []
+    assert len(stub_ib.calls) == 2
+
+
+def test_expired_contracts_are_pruned(stub_ib, tmp_path):
+    yesterday = (datetime.today() - timedelta(days=1)).strftime('%Y%m%d')
+    expired = _option(5000.0, expiry=yesterday)
+    expired.conId = 1
+    live = _option(5000.0)
+    live.conId = 2
+    with open(tmp_path / qualify.QUALIFY_CACHE_FILE, 'w') as f:
+        json.dump([{'key': list(qualify._spec_key(contract)), 'contract': contract_to_dict(contract)}
+                   for contract in (expired, live)], f)
+
+    assert qualify.get_cached_qualification(_option(5000.0, expiry=yesterday)) is None
+    assert qualify.get_cached_qualification(_option(5000.0)).conId == 2
+
+
+def test_config_seed_is_completed_on_first_use(stub_ib):
+    async def run():
+        first = await qualify.qualify_contracts_async(Stock('SPY', 'SMART', 'USD'))
+        second = await qualify.qualify_contracts_async(Stock('SPY', 'SMART', 'USD'))
+        return first[0], second[0]
+
+    first, second = asyncio.run(run())
+
+    # Sent once by its configured conId, then answered from the cache with every field IB filled in
+    assert stub_ib.calls == [[('SPY', 756733)]]
+    for contract in (first, second):
+        assert contract.conId == 756733
+        assert (contract.primaryExchange, contract.localSymbol, contract.tradingClass) == ('ARCA', 'SPY', 'SPY')
+
+
+def test_incomplete_config_seeds_are_not_saved(stub_ib, tmp_path):
+    async def run():
+        await qualify.qualify_contracts_async(_option(5000.0))
+        await qualify.save_async()
+
+    asyncio.run(run())
+
+    with open(tmp_path / qualify.QUALIFY_CACHE_FILE) as f:
+        assert [entry['contract']['symbol'] for entry in json.load(f)] == ['SPX']
@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import Contract, Ticker
+import ticker_registry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """
+    An empty registry whose streaming lines are the conIds in the returned set.
+    """
+    streaming = set()
+    monkeypatch.setattr(ticker_registry, '_entries', {})
+    monkeypatch.setattr(ticker_registry.md_lines, 'is_streaming', lambda contract: contract.conId in streaming)
+    monkeypatch.setattr(ticker_registry.cfg, 'quote_max_age_ms', 1000)
+    return streaming
+
+
+def _ticker(con_id: int) -> Ticker:
+    return Ticker(contract=Contract(conId=con_id), bid=1.0, ask=1.1)
+
+
+def _age(ticker: Ticker, seconds: float):
+    ticker_registry._entries[ticker.contract.conId][1] -= seconds
+
+
+def test_snapshot_is_fresh_until_max_age(registry):
+    ticker = _ticker(1)
+    ticker_registry.record(ticker)
+
+    assert ticker_registry.age_ms(ticker.contract) < 1000
+    assert ticker_registry.fresh_ticker(ticker.contract) is ticker
+
+    _age(ticker, 2.0)
+
+    assert ticker_registry.age_ms(ticker.contract) >= 2000
+    assert ticker_registry.fresh_ticker(ticker.contract) is None
+    assert ticker_registry.fresh_ticker(ticker.contract, max_age_ms=5000) is ticker
+
+
+def test_streaming_ticker_needs_a_first_update(registry):
+    ticker = _ticker(1)
+    registry.add(1)
+    ticker_registry.track(ticker)
+
+    assert ticker_registry.age_ms(ticker.contract) is None
+    assert ticker_registry.fresh_ticker(ticker.contract) is None
+
+    ticker.updateEvent.emit(ticker)
+
+    assert ticker_registry.fresh_ticker(ticker.contract) is ticker
+
+
+def test_quiet_streaming_ticker_stays_fresh_while_its_line_is_open(registry):
+    ticker = _ticker(1)
+    registry.add(1)
+    ticker_registry.track(ticker)
+    ticker.updateEvent.emit(ticker)
+    _age(ticker, 60.0)
+
+    assert ticker_registry.fresh_ticker(ticker.contract) is ticker
+
+    # Once the line is closed the last update is only as good as its age
+    registry.discard(1)
+    assert ticker_registry.fresh_ticker(ticker.contract) is None
+
+
+def test_snapshot_does_not_replace_a_streaming_ticker(registry):
+    streaming = _ticker(1)
+    registry.add(1)
+    ticker_registry.track(streaming)
+    streaming.updateEvent.emit(streaming)
+
+    ticker_registry.record(_ticker(1))
+
+    assert ticker_registry.fresh_ticker(streaming.contract) is streaming
+
+
+def test_updates_of_a_replaced_ticker_are_ignored(registry):
+    old, new = _ticker(1), _ticker(1)
+    registry.add(1)
+    ticker_registry.track(old)
+    ticker_registry.track(new)
+
+    old.updateEvent.emit(old)
+
+    assert ticker_registry.age_ms(new.contract) is None
+    assert ticker_registry.fresh_ticker(new.contract) is None
@@ -0,0 +1,77 @@
+import time
+from typing import Optional
+from ib_insync import Contract, Ticker
+import md_lines
+import cfg
+
+# conId -> [ticker, monotonic time of its last update (None before the first one), True for a streaming ticker]
+_entries = {}
+
+
+def _on_update(ticker: Ticker):
+    entry = _entries.get(ticker.contract.conId)
+    if entry is not None and entry[0] is ticker:
+        entry[1] = time.monotonic()
+
+
+def track(ticker: Ticker) -> Ticker:
+    """
+    Registers a streaming ticker as the shared one for its conId and timestamps each of its updates.
+    """
+    entry = _entries.get(ticker.contract.conId)
+    if entry is None or entry[0] is not ticker:
+        _entries[ticker.contract.conId] = [ticker, None, True]
+        ticker.updateEvent += _on_update
+    return ticker
+
+
+def record(*tickers: Ticker) -> None:
+    """
+    Registers completed snapshot tickers (e.g. from reqTickers), timestamped now. A streaming ticker that is
+    already registered for the conId is kept, as it stays current on its own.
+    """
+    now = time.monotonic()
+    for ticker in tickers:
+        entry = _entries.get(ticker.contract.conId)
+        if entry is None or entry[0] is ticker or not md_lines.is_streaming(ticker.contract):
+            _entries[ticker.contract.conId] = [ticker, now, False]
+
+
+def age_ms(contract: Contract) -> Optional[float]:
+    """
+    Milliseconds since the registered ticker for the contract last updated, or None if it never has.
+    """
+    entry = _entries.get(contract.conId)
+    if entry is None or entry[1] is None:
+        return None
+    return (time.monotonic() - entry[1]) * 1000
+
+
+def fresh_ticker(contract: Contract, max_age_ms: float = None) -> Optional[Ticker]:
+    """
+    The registered ticker for the contract if its quote is current, otherwise None. A streaming ticker is current
+    for as long as its line stays open once it has updated (a quiet contract sends no updates while its quote holds);
+    a snapshot is current if it was taken within max_age_ms (defaults to cfg.quote_max_age_ms). Answered from
+    memory, without an IB request.
+    """
+    entry = _entries.get(contract.conId)
+    if entry is None or entry[1] is None:
+        return None
+    ticker, _, streaming = entry
+    if streaming and md_lines.is_streaming(contract):
+        return ticker
+    if age_ms(contract) > (cfg.quote_max_age_ms if max_age_ms is None else max_age_ms):
+        return None
+    return ticker
+
+
+async def live_ticker_async(contract: Contract) -> Ticker:
+    """
+    The shared streaming ticker for a qualified contract, opening a line if needed (see md_lines.acquire_async).
+    Must be paired with md_lines.release(contract).
+    """
+    return track(await md_lines.acquire_async(contract))
+
+
+def clear() -> None:
+    _entries.clear()
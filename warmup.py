@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+from bisect import bisect_left
+from datetime import datetime, time
+from math import isnan
+from operator import attrgetter
+from pytz import timezone
+from ib_instance import ib
+from main import (adjust_to_tick_size, round_to_nearest_dollar, get_strike_prices_async, qualify_option_legs_async,
+                  submit_strangle_async, selects_by_delta, save_caches_async)
+from market_data import (wait_for_quote_async, quote_price, is_valid_price, get_current_mid_price_async,
+                         combo_prices_from_tickers)
+from options import get_today_expiry
+from orders import create_bag
+from qualify import qualify_contract_async
+import chain_cache
+import md_lines
+import ticker_registry
+from log_config import get_logger, setup_logging
+import cfg
+import latency
+import md_recorder
+
+logger = get_logger(__name__)
+
+
+def _candidate_window(ladder, target, span):
+    """
+    Slice of the sorted strike ladder within `span` strikes of the target.
+    """
+    center = bisect_left([option.strike for option in ladder], target)
+    return ladder[max(center - span, 0):center + span]
+
+
+def warmup_strike_span(symbols) -> int:
+    """
+    Strikes to subscribe on each side of each target so that warming up all the symbols at once fits in
+    cfg.md_line_budget: every symbol holds its underlying line, distance-based ones also 2 * span strikes per
+    right, and cfg.warmup_line_headroom lines stay free for fire-time lookups. At most cfg.warmup_strike_span.
+    """
+    windowed = sum(not selects_by_delta(cfg.params[symbol]) for symbol in symbols)
+    if not windowed:
+        return cfg.warmup_strike_span
+    free = cfg.md_line_budget - cfg.warmup_line_headroom - len(symbols)
+    span = max(min(cfg.warmup_strike_span, free // windowed // 4), 0)
+    if span < cfg.warmup_strike_span:
+        logger.warning("Market data line budget of %d fits %d warm-up strikes per side for %d symbols "
+                       "(warmup_strike_span is %d).", cfg.md_line_budget, span, len(symbols), cfg.warmup_strike_span)
+    return span
+
+
+async def prepare_symbol_plan_async(symbol, span: int = None):
+    """
+    Does all of the static work for a symbol ahead of the entry time: expiry, underlying qualification, chain
+    download and streaming subscriptions on the underlying and on the strikes around each target. Symbols that
+    select strikes by delta only get the chain downloaded, as their strikes depend on the quotes at entry.
+
+    Args:
+        symbol: Symbol to warm up.
+        span: Strikes subscribed on each side of each target (defaults to cfg.warmup_strike_span, see
+            warmup_strike_span for a value that fits the line budget). 0 leaves every strike to the fire-time lookup.
+
+    Returns:
+        dict: The ready-to-fire plan for the symbol.
+    """
+    logger.info("Warming up %s", symbol)
+    params = cfg.params[symbol]
+    expiry = get_today_expiry()
+
+    und_contract = await qualify_contract_async(
+        symbol=symbol, secType=params["sec_type"], exchange=params["exchange"], currency='USD'
+    )
+
+    # Lines taken so far; released again if warm-up fails partway, so a failed symbol does not keep them
+    acquired = []
+
+    async def subscribe_async(contract):
+        ticker = await ticker_registry.live_ticker_async(contract)
+        acquired.append(contract)
+        return ticker
+
+    try:
+        und_ticker = await subscribe_async(und_contract)
+        await wait_for_quote_async(und_ticker)
+        current_price = quote_price(und_ticker)
+        if current_price is None:
+            current_price = await get_current_mid_price_async(und_contract)
+        if current_price is None:
+            raise ValueError(f"Could not retrieve market data for {symbol} during warm-up.")
+        rounded_price = round_to_nearest_dollar(current_price)
+
+        option_secType = 'FOP' if und_contract.secType == 'FUT' else 'OPT'
+        put_chain, call_chain = await asyncio.gather(
+            chain_cache.get_option_contracts_async(symbol, option_secType, expiry, 'P', params["opt_exchange"],
+                                                   und_contract.currency),
+            chain_cache.get_option_contracts_async(symbol, option_secType, expiry, 'C', params["opt_exchange"],
+                                                   und_contract.currency)
+        )
+        put_ladder = sorted(put_chain, key=attrgetter('strike'))
+        call_ladder = sorted(call_chain, key=attrgetter('strike'))
+
+        # Chain contracts come back from reqContractDetails already qualified, so they can be subscribed directly
+        span = cfg.warmup_strike_span if span is None else span
+        if selects_by_delta(params) or span <= 0:
+            put_candidates, call_candidates = [], []
+        else:
+            put_candidates = _candidate_window(put_ladder, rounded_price - params["put_strike_distance"], span)
+            call_candidates = _candidate_window(call_ladder, rounded_price + params["call_strike_distance"], span)
+
+        plan = {
+            "symbol": symbol,
+            "params": params,
+            "expiry": expiry,
+            "und_contract": und_contract,
+            "und_ticker": und_ticker,
+            "put_ladder": put_ladder,
+            "call_ladder": call_ladder,
+            "put_candidates": [(option, await subscribe_async(option)) for option in put_candidates],
+            "call_candidates": [(option, await subscribe_async(option)) for option in call_candidates],
+        }
+    except BaseException:
+        for contract in acquired:
+            md_lines.release(contract)
+        raise
+    logger.info("%s ready: %d put and %d call strikes subscribed.", symbol, len(put_candidates), len(call_candidates))
+    return plan
+
+
+def _pick_candidate(candidates, ladder, target):
+    """
+    Closest subscribed strike to the target with a valid bid. Returns None when the target has drifted outside
+    the subscribed window (or nothing in it has a bid), so the caller can fall back to a full lookup.
+    """
+    if not candidates:
+        return None
+    if (target < candidates[0][0].strike and ladder[0] is not candidates[0][0]) or \
+            (target > candidates[-1][0].strike and ladder[-1] is not candidates[-1][0]):
+        return None
+
+    valid = [(option, ticker) for option, ticker in candidates if is_valid_price(ticker.bid)]
+    if not valid:
+        return None
+    return min(valid, key=lambda candidate: abs(candidate[0].strike - target))
+
+
+async def fire_plan_async(plan):
+    """
+    Entry step for a warmed-up symbol: reads the live quotes, picks strikes and prices the combo.
+
+    Returns:
+        dict: symbol data in the same shape as create_strangle_bag_contract_async, or None to skip the symbol.
+    """
+    symbol = plan["symbol"]
+    params = plan["params"]
+    und_contract = plan["und_contract"]
+
+    current_price = quote_price(plan["und_ticker"])
+    if current_price is None:
+        current_price = await get_current_mid_price_async(und_contract)
+    if current_price is None or isnan(current_price):
+        logger.error("Could not retrieve market data for %s.", symbol)
+        return None
+    rounded_price = round_to_nearest_dollar(current_price)
+    logger.info("Current price for %s: %s, Rounded price: %s", symbol, current_price, rounded_price)
+
+    if selects_by_delta(params):
+        # Delta-based strikes are picked from the quotes at entry, through the same lookup as main.py
+        put = call = None
+    else:
+        put = _pick_candidate(plan["put_candidates"], plan["put_ladder"],
+                              rounded_price - params["put_strike_distance"])
+        call = _pick_candidate(plan["call_candidates"], plan["call_ladder"],
+                               rounded_price + params["call_strike_distance"])
+        if put is None or call is None:
+            logger.warning("%s moved outside the warmed-up strikes, falling back to a full lookup.", symbol)
+    if put is None or call is None:
+        put_strike, call_strike = await get_strike_prices_async(
+            und_contract, params["opt_exchange"], plan["expiry"], rounded_price, params, params["min_tick"]
+        )
+        if not put_strike or not call_strike:
+            return None
+        put_leg, call_leg = await qualify_option_legs_async(
+            symbol, plan["expiry"], put_strike, call_strike, params["opt_exchange"]
+        )
+        put, call = (put_leg, None), (call_leg, None)
+
+    put_leg, call_leg = put[0], call[0]
+    logger.info("Selected put strike: %s, call strike: %s", put_leg.strike, call_leg.strike)
+
+    bag_contract = create_bag(
+        und_contract=und_contract,
+        legs=[put_leg, call_leg],
+        actions=['BUY', 'BUY'],
+        ratios=[1, 1]
+    )
+
+    legs = [(put_leg, 'SELL', 1), (call_leg, 'SELL', 1)]
+    # Legs found outside the plan hold lines of their own; release exactly those, whatever happens below
+    acquired = []
+    try:
+        leg_tickers = []
+        for leg, ticker in (put, call):
+            if ticker is None:
+                ticker = await ticker_registry.live_ticker_async(leg)
+                acquired.append(leg)
+            leg_tickers.append(ticker)
+        await asyncio.gather(*(wait_for_quote_async(ticker, allow_last=False) for ticker in leg_tickers))
+        bid_price, mid_price, ask_price = combo_prices_from_tickers(legs, leg_tickers)
+    finally:
+        for leg in acquired:
+            md_lines.release(leg)
+
+    if bid_price == 0.0 or isnan(bid_price):
+        logger.warning("Invalid bid price (%s) for %s combo. Skipping order.", bid_price, symbol)
+        return None
+
+    min_tick = params["min_tick"]
+    bid_price = adjust_to_tick_size(bid_price, min_tick)
+    mid_price = adjust_to_tick_size(mid_price, min_tick)
+    ask_price = adjust_to_tick_size(ask_price, min_tick)
+
+    logger.info("Combo prices - Adjusted Bid: %s, Mid: %s, Ask: %s", bid_price, mid_price, ask_price)
+
+    return {
+        "bag_contract": bag_contract,
+        "bid_price": bid_price,
+        "mid_price": mid_price,
+        "params": params
+    }
+
+
+def release_plan(plan):
+    """
+    Releases the market data lines held for a plan.
+    """
+    md_lines.release(plan["und_contract"])
+    for option, _ in plan["put_candidates"] + plan["call_candidates"]:
+        md_lines.release(option)
+
+
+async def _fire_and_submit_async(plan):
+    try:
+        with latency.span('total', plan['symbol']):
+            with latency.span('fire', plan['symbol']):
+                symbol_data = await fire_plan_async(plan)
+            if not symbol_data:
+                return None
+            return await submit_strangle_async(symbol_data)
+    except Exception as e:
+        logger.exception("Failed to fire plan for %s: %s", plan['symbol'], e)
+        return None
+    finally:
+        release_plan(plan)
+
+
+async def _prepare_isolated_async(symbol, span):
+    try:
+        with latency.span('warmup', symbol):
+            return await prepare_symbol_plan_async(symbol, span)
+    except Exception as e:
+        logger.exception("Warm-up failed for %s: %s", symbol, e)
+        return None
+
+
+async def wait_until_async(entry_time: time):
+    """
+    Sleeps until the given US/Eastern wall-clock time (returns immediately if it has passed).
+    """
+    eastern = timezone('US/Eastern')
+    now = datetime.now(eastern)
+    target = eastern.localize(datetime.combine(now.date(), entry_time))
+    delay = (target - now).total_seconds()
+    if delay > 0:
+        logger.info("Waiting %.0fs until entry time %s", delay, entry_time)
+        await asyncio.sleep(delay)
+
+
+async def run_warmup_async(symbols, entry_time: time):
+    """
+    Warms up every symbol concurrently, waits for the entry time, then fires all plans at once.
+
+    Returns:
+        dict: symbol -> result of the order submission (None when the symbol was skipped or failed).
+    """
+    span = warmup_strike_span(symbols)
+    plans = await asyncio.gather(*(_prepare_isolated_async(symbol, span) for symbol in symbols))
+    # Written while waiting for the entry time, so it never competes with firing
+    await save_caches_async()
+    await wait_until_async(entry_time)
+    results = await asyncio.gather(*(_fire_and_submit_async(plan) for plan in plans if plan))
+    fired = iter(results)
+    return {symbol: next(fired) if plan else None for symbol, plan in zip(symbols, plans)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Warm up the strangle entry ahead of time, then fire it.')
+    parser.add_argument('--entry-time', default=cfg.entry_time, help='US/Eastern entry time as HH:MM')
+    parser.add_argument('--symbols', nargs='+', default=cfg.SYMBOLS)
+    args = parser.parse_args()
+
+    setup_logging()
+    if cfg.md_recording:
+        md_recorder.start()
+    ib.run(run_warmup_async(args.symbols, datetime.strptime(args.entry_time, '%H:%M').time()))
+    latency.report()